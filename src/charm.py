@@ -2,20 +2,53 @@
 
 """InfluxDBOperator."""
 
+import json
 import logging
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, TypeVar
 
 import ops
 
 from constants import (
+    DEFAULT_INFLUXDB_RETENTION_POLICY,
     INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL,
+    INFLUXDB_BACKUP_DIR,
+    INFLUXDB_DATA_DIR,
+    INFLUXDB_GRANTS_BATCH_SIZE,
+    INFLUXDB_HEALTH_DISK_USED_PERCENT,
+    INFLUXDB_HEALTH_P99_LATENCY_SECONDS,
+    INFLUXDB_HEALTH_WAL_BYTES,
+    INFLUXDB_HEALTH_WINDOW,
     INFLUXDB_PEER,
     INFLUXDB_PORT,
+    INFLUXDB_TIERING_INTERVAL,
+    INFLUXDB_TUNING_OPTIONS,
+    INFLUXDB_WAL_DIR,
 )
 from exceptions import IngressAddressUnavailableError
 from influxdb_ops import (
     InfluxDBOps,
     InfluxDBOpsError,
+    build_tsi_index,
+    cold_shards,
+    configure_exporter_service,
+    create_backup,
     create_influxdb_admin_user,
+    export_backup_index,
+    ingest_endpoints,
+    migrate_storage,
+    move_shards_to_cold_storage,
+    parse_ingest_listeners,
+    parse_provision_spec,
+    parse_retention_policy,
+    remove_storage,
+    restart_influxdb,
+    restore_backup,
+    restore_backup_chain,
+    storage_usage,
+    tier_usage,
+    validate_rollup,
+    wait_until_ready,
     write_influxdb_configuration_and_restart_service,
 )
 from influxdb_ops import (
@@ -24,10 +57,16 @@ from influxdb_ops import (
 from influxdb_ops import (
     version as influxdb_version,
 )
+from influxdb_probe import InfluxDBProbe, percentile, summarize_debug_vars
 from interface_influxdb import InfluxDB
 
+if TYPE_CHECKING:
+    from influxdb_async import AsyncInfluxDBOps
+
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 class InfluxDBOperator(ops.CharmBase):
     """InfluxDBOperator lifecycle events."""
@@ -38,7 +77,10 @@ class InfluxDBOperator(ops.CharmBase):
         """Init _stored attributes and interfaces, observe events."""
         super().__init__(*args, **kwargs)
 
-        self._stored.set_default(influxdb_installed=False)
+        self._stored.set_default(
+            influxdb_installed=False, applied_settings={}, health={}, tiered_at=0.0, storage={}
+        )
+        self._influxdb_admin_password: Optional[str] = None
 
         self.influxdb_ops = InfluxDBOps(self)
         self._influxdb_interface = InfluxDB(self, "influxdb")
@@ -46,7 +88,13 @@ class InfluxDBOperator(ops.CharmBase):
         event_handler_bindings = {
             self.on.install: self._on_install,
             self.on.start: self._on_start,
+            self.on.config_changed: self._on_config_changed,
+            self.on.upgrade_charm: self._on_upgrade_charm,
             self.on.update_status: self._on_update_status,
+            self.on.data_storage_attached: self._on_storage_attached,
+            self.on.wal_storage_attached: self._on_storage_attached,
+            self.on.data_storage_detaching: self._on_storage_detaching,
+            self.on.wal_storage_detaching: self._on_storage_detaching,
             self.on.secret_rotate: self._on_secret_rotate,
             # Actions
             self.on.get_admin_password_action: self._on_get_admin_password_action,
@@ -62,10 +110,26 @@ class InfluxDBOperator(ops.CharmBase):
             self.on.grant_privilege_action: self._on_grant_privilege_action,
             self.on.revoke_privilege_action: self._on_revoke_privilege_action,
             self.on.list_privileges_action: self._on_list_privileges_action,
+            self.on.list_privileges_all_action: self._on_list_privileges_all_action,
+            self.on.alter_retention_policy_action: self._on_alter_retention_policy_action,
+            self.on.create_continuous_query_action: self._on_create_continuous_query_action,
+            self.on.list_continuous_queries_action: self._on_list_continuous_queries_action,
+            self.on.drop_continuous_query_action: self._on_drop_continuous_query_action,
+            self.on.create_rollup_action: self._on_create_rollup_action,
+            self.on.drop_rollup_action: self._on_drop_rollup_action,
+            self.on.provision_action: self._on_provision_action,
+            self.on.build_tsi_index_action: self._on_build_tsi_index_action,
+            self.on.restart_action: self._on_restart_action,
+            self.on.create_backup_action: self._on_create_backup_action,
+            self.on.restore_backup_action: self._on_restore_backup_action,
+            self.on.export_backup_index_action: self._on_export_backup_index_action,
+            self.on.show_tier_usage_action: self._on_show_tier_usage_action,
         }
         for event, handler in event_handler_bindings.items():
             self.framework.observe(event, handler)
 
+        self.framework.observe(self.framework.on.commit, self._on_commit)
+
     @property
     def ingress_address(self) -> str:
         """Return the ingress_address from the peer relation if it exists."""
@@ -77,15 +141,118 @@ class InfluxDBOperator(ops.CharmBase):
 
     @property
     def influxdb_admin_password(self) -> str:
-        """Return the influx admin password from secrets storage."""
-        secret = self.model.get_secret(label=INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL)
-        return secret.get_content(refresh=True)["password"]
+        """Return the influx admin password from secrets storage.
+
+        The secret is read at most once per hook; `_on_secret_rotate` drops the
+        memoized value when the password changes.
+        """
+        if self._influxdb_admin_password is None:
+            secret = self.model.get_secret(label=INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL)
+            self._influxdb_admin_password = secret.get_content(refresh=True)["password"]
+        return self._influxdb_admin_password
 
     @property
     def influxdb_installed(self) -> bool:
         """Determine if influxdb is installed."""
         return self._stored.influxdb_installed
 
+    @property
+    def data_dir(self) -> str:
+        """Return the shard data directory, on the `data` storage if it is attached."""
+        location = self._stored.storage.get("data")
+        return f"{location}/data" if location else INFLUXDB_DATA_DIR
+
+    @property
+    def wal_dir(self) -> str:
+        """Return the WAL directory, on the `wal` storage if it is attached."""
+        location = self._stored.storage.get("wal")
+        return f"{location}/wal" if location else INFLUXDB_WAL_DIR
+
+    @property
+    def exporter_port(self) -> int:
+        """Return the `exporter-port` config, 0 if the exporter is disabled."""
+        return int(self.config["exporter-port"])
+
+    @property
+    def cold_storage_path(self) -> str:
+        """Return the `cold-storage-path` config, empty if tiering is disabled."""
+        return str(self.config["cold-storage-path"])
+
+    @property
+    def cold_shard_age(self) -> str:
+        """Return the `cold-shard-age` config, a retention policy duration literal."""
+        return str(self.config["cold-shard-age"])
+
+    @property
+    def ingest_listeners(self) -> str:
+        """Return the `ingest-listeners` config, empty if no listener is enabled."""
+        return str(self.config["ingest-listeners"])
+
+    @property
+    def ingest_endpoints(self) -> List[Dict[str, Any]]:
+        """Return the protocol, transport, port and database of each ingest listener.
+
+        Empty if the `ingest-listeners` config is invalid, which blocks the unit
+        when influxdb.conf is written.
+        """
+        try:
+            return ingest_endpoints(parse_ingest_listeners(self.ingest_listeners))
+        except InfluxDBOpsError:
+            return []
+
+    @property
+    def influxdb_settings(self) -> Dict[str, Any]:
+        """Return the influxdb.conf settings derived from the charm config and storage.
+
+        `max-series-per-database` is lowered to the limit of the cardinality
+        guard while a relation database is over its series threshold.
+        """
+        settings = {option: self.config[option] for option in INFLUXDB_TUNING_OPTIONS}
+        settings.update(
+            {
+                "dir": self.data_dir,
+                "wal-dir": self.wal_dir,
+                "ingest-listeners": self.ingest_listeners,
+            }
+        )
+        if limit := self._influxdb_interface.series_limit:
+            configured = settings["max-series-per-database"]
+            settings["max-series-per-database"] = min(configured, limit) if configured else limit
+        return settings
+
+    def run_async(self, operation: Callable[["AsyncInfluxDBOps"], Awaitable[T]]) -> T:
+        """Run `operation` against an `AsyncInfluxDBOps` on a new event loop.
+
+        Used by handlers that fan out many independent admin requests, which
+        then share a connection-limited pool and run concurrently.
+        """
+        import asyncio
+
+        from influxdb_async import AsyncInfluxDBOps
+
+        async def _run() -> T:
+            async with AsyncInfluxDBOps(self) as influxdb:
+                return await operation(influxdb)
+
+        return asyncio.run(_run())
+
+    @staticmethod
+    def _split(names: str) -> List[str]:
+        """Split a comma-separated action parameter into names."""
+        return [name.strip() for name in names.split(",") if name.strip()]
+
+    @staticmethod
+    def _fail_on_errors(event: ops.ActionEvent, results: Dict[str, Any]) -> bool:
+        """Fail `event` if any result of a fan-out operation is an error."""
+        errors = {k: v.message for k, v in results.items() if isinstance(v, InfluxDBOpsError)}
+        if errors:
+            event.fail(f"Failed for {len(errors)} of {len(results)}: {json.dumps(errors)}")
+        return bool(errors)
+
+    def _on_commit(self, event: ops.CommitEvent) -> None:
+        """Release the pooled influxdb admin session at the end of the dispatch."""
+        self.influxdb_ops.close()
+
     def _on_install(self, event: ops.InstallEvent) -> None:
         """Perform installation operations for system level dependencies."""
         self.unit.status = ops.WaitingStatus("Installing base system dependencies.")
@@ -107,36 +274,287 @@ class InfluxDBOperator(ops.CharmBase):
             label=INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL,
             rotate=ops.SecretRotate.DAILY,
         )
-
-        write_influxdb_configuration_and_restart_service()
+        self._influxdb_admin_password = admin_password
 
         self._stored.influxdb_installed = True
-        self._check_status()
+        # Storage attached at deploy time: move the package's directories onto it.
+        for name, source, target in (
+            ("data", INFLUXDB_DATA_DIR, self.data_dir),
+            ("wal", INFLUXDB_WAL_DIR, self.wal_dir),
+        ):
+            if source != target and not self._migrate_storage(name, source, target):
+                return
+        if self._write_configuration() and self._configure_exporter():
+            self._open_ports()
+            self._check_status()
 
     def _on_start(self, event: ops.StartEvent) -> None:
         """Handle start hook operations."""
         self.unit.open_port("tcp", int(INFLUXDB_PORT))
         self.unit.set_workload_version(influxdb_version())
 
+    def _on_storage_attached(self, event: ops.StorageAttachedEvent) -> None:
+        """Move the data or WAL directory onto newly attached storage.
+
+        Storage attached at deploy time is recorded here and moved onto on install.
+        The source is only removed once influxdb.conf points at the new directory.
+        If it cannot be written, influxdb is started again on the kept source.
+        """
+        name, location = event.storage.name, str(event.storage.location)
+        previous = dict(self._stored.storage)
+        if not self.influxdb_installed:
+            self._stored.storage = {**previous, name: location}
+            return
+
+        source = self.data_dir if name == "data" else self.wal_dir
+        if not self._migrate_storage(name, source, f"{location}/{name}", remove_source=False):
+            return
+        self._stored.storage = {**previous, name: location}
+        if not self._write_configuration():
+            self._stored.storage = previous
+            message = f"Kept the influxdb {name} directory in {source}: {self.unit.status.message}"
+            try:
+                restart_influxdb()
+            except InfluxDBOpsError as e:
+                message += f" {e.message}"
+            logger.error(message)
+            self.unit.status = ops.BlockedStatus(message)
+            return
+        remove_storage(source)
+        self._check_status()
+
+    def _on_storage_detaching(self, event: ops.StorageDetachingEvent) -> None:
+        """Move the data or WAL directory back to the root disk before its storage goes."""
+        name = event.storage.name
+        remaining = {k: v for k, v in self._stored.storage.items() if k != name}
+        if not self.influxdb_installed:
+            self._stored.storage = remaining
+            return
+
+        source = self.data_dir if name == "data" else self.wal_dir
+        target = INFLUXDB_DATA_DIR if name == "data" else INFLUXDB_WAL_DIR
+        if not self._migrate_storage(name, source, target, remove_source=False):
+            return
+        self._stored.storage = remaining
+        if self._write_configuration():
+            self._check_status()
+
+    def _migrate_storage(
+        self, name: str, source: str, target: str, remove_source: bool = True
+    ) -> bool:
+        """Move the `name` directory of influxdb from `source` to `target`.
+
+        Returns:
+            False if the move failed, after blocking the unit.
+        """
+        self.unit.status = ops.MaintenanceStatus(f"Moving the influxdb {name} directory.")
+        try:
+            result = migrate_storage(source, target, remove_source)
+        except InfluxDBOpsError as e:
+            logger.error(e.message)
+            self.unit.status = ops.BlockedStatus(e.message)
+            return False
+        logger.info(
+            f"Moved {result['bytes']} bytes from {source} to {target} "
+            f"with {result['downtime-seconds']}s of downtime."
+        )
+        return True
+
+    def _on_config_changed(self, event: ops.ConfigChangedEvent) -> None:
+        """Render the charm config into influxdb.conf and the exporter service."""
+        if not self.influxdb_installed:
+            return
+
+        if self._write_configuration() and self._configure_exporter():
+            self._open_ports()
+            self._check_status()
+
+    def _on_upgrade_charm(self, event: ops.UpgradeCharmEvent) -> None:
+        """Re-render influxdb.conf and the exporter from the upgraded charm's templates."""
+        if not self.influxdb_installed:
+            return
+
+        if self._write_configuration() and self._configure_exporter():
+            self._open_ports()
+            self._check_status()
+
+    @property
+    def pending_settings(self) -> List[str]:
+        """Return the settings written to influxdb.conf but not applied until a restart."""
+        applied = self._stored.applied_settings
+        return sorted(
+            key for key, value in self.influxdb_settings.items() if applied.get(key) != value
+        )
+
+    def _write_configuration(self) -> bool:
+        """Write influxdb.conf and restart influxdb if needed, blocking on invalid config."""
+        try:
+            applied, restarted = write_influxdb_configuration_and_restart_service(
+                self.influxdb_settings, dict(self._stored.applied_settings)
+            )
+        except InfluxDBOpsError as e:
+            logger.error(e.message)
+            self.unit.status = ops.BlockedStatus(e.message)
+            return False
+
+        self._stored.applied_settings = applied
+        if restarted:
+            self._wait_until_ready()
+        return True
+
+    def _configure_exporter(self) -> bool:
+        """Run the Prometheus exporter on `exporter-port`, blocking on failure."""
+        port = self.exporter_port
+        try:
+            if not 0 <= port <= 65535:
+                raise InfluxDBOpsError(f"Invalid exporter-port: {port}.")
+            configure_exporter_service(port)
+        except InfluxDBOpsError as e:
+            logger.error(e.message)
+            self.unit.status = ops.BlockedStatus(e.message)
+            return False
+        return True
+
+    def _open_ports(self) -> None:
+        """Open the HTTP API, exporter and ingest listener ports, and advertise the listeners."""
+        ports = [ops.Port("tcp", int(INFLUXDB_PORT))]
+        if port := self.exporter_port:
+            ports.append(ops.Port("tcp", port))
+        ports += [ops.Port(e["transport"], int(e["port"])) for e in self.ingest_endpoints]
+        self.unit.set_ports(*ports)
+        self._influxdb_interface.publish_ingest_endpoints()
+
+    def _wait_until_ready(self) -> None:
+        """Wait for influxdb to finish opening shards, reporting progress in the unit status."""
+        last = None
+
+        def _progress(opened: int, total: int) -> None:
+            nonlocal last
+            if (opened, total) != last:
+                last = (opened, total)
+                self.unit.status = ops.MaintenanceStatus(
+                    f"Waiting for InfluxDB: opened {opened}/{total} shards."
+                )
+
+        wait_until_ready(progress=_progress, data_dir=self.data_dir)
+
     def _on_update_status(self, event: ops.UpdateStatusEvent) -> None:
         """Update the charm status hook event handler."""
+        # The cardinality guard sampled on this hook may have changed the series limit.
+        applied = self._stored.applied_settings.get("max-series-per-database")
+        if applied is not None and applied != self.influxdb_settings["max-series-per-database"]:
+            if not self._write_configuration():
+                return
+        if not self._tier_shards():
+            return
         self._check_status()
 
+    def _tier_shards(self) -> bool:
+        """Move shards not written to for `cold-shard-age` to `cold-storage-path`, hourly.
+
+        Returns:
+            False if tiering is misconfigured or failed, after blocking the unit.
+        """
+        cold_dir = self.cold_storage_path
+        if not cold_dir or not self.influxdb_installed:
+            return True
+        if time.time() < self._stored.tiered_at + INFLUXDB_TIERING_INTERVAL:
+            return True
+
+        try:
+            shards = cold_shards(self.cold_shard_age, cold_dir, self.data_dir, self.wal_dir)
+            if shards:
+                self.unit.status = ops.MaintenanceStatus(
+                    f"Moving {len(shards)} shards to cold storage."
+                )
+                result = move_shards_to_cold_storage(shards, cold_dir, self.data_dir, self.wal_dir)
+                # influxdb was restarted, applying any setting deferred until a restart.
+                self._stored.applied_settings = self.influxdb_settings
+                logger.info(
+                    f"Moved {len(result['moved'])} shards to {cold_dir} "
+                    f"with {result['downtime-seconds']}s of downtime."
+                )
+        except InfluxDBOpsError as e:
+            logger.error(e.message)
+            self.unit.status = ops.BlockedStatus(e.message)
+            return False
+
+        self._stored.tiered_at = time.time()
+        return True
+
     def _check_status(self) -> None:
         """Update the charm status based on influxdb health."""
-        if influxdb_version():
-            self.unit.status = ops.ActiveStatus()
+        start = time.monotonic()
+        if vers := influxdb_version():
+            degraded = self._update_health_snapshot(vers, time.monotonic() - start)
+            messages = [f"Degraded: {', '.join(degraded)}"] if degraded else []
+            if pending := self.pending_settings:
+                messages.append(f"Restart pending for: {', '.join(pending)}")
+            if over := self._influxdb_interface.over_threshold:
+                messages.append(f"Series threshold exceeded by: {', '.join(over)}")
+            if failed := self._influxdb_interface.failed_relations:
+                messages.insert(0, f"Provisioning failed for: {', '.join(failed)}")
+            status = ops.BlockedStatus if failed else ops.ActiveStatus
+            self.unit.status = status("; ".join(messages))
         else:
             self.unit.status = ops.BlockedStatus(
                 "InfluxDB is not accepting connections, please debug."
             )
 
+    def _update_health_snapshot(self, version: str, latency: float) -> List[str]:
+        """Record a successful ping in the stored health snapshot.
+
+        Every check only pings influxdb and reads the disk and WAL usage. The
+        full `/debug/vars` statistics are fetched into the snapshot only when
+        the set of crossed thresholds changes.
+
+        Returns:
+            A description of each health threshold currently crossed.
+        """
+        previous = self._stored.health
+        latencies = [*previous.get("latencies", []), round(latency, 6)][-INFLUXDB_HEALTH_WINDOW:]
+        health = {
+            "version": version,
+            "latency": round(latency, 6),
+            "latencies": latencies,
+            "p50": percentile(latencies, 50),
+            "p99": percentile(latencies, 99),
+            "checked_at": time.time(),
+            **storage_usage(self.data_dir, self.wal_dir),
+        }
+
+        crossed = {}
+        if health["p99"] > INFLUXDB_HEALTH_P99_LATENCY_SECONDS:
+            crossed["latency"] = f"ping p99 {health['p99'] * 1000:.0f}ms"
+        if (disk := health["disk-used-percent"]) is not None:
+            if disk >= INFLUXDB_HEALTH_DISK_USED_PERCENT:
+                crossed["disk"] = f"disk {disk}% used"
+        if (wal := health["wal-bytes"]) is not None and wal >= INFLUXDB_HEALTH_WAL_BYTES:
+            crossed["wal"] = f"WAL {wal / 1024**2:.0f}MiB"
+        health["degraded"] = sorted(crossed)
+
+        if crossed and health["degraded"] != list(previous.get("degraded", [])):
+            with InfluxDBProbe() as probe:
+                debug_vars = probe.debug_vars()
+            if debug_vars is not None:
+                health["diagnostics"] = summarize_debug_vars(debug_vars)
+                logger.warning(
+                    f"InfluxDB degraded ({', '.join(crossed.values())}): {health['diagnostics']}"
+                )
+        elif crossed and "diagnostics" in previous:
+            health["diagnostics"] = dict(previous["diagnostics"])
+        self._stored.health = health
+        return list(crossed.values())
+
     def _on_secret_rotate(self, event: ops.SecretRotateEvent) -> None:
         """Handle secret rotation."""
         if event.secret.label == INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL:
             event.secret.set_content(
                 {"password": self.influxdb_ops.update_influxdb_admin_user_password()}
             )
+            # The memoized password and pooled session still hold the old password.
+            self._influxdb_admin_password = None
+            self.influxdb_ops.close()
 
     # Actions
     def _on_get_admin_password_action(self, event: ops.ActionEvent) -> None:
@@ -169,10 +587,15 @@ class InfluxDBOperator(ops.CharmBase):
         event.set_results({"results": user_pass})
 
     def _on_drop_user_action(self, event: ops.ActionEvent) -> None:
-        """Drop an InfluxDB user."""
-        username = event.params["username"]
-        self.influxdb_ops.drop_user(username)
-        event.set_results({"result": f"Success. Dropped user: {username}."})
+        """Drop one or more InfluxDB users."""
+        usernames = self._split(event.params["username"])
+        if len(usernames) == 1:
+            self.influxdb_ops.drop_user(usernames[0])
+        else:
+            results = self.run_async(lambda influxdb: influxdb.drop_users(usernames))
+            if self._fail_on_errors(event, results):
+                return
+        event.set_results({"result": f"Success. Dropped user: {', '.join(usernames)}."})
 
     def _on_list_users_action(self, event: ops.ActionEvent) -> None:
         """List InfluxDB users."""
@@ -182,14 +605,25 @@ class InfluxDBOperator(ops.CharmBase):
     def _on_create_database_action(self, event: ops.ActionEvent) -> None:
         """Create an InfluxDB database."""
         database = event.params["database"]
-        self.influxdb_ops.create_database(database)
+        try:
+            retention_policy = parse_retention_policy(event.params)
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+
+        self.influxdb_ops.create_database(database, retention_policy)
         event.set_results({"result": f"Success. Created database: {database}."})
 
     def _on_drop_database_action(self, event: ops.ActionEvent) -> None:
-        """Drop an InfluxDB database."""
-        database = event.params["database"]
-        self.influxdb_ops.drop_database(database)
-        event.set_results({"result": f"Success. Dropped database: {database}."})
+        """Drop one or more InfluxDB databases."""
+        databases = self._split(event.params["database"])
+        if len(databases) == 1:
+            self.influxdb_ops.drop_database(databases[0])
+        else:
+            results = self.run_async(lambda influxdb: influxdb.drop_databases(databases))
+            if self._fail_on_errors(event, results):
+                return
+        event.set_results({"result": f"Success. Dropped database: {', '.join(databases)}."})
 
     def _on_list_databases_action(self, event: ops.ActionEvent) -> None:
         """List InfluxDB databases."""
@@ -200,7 +634,7 @@ class InfluxDBOperator(ops.CharmBase):
         """Grant a user privilege on a database."""
         username = event.params["username"]
         database = event.params["database"]
-        privilege = event.params["privilege"]
+        privilege = event.params["permission"]
 
         self.influxdb_ops.grant_privilege(username, database, privilege)
         event.set_results({"result": f"Success. Granted {username} '{privilege}' on {database}."})
@@ -209,16 +643,273 @@ class InfluxDBOperator(ops.CharmBase):
         """Revoke a user privilege on a database."""
         username = event.params["username"]
         database = event.params["database"]
-        privilege = event.params["privilege"]
+        privilege = event.params["permission"]
 
         self.influxdb_ops.revoke_privilege(username, database, privilege)
         event.set_results({"result": f"Success. Revoked {username} '{privilege}' on {database}."})
 
     def _on_list_privileges_action(self, event: ops.ActionEvent) -> None:
-        """Revoke a user privilege on a database."""
-        username = event.params["username"]
-        privileges = self.influxdb_ops.list_privileges(username)
-        event.set_results({"result": privileges})
+        """List the privileges of a user, or of every user if none is given."""
+        if username := event.params.get("username"):
+            privileges = self.influxdb_ops.list_privileges(username)
+            event.set_results({"result": privileges})
+            return
+
+        privileges = self.run_async(lambda influxdb: influxdb.list_all_privileges())
+        if self._fail_on_errors(event, privileges):
+            return
+        event.set_results({"result": json.dumps(privileges)})
+
+    def _on_list_privileges_all_action(self, event: ops.ActionEvent) -> None:
+        """List the privileges of every user on every database as a bitmask matrix."""
+        try:
+            batch_size = event.params.get("batch-size", INFLUXDB_GRANTS_BATCH_SIZE)
+            matrix = self.run_async(lambda influxdb: influxdb.privilege_matrix(batch_size))
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({"result": json.dumps(matrix, separators=(",", ":"))})
+
+    def _on_alter_retention_policy_action(self, event: ops.ActionEvent) -> None:
+        """Alter the duration, shard duration or replication of a retention policy."""
+        database = event.params["database"]
+        name = event.params.get("name", DEFAULT_INFLUXDB_RETENTION_POLICY)
+        default = event.params.get("default", False)
+        try:
+            options = parse_retention_policy(event.params, defaults=False)
+            if not options and not default:
+                raise InfluxDBOpsError(
+                    "Set at least one of duration, shard-duration, replication or default."
+                )
+            self.influxdb_ops.alter_retention_policy(database, name, default=default, **options)
+            policies = self.influxdb_ops.list_retention_policies(database)
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+
+        policy = next((policy for policy in policies if policy["name"] == name), {})
+        event.set_results({"result": json.dumps(policy)})
+
+    def _on_create_continuous_query_action(self, event: ops.ActionEvent) -> None:
+        """Create a continuous query."""
+        database = event.params["database"]
+        name = event.params["name"]
+        try:
+            self.influxdb_ops.create_continuous_query(
+                database,
+                name,
+                event.params["query"],
+                event.params.get("resample-every"),
+                event.params.get("resample-for"),
+            )
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({"result": f"Success. Created continuous query {name} on {database}."})
+
+    def _on_list_continuous_queries_action(self, event: ops.ActionEvent) -> None:
+        """List the continuous queries of every database, or of one database."""
+        queries = self.influxdb_ops.list_continuous_queries(event.params.get("database"))
+        event.set_results({"result": json.dumps(queries)})
+
+    def _on_drop_continuous_query_action(self, event: ops.ActionEvent) -> None:
+        """Drop a continuous query."""
+        database = event.params["database"]
+        name = event.params["name"]
+        try:
+            self.influxdb_ops.drop_continuous_query(database, name)
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({"result": f"Success. Dropped continuous query {name} on {database}."})
+
+    def _on_create_rollup_action(self, event: ops.ActionEvent) -> None:
+        """Create a downsampling retention policy and the continuous query filling it."""
+        database = event.params["database"]
+        interval = event.params["interval"]
+        duration = event.params["duration"]
+        aggregate = event.params.get("aggregate", "mean")
+        try:
+            validate_rollup(interval, duration, aggregate)
+            shard_duration = parse_retention_policy(event.params, defaults=False).get(
+                "shard_duration"
+            )
+            name = self.influxdb_ops.create_rollup(
+                database,
+                interval,
+                duration,
+                event.params.get("source", DEFAULT_INFLUXDB_RETENTION_POLICY),
+                aggregate,
+                shard_duration,
+            )
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({"result": f"Success. Created rollup {name} on {database}."})
+
+    def _on_drop_rollup_action(self, event: ops.ActionEvent) -> None:
+        """Drop a rollup and its downsampled data."""
+        database = event.params["database"]
+        interval = event.params["interval"]
+        try:
+            self.influxdb_ops.drop_rollup(database, interval)
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({"result": f"Success. Dropped rollup {interval} on {database}."})
+
+    def _on_provision_action(self, event: ops.ActionEvent) -> None:
+        """Create the users, databases and grants of a spec that do not exist yet."""
+        try:
+            spec = parse_provision_spec(event.params["spec"])
+            report, passwords = self.influxdb_ops.provision(
+                spec, dry_run=event.params.get("dry-run", False)
+            )
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+
+        for username, password in passwords.items():
+            self.app.add_secret(
+                {"username": username, "password": password},
+                label=f"influxdb-user-{username}",
+            )
+
+        failed = [item for item in report if item["result"].startswith("failed")]
+        event.set_results({"result": json.dumps(report)})
+        if failed:
+            event.fail(f"Failed to provision {len(failed)} of {len(report)} items.")
+
+    def _on_build_tsi_index_action(self, event: ops.ActionEvent) -> None:
+        """Migrate the shards on disk from the inmem index to tsi1."""
+        if self.config["index-version"] != "tsi1":
+            event.fail("Set the index-version config option to tsi1 first.")
+            return
+
+        event.log("Stopping influxdb and building tsi1 indexes.")
+        try:
+            result = build_tsi_index(event.params.get("workers", 0), self.data_dir, self.wal_dir)
+            self._stored.applied_settings = self.influxdb_settings
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        finally:
+            self._check_status()
+
+        result["memory-difference"] = result["memory-after"] - result["memory-before"]
+        event.set_results({key: str(value) for key, value in result.items()})
+        if result["failed"]:
+            event.fail(f"Failed to build the tsi1 index for {len(result['failed'])} shards.")
+
+    def _on_restart_action(self, event: ops.ActionEvent) -> None:
+        """Restart influxdb to apply the settings deferred until a restart."""
+        if not self.influxdb_installed:
+            event.fail("InfluxDB is not installed yet.")
+            return
+        if not self._write_configuration():
+            event.fail(f"Invalid configuration: {self.unit.status.message}")
+            return
+
+        pending = self.pending_settings
+        event.log(f"Restarting influxdb to apply: {', '.join(pending) or 'no pending settings'}.")
+        try:
+            restart_influxdb()
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            self._check_status()
+            return
+
+        self._stored.applied_settings = self.influxdb_settings
+        self._wait_until_ready()
+        self._check_status()
+        event.set_results({"applied": ", ".join(pending)})
+
+    def _on_create_backup_action(self, event: ops.ActionEvent) -> None:
+        """Back up databases, or their changed shards, in parallel into a compressed archive."""
+        databases = self._split(event.params.get("databases", ""))
+        incremental = event.params.get("incremental", False)
+        try:
+            if not databases:
+                databases = [
+                    database["name"]
+                    for database in self.influxdb_ops.list_databases()
+                    if database["name"] != "_internal"
+                ]
+            result = create_backup(
+                databases,
+                event.params.get("path", INFLUXDB_BACKUP_DIR),
+                since=event.params.get("since"),
+                compression=event.params.get("compression", "gzip"),
+                workers=event.params.get("workers", 0),
+                progress=lambda target, done, total: event.log(
+                    f"Backed up {target} ({done}/{total})."
+                ),
+                incremental=incremental,
+                data_dir=self.data_dir,
+                wal_dir=self.wal_dir,
+            )
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+
+        event.set_results({key: str(value) for key, value in result.items() if key != "failed"})
+        if result["failed"]:
+            failed = "shards" if incremental else f"of {len(databases)} databases"
+            event.fail(
+                f"Failed to back up {len(result['failed'])} {failed}: "
+                f"{json.dumps(result['failed'])}"
+            )
+
+    def _on_restore_backup_action(self, event: ops.ActionEvent) -> None:
+        """Restore databases in parallel from an archive, or the chain of incremental backups."""
+        databases = self._split(event.params.get("databases", ""))
+        options = {
+            "suffix": event.params.get("suffix", ""),
+            "workers": event.params.get("workers", 0),
+            "progress": lambda database, done, total: event.log(
+                f"Restored {database} ({done}/{total})."
+            ),
+        }
+        try:
+            if event.params.get("incremental", False):
+                backup_dir = event.params.get("backup-dir", INFLUXDB_BACKUP_DIR)
+                result = restore_backup_chain(databases, backup_dir, **options)
+            elif archive := event.params.get("archive"):
+                result = restore_backup(archive, databases, **options)
+            else:
+                raise InfluxDBOpsError("Pass an archive, or incremental=true.")
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+
+        event.set_results({key: str(value) for key, value in result.items() if key != "failed"})
+        if result["failed"]:
+            event.fail(
+                f"Failed to restore {len(result['failed'])} databases: "
+                f"{json.dumps(result['failed'])}"
+            )
+
+    def _on_show_tier_usage_action(self, event: ops.ActionEvent) -> None:
+        """Report the shards and bytes on the hot and cold storage tiers."""
+        usage = tier_usage(self.cold_storage_path, self.data_dir)
+        event.set_results(
+            {
+                tier: {key: str(value) for key, value in values.items()}
+                for tier, values in usage.items()
+            }
+        )
+
+    def _on_export_backup_index_action(self, event: ops.ActionEvent) -> None:
+        """Export the shard index of incremental backups for verification."""
+        try:
+            result = export_backup_index(
+                event.params.get("path") or None,
+                event.params.get("backup-dir", INFLUXDB_BACKUP_DIR),
+            )
+        except InfluxDBOpsError as e:
+            event.fail(e.message)
+            return
+        event.set_results({key: str(value) for key, value in result.items()})
 
 
 if __name__ == "__main__":  # pragma: nocover
@@ -8,3 +8,64 @@ INFLUXDB_PEER = "influxdb-peer"
 INFLUXDB_ADMIN_USERNAME = "admin"
 INFLUXDB_ADMIN_PASSWORD_SECRET_LABEL = "influxdb-admin-password"
 DEFAULT_INFLUXDB_RETENTION_POLICY = "default"
+DEFAULT_INFLUXDB_RETENTION_DURATION = "7d"
+DEFAULT_INFLUXDB_REPLICATION = 1
+INFLUXDB_DATA_DIR = "/var/lib/influxdb/data"
+INFLUXDB_WAL_DIR = "/var/lib/influxdb/wal"
+INFLUXDB_BACKUP_DIR = "/var/lib/influxdb/backups"
+INFLUXDB_BACKUP_COMPRESSIONS = ("gzip", "zstd")
+INFLUXDB_BACKUP_INDEX = "index.json"
+# Seconds between runs of the job moving old shards to cold storage.
+INFLUXDB_TIERING_INTERVAL = 3600
+INFLUXDB_INDEX_VERSIONS = ("inmem", "tsi1")
+INFLUXDB_EXPORTER_SERVICE = "influxdb-exporter"
+# Seconds between the exporter's polls of /debug/vars, the default [monitor] store-interval.
+INFLUXDB_EXPORTER_POLL_INTERVAL = 10
+INFLUXDB_READY_TIMEOUT = 600
+INFLUXDB_READY_BACKOFF_SECONDS = 0.5
+INFLUXDB_READY_BACKOFF_MAX_SECONDS = 15
+# Ping latencies kept for the rolling percentiles of the health snapshot, 4h at the
+# default update-status interval, and the thresholds that trigger a diagnostics query.
+INFLUXDB_HEALTH_WINDOW = 48
+INFLUXDB_HEALTH_P99_LATENCY_SECONDS = 0.5
+INFLUXDB_HEALTH_DISK_USED_PERCENT = 90
+INFLUXDB_HEALTH_WAL_BYTES = 1024**3
+PROVISION_MAX_ATTEMPTS = 5
+PROVISION_BACKOFF_SECONDS = 30
+PROVISION_BACKOFF_MAX_SECONDS = 900
+# Seconds the sampled cardinality of relation databases is cached between update-status hooks.
+INFLUXDB_CARDINALITY_SAMPLE_INTERVAL = 900
+# Databases whose cardinality is sampled per request.
+INFLUXDB_CARDINALITY_BATCH_SIZE = 200
+
+# Bits of the list-privileges-all matrix; ALL PRIVILEGES is READ | WRITE.
+INFLUXDB_PRIVILEGE_BITS = {"NO PRIVILEGES": 0, "READ": 1, "WRITE": 2, "ALL PRIVILEGES": 3}
+# SHOW GRANTS statements sent per request when building the privilege matrix.
+INFLUXDB_GRANTS_BATCH_SIZE = 100
+
+# Downsampling rollups a related application can request by name. Each rollup
+# is a (GROUP BY interval, retention duration) pair, stored in a `rollup_<interval>`
+# retention policy filled by a continuous query over the default policy.
+INFLUXDB_ROLLUP_PROFILES = {
+    "short-term": (("1m", "30d"), ("10m", "180d")),
+    "standard": (("5m", "90d"), ("1h", "730d")),
+    "long-term": (("1h", "730d"), ("1d", "INF")),
+}
+INFLUXDB_ROLLUP_AGGREGATES = ("mean", "median", "sum", "count", "min", "max", "first", "last")
+INFLUXDB_TUNING_OPTIONS = (
+    "cache-max-memory-size",
+    "cache-snapshot-memory-size",
+    "max-concurrent-compactions",
+    "wal-fsync-delay",
+    "max-series-per-database",
+    "max-values-per-tag",
+    "index-version",
+)
+# Settings that are safe to leave unapplied until influxdb next restarts.
+INFLUXDB_DEFERRABLE_SETTINGS = {
+    "cache-max-memory-size",
+    "cache-snapshot-memory-size",
+    "max-concurrent-compactions",
+    "wal-fsync-delay",
+    "index-version",
+}
@@ -0,0 +1,430 @@
+# Copyright (c) 2025 Vantage Compute Corporation
+# See LICENSE file for licensing details.
+
+"""Asyncio variant of the influxdb admin operations.
+
+`AsyncInfluxDBOps` mirrors the `InfluxDBOps` method surface as coroutines so
+fan-out operations, such as listing the privileges of every user or dropping
+many users at once, run concurrently within one hook instead of as N
+sequential round-trips. Requests go over a pool of at most `limit` keep-alive
+`http.client` connections, each driven on a worker thread, so only the
+standard library is needed.
+"""
+
+import asyncio
+import base64
+import http.client
+import json
+import logging
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlencode
+
+from constants import (
+    DEFAULT_INFLUXDB_RETENTION_POLICY,
+    INFLUXDB_ADMIN_USERNAME,
+    INFLUXDB_GRANTS_BATCH_SIZE,
+    INFLUXDB_PORT,
+    INFLUXDB_PRIVILEGE_BITS,
+)
+from influxdb_ops import (
+    INFLUXDB_ADMIN_POOL_SIZE,
+    INFLUXQL_NOT_EXECUTED,
+    InfluxDBOpsError,
+    InfluxQLBatch,
+    InfluxQLStatementError,
+    quote_ident,
+    rollup_name,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+def _points(result: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Return the rows of a statement result as dicts, like `ResultSet.get_points()`."""
+    return [
+        dict(zip(series["columns"], values))
+        for series in result.get("series", [])
+        for values in series.get("values", [])
+    ]
+
+
+class AsyncInfluxDBOps:
+    """Asyncio counterpart of `InfluxDBOps` over a connection-limited HTTP pool.
+
+    Use it as an async context manager within a single event loop, e.g.::
+
+        async with AsyncInfluxDBOps(charm) as influxdb:
+            privileges = await influxdb.list_all_privileges()
+    """
+
+    def __init__(
+        self,
+        charm,
+        host: str = "127.0.0.1",
+        port: Optional[int] = None,
+        limit: int = INFLUXDB_ADMIN_POOL_SIZE,
+        timeout: float = 30.0,
+    ):
+        self._charm = charm
+        self._host = host
+        self._port = port or int(INFLUXDB_PORT)
+        self._timeout = timeout
+        self._auth: Optional[str] = None
+        self._idle: List[http.client.HTTPConnection] = []
+        self._slots = asyncio.Semaphore(limit)
+        self._executor = ThreadPoolExecutor(max_workers=limit)
+
+    async def __aenter__(self) -> "AsyncInfluxDBOps":
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the pooled connections and stop the worker threads."""
+        while self._idle:
+            self._idle.pop().close()
+        self._executor.shutdown(wait=False)
+
+    def _authorization(self) -> str:
+        """Return the basic auth header for the admin user.
+
+        Called from the event loop thread only; the charm model is not thread-safe.
+        """
+        if self._auth is None:
+            token = f"{INFLUXDB_ADMIN_USERNAME}:{self._charm.influxdb_admin_password}"
+            self._auth = f"Basic {base64.b64encode(token.encode()).decode()}"
+        return self._auth
+
+    def _post(
+        self, conn: http.client.HTTPConnection, body: str, headers: Dict[str, str]
+    ) -> Tuple[int, bytes]:
+        """Send a blocking `/query` request on a worker thread."""
+        conn.request("POST", "/query", body=body, headers=headers)
+        response = conn.getresponse()
+        return response.status, response.read()
+
+    async def _query(self, query: str) -> List[Dict[str, Any]]:
+        """Send `query` and return the raw result of each statement.
+
+        Raises:
+            InfluxDBOpsError: Raised if the request fails or is rejected.
+        """
+        headers = {
+            "Authorization": self._authorization(),
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+        body = urlencode({"q": query})
+        loop = asyncio.get_running_loop()
+
+        async with self._slots:
+            conn, reused = (self._idle.pop(), True) if self._idle else (self._connect(), False)
+            while True:
+                try:
+                    status, payload = await loop.run_in_executor(
+                        self._executor, self._post, conn, body, headers
+                    )
+                    break
+                except (http.client.HTTPException, OSError) as e:
+                    conn.close()
+                    if not reused:
+                        raise InfluxDBOpsError(f"Error querying influxdb: {e}") from e
+                    # The server dropped the kept-alive connection; retry once on a new one.
+                    conn, reused = self._connect(), False
+            self._idle.append(conn)
+
+        try:
+            data = json.loads(payload) if payload else {}
+        except ValueError:
+            data = {}
+        if status != 200:
+            raise InfluxDBOpsError(f"Error querying influxdb: {data.get('error', status)}")
+        return data.get("results", [])
+
+    def _connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    async def execute(self, batch: InfluxQLBatch) -> List[Dict[str, Any]]:
+        """Send an `InfluxQLBatch` and return the raw result of each statement.
+
+        Raises:
+            InfluxDBOpsError: Raised if the request itself fails.
+            InfluxQLStatementError: Raised for the first failed statement.
+        """
+        if not len(batch):
+            return []
+        results = await self._query(batch.query)
+        by_id = {result.get("statement_id", i): result for i, result in enumerate(results)}
+        batch.raise_for_errors({i: result.get("error") for i, result in by_id.items()})
+        return [by_id[statement_id] for statement_id in range(len(batch))]
+
+    async def _show(self, statement: str, error_msg: str) -> List[Dict[str, Any]]:
+        (result,) = await self.execute(InfluxQLBatch().add(statement, error_msg))
+        return _points(result)
+
+    async def create_user(self, influxdb_username: str) -> Dict[str, str]:
+        """Create an influxdb user."""
+        influxdb_password = secrets.token_urlsafe(32)
+        await self.execute(InfluxQLBatch().create_user(influxdb_username, influxdb_password))
+        return {"username": influxdb_username, "password": influxdb_password}
+
+    async def drop_user(self, influxdb_username: str) -> None:
+        """Drop an influxdb user."""
+        await self.execute(InfluxQLBatch().drop_user(influxdb_username))
+
+    async def list_users(self) -> list:
+        """List influxdb users."""
+        return await self._show("SHOW USERS", "Error listing users.")
+
+    async def create_database(
+        self, influxdb_database: str, retention_policy: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Create an influxdb database and retention policy."""
+        batch = InfluxQLBatch().create_database(influxdb_database)
+        await self.execute(
+            batch.create_retention_policy(influxdb_database, **(retention_policy or {}))
+        )
+
+    async def drop_database(self, influxdb_database: str) -> None:
+        """Drop an influxdb database."""
+        await self.execute(InfluxQLBatch().drop_database(influxdb_database))
+
+    async def list_databases(self) -> list:
+        """List influxdb databases."""
+        return await self._show("SHOW DATABASES", "Error listing databases.")
+
+    async def grant_privilege(
+        self, influxdb_username: str, influxdb_database: str, privilege: str = "all"
+    ) -> None:
+        """Grant an influxdb user permissions on a database."""
+        batch = InfluxQLBatch()
+        await self.execute(batch.grant_privilege(influxdb_username, influxdb_database, privilege))
+
+    async def revoke_privilege(
+        self, influxdb_username: str, influxdb_database: str, privilege: str = "all"
+    ) -> None:
+        """Revoke an influxdb user privilege on a database."""
+        batch = InfluxQLBatch()
+        await self.execute(batch.revoke_privilege(influxdb_username, influxdb_database, privilege))
+
+    async def list_privileges(self, influxdb_username: str) -> list:
+        """List the privileges of an influxdb user."""
+        return await self._show(
+            f"SHOW GRANTS FOR {quote_ident(influxdb_username)}", "Error listing privileges."
+        )
+
+    async def alter_retention_policy(
+        self,
+        influxdb_database: str,
+        name: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        default: bool = False,
+        **options: Any,
+    ) -> None:
+        """Alter a retention policy of a database."""
+        batch = InfluxQLBatch()
+        await self.execute(
+            batch.alter_retention_policy(influxdb_database, name, default=default, **options)
+        )
+
+    async def list_retention_policies(self, influxdb_database: str) -> list:
+        """List the retention policies of an influxdb database."""
+        return await self._show(
+            f"SHOW RETENTION POLICIES ON {quote_ident(influxdb_database)}",
+            f"Error listing retention policies of {influxdb_database}.",
+        )
+
+    async def create_continuous_query(
+        self,
+        influxdb_database: str,
+        name: str,
+        select: str,
+        resample_every: Optional[str] = None,
+        resample_for: Optional[str] = None,
+    ) -> None:
+        """Create a continuous query running `select` on a database."""
+        await self.execute(
+            InfluxQLBatch().create_continuous_query(
+                influxdb_database, name, select, resample_every, resample_for
+            )
+        )
+
+    async def drop_continuous_query(self, influxdb_database: str, name: str) -> None:
+        """Drop a continuous query of a database."""
+        await self.execute(InfluxQLBatch().drop_continuous_query(influxdb_database, name))
+
+    async def list_continuous_queries(self, influxdb_database: Optional[str] = None) -> list:
+        """List the continuous queries of every database, or of one database."""
+        batch = InfluxQLBatch().add("SHOW CONTINUOUS QUERIES", "Error listing continuous queries.")
+        (result,) = await self.execute(batch)
+        return [
+            {"database": series["name"], **dict(zip(series["columns"], values))}
+            for series in result.get("series", [])
+            if influxdb_database in (None, series["name"])
+            for values in series.get("values", [])
+        ]
+
+    async def create_rollup(
+        self,
+        influxdb_database: str,
+        interval: str,
+        duration: str,
+        source: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        aggregate: str = "mean",
+        shard_duration: Optional[str] = None,
+    ) -> str:
+        """Create a downsampling retention policy and its continuous query in one request."""
+        await self.execute(
+            InfluxQLBatch().create_rollup(
+                influxdb_database, interval, duration, source, aggregate, shard_duration
+            )
+        )
+        return rollup_name(interval)
+
+    async def drop_rollup(self, influxdb_database: str, interval: str) -> None:
+        """Drop a rollup continuous query and its downsampling retention policy."""
+        await self.execute(InfluxQLBatch().drop_rollup(influxdb_database, interval))
+
+    async def create_user_and_database(
+        self,
+        influxdb_database: str,
+        retention_policy: Optional[Dict[str, Any]] = None,
+        rollups: Sequence[Tuple[str, str]] = (),
+    ) -> Dict[str, str]:
+        """Create an influxdb user with all privileges on a new database."""
+        influxdb_username = secrets.token_urlsafe(10)
+        influxdb_password = secrets.token_urlsafe(32)
+
+        batch = InfluxQLBatch().provision_database(
+            influxdb_database, influxdb_username, influxdb_password, retention_policy, rollups
+        )
+        await self.execute(batch)
+        return {"username": influxdb_username, "password": influxdb_password}
+
+    async def update_user_password(self, influxdb_username: str, influxdb_password: str) -> None:
+        """Update the password of an influxdb user."""
+        await self.execute(InfluxQLBatch().set_password(influxdb_username, influxdb_password))
+
+    async def _gather(self, coros: Dict[str, Any]) -> Dict[str, Any]:
+        """Await `coros` concurrently, mapping each key to its result or `InfluxDBOpsError`."""
+        results = await asyncio.gather(*coros.values(), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException) and not isinstance(result, InfluxDBOpsError):
+                raise result
+        return dict(zip(coros, results))
+
+    async def create_users_and_databases(
+        self,
+        influxdb_databases: List[str],
+        retention_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        rollups: Optional[Dict[str, Sequence[Tuple[str, str]]]] = None,
+    ) -> Dict[str, Union[Dict[str, str], InfluxDBOpsError]]:
+        """Run `create_user_and_database` for several databases concurrently."""
+        policies, rollups = retention_policies or {}, rollups or {}
+        return await self._gather(
+            {
+                database: self.create_user_and_database(
+                    database, policies.get(database), rollups.get(database, ())
+                )
+                for database in influxdb_databases
+            }
+        )
+
+    async def drop_users(
+        self, influxdb_usernames: List[str]
+    ) -> Dict[str, Optional[InfluxDBOpsError]]:
+        """Drop several influxdb users concurrently."""
+        return await self._gather(
+            {username: self.drop_user(username) for username in influxdb_usernames}
+        )
+
+    async def drop_databases(
+        self, influxdb_databases: List[str]
+    ) -> Dict[str, Optional[InfluxDBOpsError]]:
+        """Drop several influxdb databases concurrently."""
+        return await self._gather(
+            {database: self.drop_database(database) for database in influxdb_databases}
+        )
+
+    async def list_all_privileges(
+        self, influxdb_usernames: Optional[List[str]] = None
+    ) -> Dict[str, Union[list, InfluxDBOpsError]]:
+        """List the privileges of several users, or of every user, concurrently."""
+        if influxdb_usernames is None:
+            influxdb_usernames = [user["user"] for user in await self.list_users()]
+        return await self._gather(
+            {username: self.list_privileges(username) for username in influxdb_usernames}
+        )
+
+    async def _grants(self, influxdb_usernames: List[str]) -> Dict[str, list]:
+        """Return the grants of several users from multi-statement `SHOW GRANTS` requests.
+
+        InfluxDB stops a batch at the first failing statement and reports the
+        statements after it as not executed, so users dropped since they were
+        listed are skipped and the rest of the batch is resent.
+        """
+        grants: Dict[str, list] = {}
+        while influxdb_usernames:
+            batch = InfluxQLBatch()
+            for username in influxdb_usernames:
+                batch.add(f"SHOW GRANTS FOR {quote_ident(username)}", "Error listing privileges.")
+            results = await self._query(batch.query)
+            by_id = {result.get("statement_id", i): result for i, result in enumerate(results)}
+
+            executed = 0
+            for statement_id, username in enumerate(influxdb_usernames):
+                result = by_id.get(statement_id)
+                if result is None or result.get("error") == INFLUXQL_NOT_EXECUTED:
+                    break
+                executed += 1
+                if (error := result.get("error")) is None:
+                    grants[username] = _points(result)
+                elif error != "user not found":
+                    _logger.error(f"Error listing privileges. InfluxDB: {error}")
+                    raise InfluxQLStatementError("Error listing privileges.", statement_id, error)
+            if not executed:
+                raise InfluxDBOpsError("Error listing privileges: batch was not executed.")
+            influxdb_usernames = influxdb_usernames[executed:]
+        return grants
+
+    async def privilege_matrix(
+        self, batch_size: int = INFLUXDB_GRANTS_BATCH_SIZE
+    ) -> Dict[str, Any]:
+        """Return the privileges of every user on every database as a bitmask matrix.
+
+        Users and databases are listed in one request, then the grants of
+        `batch_size` users are fetched per request, with the requests running
+        concurrently. Each row of `matrix` has one digit per database, using
+        the bits of `INFLUXDB_PRIVILEGE_BITS`; admin users are listed apart as
+        they hold every privilege regardless of grants.
+        """
+        batch = InfluxQLBatch().add("SHOW USERS", "Error listing users.")
+        users_result, databases_result = await self.execute(
+            batch.add("SHOW DATABASES", "Error listing databases.")
+        )
+        users = _points(users_result)
+        databases = sorted(database["name"] for database in _points(databases_result))
+        usernames = sorted(user["user"] for user in users)
+
+        grants: Dict[str, list] = {}
+        chunks = [usernames[i : i + batch_size] for i in range(0, len(usernames), batch_size)]
+        for chunk in await asyncio.gather(*(self._grants(chunk) for chunk in chunks)):
+            grants.update(chunk)
+
+        listed = [username for username in usernames if username in grants]
+        column = {database: i for i, database in enumerate(databases)}
+        matrix = []
+        for username in listed:
+            row = [0] * len(databases)
+            for grant in grants[username]:
+                if (i := column.get(grant["database"])) is not None:
+                    row[i] = INFLUXDB_PRIVILEGE_BITS.get(grant["privilege"], 0)
+            matrix.append("".join(map(str, row)))
+
+        return {
+            "users": listed,
+            "databases": databases,
+            "admins": sorted(user["user"] for user in users if user["admin"]),
+            "matrix": matrix,
+        }
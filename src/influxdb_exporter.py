@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# Copyright (c) 2025 Vantage Compute Corporation
+# See LICENSE file for licensing details.
+
+"""Prometheus exporter for influxdb runtime statistics.
+
+Runs as the `influxdb-exporter` systemd service installed by the charm. Every
+poll interval it reads `/debug/vars`, which carries the same statistics as
+`SHOW STATS` and `SHOW DIAGNOSTICS` in a single unauthenticated request, and
+renders the ones below in the Prometheus text format served on `/metrics`.
+
+Only the standard library is used so the exporter runs on the system python
+without the charm's virtualenv.
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+_logger = logging.getLogger(__name__)
+
+
+class Metric(NamedTuple):
+    """A Prometheus metric read from one value of an influxdb statistic."""
+
+    name: str
+    type: str
+    help: str
+    statistic: str
+    value: str
+    labels: Tuple[str, ...] = ()
+    scale: float = 1.0
+    constant_labels: Tuple[Tuple[str, str], ...] = ()
+
+
+# Statistic tags exported as labels, by label name.
+_TAG_LABELS = {"database": "database", "retention_policy": "retentionPolicy", "id": "id"}
+
+METRICS = (
+    # Write throughput.
+    Metric(
+        "influxdb_write_requests_total", "counter", "HTTP write requests.", "httpd", "writeReq"
+    ),
+    Metric(
+        "influxdb_write_request_duration_seconds_total",
+        "counter",
+        "Time spent serving HTTP write requests.",
+        "httpd",
+        "writeReqDurationNs",
+        scale=1e-9,
+    ),
+    Metric(
+        "influxdb_points_written_total",
+        "counter",
+        "Points accepted for writing.",
+        "write",
+        "pointReq",
+    ),
+    Metric("influxdb_write_ok_total", "counter", "Successful shard writes.", "write", "writeOk"),
+    Metric(
+        "influxdb_write_errors_total", "counter", "Failed shard writes.", "write", "writeError"
+    ),
+    Metric(
+        "influxdb_write_timeouts_total",
+        "counter",
+        "Timed out shard writes.",
+        "write",
+        "writeTimeout",
+    ),
+    # Points dropped.
+    Metric(
+        "influxdb_points_dropped_total",
+        "counter",
+        "Points dropped, e.g. outside the retention policy or over a series limit.",
+        "write",
+        "writeDrop",
+    ),
+    Metric(
+        "influxdb_http_points_dropped_total",
+        "counter",
+        "Points dropped by the HTTP endpoint.",
+        "httpd",
+        "pointsWrittenDropped",
+    ),
+    Metric(
+        "influxdb_shard_points_dropped_total",
+        "counter",
+        "Points dropped by shards.",
+        "shard",
+        "writePointsDropped",
+        labels=("database", "retention_policy"),
+    ),
+    # Cache size.
+    Metric(
+        "influxdb_cache_size_bytes",
+        "gauge",
+        "Size of the in-memory shard caches.",
+        "tsm1_cache",
+        "memBytes",
+        labels=("database", "retention_policy"),
+    ),
+    Metric(
+        "influxdb_cache_writes_dropped_total",
+        "counter",
+        "Cache writes dropped.",
+        "tsm1_cache",
+        "writeDropped",
+        labels=("database", "retention_policy"),
+    ),
+    Metric(
+        "influxdb_wal_size_bytes",
+        "gauge",
+        "Size of the WAL segments.",
+        "tsm1_wal",
+        "currentSegmentDiskBytes",
+        labels=("database", "retention_policy"),
+    ),
+    # Compactions.
+    *(
+        Metric(
+            "influxdb_compactions_total",
+            "counter",
+            "Completed compactions by level.",
+            "tsm1_engine",
+            value,
+            labels=("database", "retention_policy"),
+            constant_labels=(("level", level),),
+        )
+        for level, value in (
+            ("cache", "cacheCompactions"),
+            ("1", "tsmLevel1Compactions"),
+            ("2", "tsmLevel2Compactions"),
+            ("3", "tsmLevel3Compactions"),
+            ("optimize", "tsmOptimizeCompactions"),
+            ("full", "tsmFullCompactions"),
+        )
+    ),
+    *(
+        Metric(
+            "influxdb_compactions_active",
+            "gauge",
+            "Running compactions by level.",
+            "tsm1_engine",
+            value,
+            labels=("database", "retention_policy"),
+            constant_labels=(("level", level),),
+        )
+        for level, value in (
+            ("cache", "cacheCompactionsActive"),
+            ("1", "tsmLevel1CompactionsActive"),
+            ("2", "tsmLevel2CompactionsActive"),
+            ("3", "tsmLevel3CompactionsActive"),
+            ("optimize", "tsmOptimizeCompactionsActive"),
+            ("full", "tsmFullCompactionsActive"),
+        )
+    ),
+    # Series cardinality.
+    Metric(
+        "influxdb_series", "gauge", "Series per database.", "database", "numSeries", ("database",)
+    ),
+    Metric(
+        "influxdb_measurements",
+        "gauge",
+        "Measurements per database.",
+        "database",
+        "numMeasurements",
+        ("database",),
+    ),
+    # Query latency.
+    Metric(
+        "influxdb_queries_active", "gauge", "Running queries.", "queryExecutor", "queriesActive"
+    ),
+    Metric(
+        "influxdb_queries_total",
+        "counter",
+        "Finished queries.",
+        "queryExecutor",
+        "queriesFinished",
+    ),
+    Metric(
+        "influxdb_query_duration_seconds_total",
+        "counter",
+        "Time spent executing queries; divide by influxdb_queries_total for the mean latency.",
+        "queryExecutor",
+        "queryDurationNs",
+        scale=1e-9,
+    ),
+    Metric(
+        "influxdb_query_requests_total", "counter", "HTTP query requests.", "httpd", "queryReq"
+    ),
+    Metric(
+        "influxdb_query_request_duration_seconds_total",
+        "counter",
+        "Time spent serving HTTP query requests.",
+        "httpd",
+        "queryReqDurationNs",
+        scale=1e-9,
+    ),
+    # Runtime.
+    Metric("influxdb_heap_bytes", "gauge", "Allocated heap memory.", "runtime", "HeapAlloc"),
+    Metric("influxdb_goroutines", "gauge", "Running goroutines.", "runtime", "NumGoroutine"),
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(debug_vars: Optional[Dict[str, Any]], scrape_seconds: float = 0.0) -> str:
+    """Render the statistics of a `/debug/vars` document in the Prometheus text format.
+
+    Values of statistics reported per shard are summed over the metric's labels.
+    `debug_vars` is None when influxdb could not be polled, in which case only
+    `influxdb_up` and the poll duration are reported.
+    """
+    samples: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+    for stat in (debug_vars or {}).values():
+        if not isinstance(stat, dict) or "values" not in stat:
+            continue
+        tags = stat.get("tags") or {}
+        for metric in METRICS:
+            if metric.statistic != stat.get("name") or metric.value not in stat["values"]:
+                continue
+            labels = tuple(
+                (label, str(tags.get(_TAG_LABELS[label], ""))) for label in metric.labels
+            )
+            labels += metric.constant_labels
+            series = samples.setdefault(metric.name, {})
+            series[labels] = series.get(labels, 0.0) + stat["values"][metric.value] * metric.scale
+
+    lines = [
+        "# HELP influxdb_up Whether the last poll of influxdb succeeded.",
+        "# TYPE influxdb_up gauge",
+        f"influxdb_up {int(debug_vars is not None)}",
+        "# HELP influxdb_exporter_poll_duration_seconds Time taken by the last poll of influxdb.",
+        "# TYPE influxdb_exporter_poll_duration_seconds gauge",
+        f"influxdb_exporter_poll_duration_seconds {scrape_seconds:.6f}",
+    ]
+    if uptime := (debug_vars or {}).get("system", {}).get("uptime"):
+        lines += [
+            "# HELP influxdb_uptime_seconds Time since influxdb started.",
+            "# TYPE influxdb_uptime_seconds gauge",
+            f"influxdb_uptime_seconds {uptime}",
+        ]
+
+    described = set()
+    for metric in METRICS:
+        if metric.name not in samples or metric.name in described:
+            continue
+        described.add(metric.name)
+        lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.type}"]
+        for labels, value in sorted(samples[metric.name].items()):
+            label_set = ",".join(f'{name}="{_escape(v)}"' for name, v in labels)
+            lines.append(
+                f"{metric.name}{{{label_set}}} {value:g}"
+                if label_set
+                else f"{metric.name} {value:g}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+class InfluxDBExporter:
+    """Poll influxdb in the background and keep the last rendered metrics."""
+
+    def __init__(self, host: str, port: int, interval: float, timeout: float = 5.0):
+        self._host = host
+        self._port = port
+        self._interval = interval
+        self._timeout = timeout
+        self._stop = threading.Event()
+        self.metrics = render(None)
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """Poll `/debug/vars` once and render its statistics."""
+        start = time.perf_counter()
+        debug_vars = None
+        conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+        try:
+            conn.request("GET", "/debug/vars")
+            response = conn.getresponse()
+            body = response.read()
+            if response.status == 200:
+                debug_vars = json.loads(body)
+            else:
+                _logger.warning(f"influxdb returned {response.status} for /debug/vars.")
+        except (http.client.HTTPException, OSError, ValueError) as e:
+            _logger.warning(f"Failed to poll influxdb: {e}")
+        finally:
+            conn.close()
+        self.metrics = render(debug_vars, time.perf_counter() - start)
+        return debug_vars
+
+    def run(self) -> None:
+        """Poll every interval until stopped."""
+        while not self._stop.is_set():
+            self.poll()
+            self._stop.wait(self._interval)
+
+    def stop(self) -> None:
+        """Stop polling."""
+        self._stop.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    exporter: InfluxDBExporter
+
+    def do_GET(self) -> None:  # noqa: N802
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.exporter.metrics.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def serve(exporter: InfluxDBExporter, address: str, port: int) -> ThreadingHTTPServer:
+    """Return an HTTP server serving the exporter's metrics on `/metrics`."""
+    handler = type("Handler", (_Handler,), {"exporter": exporter})
+    return ThreadingHTTPServer((address, port), handler)
+
+
+def main() -> None:
+    """Run the exporter until interrupted."""
+    parser = argparse.ArgumentParser(description=(__doc__ or "").splitlines()[0])
+    parser.add_argument("--port", type=int, default=9122, help="Port to serve metrics on.")
+    parser.add_argument("--address", default="", help="Address to serve metrics on.")
+    parser.add_argument("--influxdb-host", default="127.0.0.1")
+    parser.add_argument("--influxdb-port", type=int, default=8086)
+    parser.add_argument("--interval", type=float, default=10.0, help="Seconds between polls.")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    exporter = InfluxDBExporter(args.influxdb_host, args.influxdb_port, args.interval)
+    threading.Thread(target=exporter.run, daemon=True).start()
+    server = serve(exporter, args.address, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        exporter.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,140 @@
 #!/usr/bin/python3
 
-"""influx_ops."""
+"""influx_ops.
 
+Every hook runs the charm from a cold interpreter, so modules that only some
+hooks need (the influxdb client, the apt charm library, thread pools) are
+imported inside the functions that use them rather than at module level.
+"""
+
+import contextlib
+import hashlib
+import json
 import logging
+import os
+import re
 import secrets
 import subprocess
-from shutil import copy2
-from typing import Any, Dict
+import time
+from datetime import datetime
+from pathlib import Path
+from string import Template
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+    cast,
+)
+
+import yaml
 
-import charms.operator_libs_linux.v0.apt as apt
-from influxdb import InfluxDBClient
+from constants import (
+    DEFAULT_INFLUXDB_REPLICATION,
+    DEFAULT_INFLUXDB_RETENTION_DURATION,
+    DEFAULT_INFLUXDB_RETENTION_POLICY,
+    INFLUXDB_ADMIN_USERNAME,
+    INFLUXDB_BACKUP_COMPRESSIONS,
+    INFLUXDB_BACKUP_DIR,
+    INFLUXDB_BACKUP_INDEX,
+    INFLUXDB_CARDINALITY_BATCH_SIZE,
+    INFLUXDB_DATA_DIR,
+    INFLUXDB_DEFERRABLE_SETTINGS,
+    INFLUXDB_EXPORTER_POLL_INTERVAL,
+    INFLUXDB_EXPORTER_SERVICE,
+    INFLUXDB_INDEX_VERSIONS,
+    INFLUXDB_PORT,
+    INFLUXDB_READY_BACKOFF_MAX_SECONDS,
+    INFLUXDB_READY_BACKOFF_SECONDS,
+    INFLUXDB_READY_TIMEOUT,
+    INFLUXDB_ROLLUP_AGGREGATES,
+    INFLUXDB_WAL_DIR,
+)
+from influxdb_probe import InfluxDBProbe
 
-from constants import DEFAULT_INFLUXDB_RETENTION_POLICY, INFLUXDB_ADMIN_USERNAME, INFLUXDB_PORT
+if TYPE_CHECKING:
+    import tarfile
+
+    from influxdb import InfluxDBClient
+    from influxdb.resultset import ResultSet
 
 _logger = logging.getLogger(__name__)
 
 
-INFLUX_PACKAGES = ["influxdb", "influxdb-client"]
+INFLUX_PACKAGES = ["influxdb", "influxdb-client", "zstd"]
+INFLUXDB_ADMIN_POOL_SIZE = 10
+INFLUXDB_PRIVILEGES = {"all": "ALL PRIVILEGES", "read": "READ", "write": "WRITE"}
+INFLUXDB_CONFIG_TEMPLATE = Path("./src/templates/influxdb.conf")
+INFLUXDB_CONFIG_PATH = Path("/etc/influxdb/influxdb.conf")
+INFLUXDB_EXPORTER_SOURCE = Path("./src/influxdb_exporter.py")
+INFLUXDB_EXPORTER_SCRIPT = Path("/usr/local/bin/influxdb-exporter")
+INFLUXDB_EXPORTER_UNIT_TEMPLATE = Path("./src/templates/influxdb-exporter.service")
+INFLUXDB_EXPORTER_UNIT_PATH = Path(f"/etc/systemd/system/{INFLUXDB_EXPORTER_SERVICE}.service")
+
+# Ingest listeners by protocol: default port and transport, and their options with types.
+_LISTENER_BATCHING = {"batch-size": int, "batch-pending": int, "batch-timeout": str}
+INFLUXDB_INGEST_LISTENERS: Dict[str, Dict[str, Any]] = {
+    "udp": {
+        "port": 8089,
+        "transport": "udp",
+        "options": {**_LISTENER_BATCHING, "precision": str, "read-buffer": int},
+    },
+    "graphite": {
+        "port": 2003,
+        "transport": "tcp",
+        "options": {
+            **_LISTENER_BATCHING,
+            "protocol": str,
+            "consistency-level": str,
+            "udp-read-buffer": int,
+            "separator": str,
+            "tags": list,
+            "templates": list,
+        },
+    },
+    "collectd": {
+        "port": 25826,
+        "transport": "udp",
+        "options": {
+            **_LISTENER_BATCHING,
+            "typesdb": str,
+            "security-level": str,
+            "auth-file": str,
+            "read-buffer": int,
+            "parse-multivalue-plugin": str,
+        },
+    },
+    "opentsdb": {
+        "port": 4242,
+        "transport": "tcp",
+        "options": {
+            **_LISTENER_BATCHING,
+            "consistency-level": str,
+            "log-point-errors": bool,
+            "tls-enabled": bool,
+            "certificate": str,
+        },
+    },
+}
+_LISTENER_CHOICES = {
+    "precision": ("", "n", "u", "ms", "s", "m", "h"),
+    "protocol": ("tcp", "udp"),
+    "consistency-level": ("any", "one", "quorum", "all"),
+    "security-level": ("none", "sign", "encrypt"),
+    "parse-multivalue-plugin": ("split", "join"),
+}
+
+_SIZE_RE = re.compile(r"^\d+[kmg]?$", re.IGNORECASE)
+_DURATION_RE = re.compile(r"^\d+(ns|us|µs|ms|s|m|h)$")
+_RP_DURATION_RE = re.compile(r"^(\d+[wdhms])+$")
+_RP_DURATION_UNITS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
 
 
 def install() -> None:
@@ -29,6 +147,8 @@ def install() -> None:
         This function uses the `influxdb` packages hosted within the
         upstream InfluxDB PPA located at https://repos.influxdata.com/ubuntu.
     """
+    import charms.operator_libs_linux.v0.apt as apt
+
     try:
         apt.update()
         _logger.info("installing packages `%s` using apt", INFLUX_PACKAGES)
@@ -38,15 +158,390 @@ def install() -> None:
         raise InfluxDBOpsError("Failed to install InfluxDB.")
 
 
-def write_influxdb_configuration_and_restart_service() -> None:
-    """Write InfluxDB config and restart the service."""
-    copy2("./src/templates/influxdb.conf", "/etc/influxdb/influxdb.conf")
-    subprocess.run(["systemctl", "restart", "influxdb"])
+def _toml_value(setting: str, value: Any) -> str:
+    """Validate a setting and return it formatted as a TOML value.
+
+    Raises:
+        InfluxDBOpsError: Raised if the value is not valid for the setting.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        if value < 0:
+            raise InfluxDBOpsError(f"Invalid {setting}: must not be negative.")
+        return str(value)
+
+    value = str(value)
+    if setting == "index-version" and value not in INFLUXDB_INDEX_VERSIONS:
+        raise InfluxDBOpsError(f"Invalid {setting}: expected one of {INFLUXDB_INDEX_VERSIONS}.")
+    if setting.endswith("-size") and not _SIZE_RE.match(value):
+        raise InfluxDBOpsError(f"Invalid {setting}: expected a size such as 512m or 1g.")
+    if setting.endswith("-delay") and not _DURATION_RE.match(value):
+        raise InfluxDBOpsError(f"Invalid {setting}: expected a duration such as 0s or 100ms.")
+    return json.dumps(value)
+
+
+def _is_listener_value(value: Any, expected: type) -> bool:
+    """Return whether an ingest listener option value is of the expected type."""
+    if expected is int:
+        # bool is an int, but not a valid number of points or bytes.
+        return isinstance(value, int) and not isinstance(value, bool)
+    if expected is list:
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
+    return isinstance(value, expected)
+
+
+def _validate_listener(protocol: str, listener: Any) -> Dict[str, Any]:
+    """Validate the options of an ingest listener and fill in its bind address and database.
+
+    Raises:
+        InfluxDBOpsError: Raised if an option is unknown or invalid.
+    """
+    spec = INFLUXDB_INGEST_LISTENERS[protocol]
+    types = {"bind-address": str, "database": str, "retention-policy": str, **spec["options"]}
+    if not isinstance(listener, dict):
+        raise InfluxDBOpsError(f"Invalid {protocol} listener: expected a mapping of options.")
+    for option, value in listener.items():
+        expected = types.get(option)
+        if expected is None:
+            raise InfluxDBOpsError(f"Invalid {protocol} listener: unknown option {option}.")
+        if not _is_listener_value(value, expected):
+            raise InfluxDBOpsError(
+                f"Invalid {protocol} listener: {option} must be a {expected.__name__}."
+            )
+        if expected is int and value < 0:
+            raise InfluxDBOpsError(f"Invalid {protocol} listener: {option} must not be negative.")
+        if option in _LISTENER_CHOICES and value not in _LISTENER_CHOICES[option]:
+            raise InfluxDBOpsError(
+                f"Invalid {protocol} listener: {option} must be one of "
+                f"{_LISTENER_CHOICES[option]}."
+            )
+    if not _DURATION_RE.match(listener.get("batch-timeout", "1s")):
+        raise InfluxDBOpsError(f"Invalid {protocol} listener: batch-timeout must be a duration.")
+
+    listener = {
+        "bind-address": f":{spec['port']}",
+        "database": protocol,
+        **listener,
+    }
+    port = listener["bind-address"].rpartition(":")[2]
+    if not port.isdigit() or not 0 < int(port) <= 65535:
+        raise InfluxDBOpsError(
+            f"Invalid {protocol} listener: bind-address must be [host]:port, "
+            f"got {listener['bind-address']}."
+        )
+    return listener
+
+
+def parse_ingest_listeners(spec: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Parse the YAML `ingest-listeners` config into the listeners of each protocol.
+
+    Each protocol maps to a list of listeners, each a mapping of its
+    influxdb.conf options::
+
+        udp:
+          - {bind-address: ":8089", database: telemetry, batch-size: 5000, read-buffer: 8388608}
+        graphite:
+          - {bind-address: ":2003", protocol: udp}
+
+    `bind-address` defaults to the protocol's usual port and `database` to the
+    protocol name.
+
+    Raises:
+        InfluxDBOpsError: Raised if the spec is malformed or two listeners share a port.
+    """
+    try:
+        data = yaml.safe_load(spec) or {}
+    except yaml.YAMLError as e:
+        raise InfluxDBOpsError(f"Invalid ingest-listeners: {e}")
+    if not isinstance(data, dict) or not set(data) <= set(INFLUXDB_INGEST_LISTENERS):
+        raise InfluxDBOpsError(
+            "Invalid ingest-listeners: expected a mapping of "
+            f"{', '.join(INFLUXDB_INGEST_LISTENERS)} to lists of listeners."
+        )
+
+    listeners = {}
+    for protocol, items in data.items():
+        if not isinstance(items, list):
+            raise InfluxDBOpsError(f"Invalid ingest-listeners: {protocol} must be a list.")
+        listeners[protocol] = [_validate_listener(protocol, item) for item in items]
+
+    ports = [(endpoint["transport"], endpoint["port"]) for endpoint in ingest_endpoints(listeners)]
+    if duplicates := sorted({f"{t}/{p}" for t, p in ports if ports.count((t, p)) > 1}):
+        raise InfluxDBOpsError(f"Invalid ingest-listeners: ports used twice: {duplicates}.")
+    return listeners
+
+
+def ingest_endpoints(listeners: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Return the protocol, transport, port and database of every ingest listener."""
+    endpoints = []
+    for protocol, items in listeners.items():
+        spec = INFLUXDB_INGEST_LISTENERS[protocol]
+        for listener in items:
+            endpoints.append(
+                {
+                    "protocol": protocol,
+                    "transport": listener.get("protocol", spec["transport"]),
+                    "port": int(listener["bind-address"].rpartition(":")[2]),
+                    "database": listener["database"],
+                }
+            )
+    return endpoints
+
+
+def render_ingest_listeners(listeners: Dict[str, List[Dict[str, Any]]]) -> str:
+    """Render ingest listeners as enabled influxdb.conf `[[<protocol>]]` sections."""
+    lines = []
+    for protocol in INFLUXDB_INGEST_LISTENERS:
+        for listener in listeners.get(protocol, []):
+            lines += [f"[[{protocol}]]", "  enabled = true"]
+            for option, value in listener.items():
+                if isinstance(value, bool):
+                    rendered = "true" if value else "false"
+                elif isinstance(value, int):
+                    rendered = str(value)
+                else:
+                    rendered = json.dumps(value)
+                lines.append(f"  {option} = {rendered}")
+            lines.append("")
+    return "\n".join(lines)
+
+
+def render_influxdb_configuration(settings: Dict[str, Any]) -> str:
+    """Render the influxdb.conf template.
+
+    Args:
+        settings: influxdb.conf option values keyed by option name, e.g.
+            `cache-max-memory-size`, and the `ingest-listeners` spec.
+
+    Raises:
+        InfluxDBOpsError: Raised if a setting is invalid or missing.
+    """
+    template = Template(INFLUXDB_CONFIG_TEMPLATE.read_text())
+    values = {
+        setting.replace("-", "_"): _toml_value(setting, value)
+        for setting, value in settings.items()
+        if setting != "ingest-listeners"
+    }
+    values["ingest_listeners"] = render_ingest_listeners(
+        parse_ingest_listeners(settings.get("ingest-listeners", ""))
+    )
+    try:
+        return template.substitute(values)
+    except KeyError as e:
+        raise InfluxDBOpsError(f"Missing influxdb setting: {e.args[0]}.")
+
+
+def write_influxdb_configuration_and_restart_service(
+    settings: Dict[str, Any], applied_settings: Optional[Dict[str, Any]] = None
+) -> Tuple[Dict[str, Any], bool]:
+    """Write InfluxDB config and restart the service if a change requires it.
+
+    Nothing is written or restarted when the rendered config matches the one
+    on disk. Otherwise the config is written, and influxdb is only restarted
+    if a setting outside `INFLUXDB_DEFERRABLE_SETTINGS` changed; deferrable
+    changes take effect the next time influxdb restarts.
+
+    Args:
+        settings: The influxdb.conf settings to render.
+        applied_settings: The settings influxdb is currently running with, if known.
+
+    Returns:
+        The settings influxdb is running with after the call, and whether
+        influxdb was restarted.
+
+    Raises:
+        InfluxDBOpsError: Raised if the configuration cannot be rendered or
+            influxdb cannot be restarted.
+    """
+    config = render_influxdb_configuration(settings)
+    current = INFLUXDB_CONFIG_PATH.read_bytes() if INFLUXDB_CONFIG_PATH.exists() else b""
+    if hashlib.sha256(current).digest() == hashlib.sha256(config.encode()).digest():
+        _logger.debug("influxdb.conf unchanged, skipping write and restart.")
+        # Settings added since influxdb was started are in effect if influxdb.conf is unchanged.
+        return {**settings, **(applied_settings or {})}, False
+
+    INFLUXDB_CONFIG_PATH.write_text(config)
+
+    applied_settings = applied_settings or {}
+    changed = {key for key, value in settings.items() if applied_settings.get(key) != value}
+    if not applied_settings or changed - INFLUXDB_DEFERRABLE_SETTINGS:
+        _logger.debug(f"Restarting influxdb to apply: {sorted(changed)}.")
+        try:
+            restart_influxdb()
+        except InfluxDBOpsError:
+            # Put back the previous config so that the next write restarts again.
+            INFLUXDB_CONFIG_PATH.write_bytes(current)
+            raise
+        return dict(settings), True
+
+    _logger.debug(f"Deferring until the next influxdb restart: {sorted(changed)}.")
+    return dict(applied_settings), False
+
+
+def restart_influxdb() -> None:
+    """Restart influxdb, applying every setting written to influxdb.conf.
+
+    Raises:
+        InfluxDBOpsError: Raised if influxdb cannot be restarted.
+    """
+    if subprocess.run(["systemctl", "restart", "influxdb"]).returncode != 0:
+        raise InfluxDBOpsError("Failed to restart influxdb.")
+
+
+def configure_exporter_service(port: int) -> None:
+    """Install and (re)start the Prometheus exporter service, or stop it if `port` is 0.
+
+    The exporter script and its systemd unit are only rewritten, and the
+    service only restarted, when either changed or the service is not
+    running, e.g. after a failed start.
+
+    Raises:
+        InfluxDBOpsError: Raised if the service cannot be started or stopped.
+    """
+    if not port:
+        if INFLUXDB_EXPORTER_UNIT_PATH.exists():
+            subprocess.run(["systemctl", "disable", "--now", INFLUXDB_EXPORTER_SERVICE])
+            INFLUXDB_EXPORTER_UNIT_PATH.unlink()
+            subprocess.run(["systemctl", "daemon-reload"])
+        return
+
+    script = INFLUXDB_EXPORTER_SOURCE.read_text()
+    unit = Template(INFLUXDB_EXPORTER_UNIT_TEMPLATE.read_text()).substitute(
+        script=INFLUXDB_EXPORTER_SCRIPT,
+        port=port,
+        influxdb_port=INFLUXDB_PORT,
+        interval=INFLUXDB_EXPORTER_POLL_INTERVAL,
+    )
+    changed = False
+    for path, content in ((INFLUXDB_EXPORTER_SCRIPT, script), (INFLUXDB_EXPORTER_UNIT_PATH, unit)):
+        if not path.exists() or path.read_text() != content:
+            path.write_text(content)
+            changed = True
+    INFLUXDB_EXPORTER_SCRIPT.chmod(0o755)
+    if not changed:
+        active = ["systemctl", "is-active", "--quiet", INFLUXDB_EXPORTER_SERVICE]
+        if subprocess.run(active).returncode == 0:
+            return
+        _logger.warning("influxdb exporter is not running, restarting it.")
+
+    subprocess.run(["systemctl", "daemon-reload"])
+    if subprocess.run(["systemctl", "enable", INFLUXDB_EXPORTER_SERVICE]).returncode != 0:
+        raise InfluxDBOpsError("Failed to enable the influxdb exporter.")
+    if subprocess.run(["systemctl", "restart", INFLUXDB_EXPORTER_SERVICE]).returncode != 0:
+        raise InfluxDBOpsError("Failed to start the influxdb exporter.")
+    _logger.debug(f"influxdb exporter serving on port {port}.")
+
+
+def _sync_tree(source: Path, target: Path) -> None:
+    """Make `target` a copy of `source`, only copying files whose size or mtime differ.
+
+    Symlinks, such as shards moved to cold storage, are copied as symlinks.
+    Files no longer in `source` are removed from `target`.
+    """
+    import shutil
+
+    for path in source.rglob("*"):
+        dest = target / path.relative_to(source)
+        if path.is_symlink():
+            if not dest.is_symlink() or os.readlink(dest) != os.readlink(path):
+                dest.unlink(missing_ok=True)
+                dest.symlink_to(os.readlink(path))
+        elif path.is_dir():
+            dest.mkdir(parents=True, exist_ok=True)
+        else:
+            stat = path.stat()
+            if not dest.is_file() or (dest.stat().st_size, dest.stat().st_mtime) != (
+                stat.st_size,
+                stat.st_mtime,
+            ):
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, dest)
+
+    for dest in sorted(target.rglob("*"), reverse=True):
+        if not os.path.lexists(source / dest.relative_to(target)):
+            if dest.is_dir() and not dest.is_symlink():
+                shutil.rmtree(dest)
+            else:
+                dest.unlink()
+
+
+def migrate_storage(source: str, target: str, remove_source: bool = True) -> Dict[str, Any]:
+    """Move an influxdb data or WAL directory to `target`, e.g. on newly attached storage.
+
+    Files are copied while influxdb keeps running, then influxdb is stopped
+    and only the files changed in the meantime are copied again. influxdb is
+    left stopped: writing influxdb.conf for the new directory restarts it. If
+    the copy fails once influxdb is stopped, influxdb is started again on the
+    untouched `source`. A `source` that cannot be removed is only logged. If
+    `source` is empty or missing, `target` is only created.
+
+    Args:
+        source: The directory influxdb currently uses.
+        target: The directory to move it to.
+        remove_source: Remove `source` once copied, to free its disk.
+
+    Returns:
+        The bytes copied, the time taken and the time influxdb was stopped.
+
+    Raises:
+        InfluxDBOpsError: Raised if `target` is too small or the copy fails.
+    """
+    import shutil
+
+    start = time.monotonic()
+    src, dest = Path(source), Path(target)
+    size, downtime = 0, 0.0
+    stopped: Optional[float] = None
+    moved = False
+    try:
+        dest.mkdir(parents=True, exist_ok=True)
+        if src.is_dir() and any(src.iterdir()):
+            size = sum(path.stat().st_size for path in src.rglob("*") if path.is_file())
+            if shutil.disk_usage(dest).free < size:
+                raise InfluxDBOpsError(
+                    f"Not enough space in {target} for the {size / 1024**3:.1f}GiB in {source}."
+                )
+            _sync_tree(src, dest)
+            if subprocess.run(["systemctl", "stop", "influxdb"]).returncode != 0:
+                raise InfluxDBOpsError("Failed to stop influxdb.")
+            stopped = time.monotonic()
+            _sync_tree(src, dest)
+            downtime = time.monotonic() - stopped
+        subprocess.run(["chown", "-R", "influxdb:influxdb", str(dest)])
+        moved = True
+    except OSError as e:
+        raise InfluxDBOpsError(f"Failed to move {source} to {target}: {e}")
+    finally:
+        if stopped is not None and not moved:
+            subprocess.run(["systemctl", "start", "influxdb"])
+
+    if remove_source and stopped is not None:
+        remove_storage(source)
+
+    _logger.debug(f"Moved {source} to {target} with {downtime:.1f}s of downtime.")
+    return {
+        "bytes": size,
+        "seconds": round(time.monotonic() - start, 1),
+        "downtime-seconds": round(downtime, 1),
+    }
+
+
+def remove_storage(source: str) -> None:
+    """Remove a data or WAL directory moved by `migrate_storage`, only logging a failure."""
+    import shutil
+
+    try:
+        shutil.rmtree(source)
+    except OSError as e:
+        _logger.warning(f"Failed to remove {source} after moving it: {e}")
 
 
 def create_influxdb_admin_user() -> str:
     """Create the influxdb admin user."""
-    client = InfluxDBClient(host="localhost", port=8086)
+    from influxdb import InfluxDBClient
+
+    client = InfluxDBClient(host="127.0.0.1", port=int(INFLUXDB_PORT))
     admin_password = secrets.token_urlsafe(32)
     try:
         client.create_user(INFLUXDB_ADMIN_USERNAME, admin_password, admin=True)
@@ -60,16 +555,965 @@ def create_influxdb_admin_user() -> str:
 
 def version() -> str:
     """Test influxdb health by using the ping command to return the version."""
-    client = InfluxDBClient(host="localhost", port=8086)
-    vers = ""
+    with InfluxDBProbe() as probe:
+        vers = probe.ping()
+    if vers:
+        _logger.debug(f"InfluxDB healthy. Running version: {vers}.")
+    return vers
+
+
+def influxdb_memory_usage() -> int:
+    """Return the resident memory of the influxd process in bytes, or 0 if it is not running."""
+    pid = subprocess.run(
+        ["systemctl", "show", "influxdb", "--property=MainPID", "--value"],
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
     try:
-        vers = client.ping()
-        _logger.debug(f"InfluxDB healthy. Running version: {version}.")
-    except Exception:
-        print("Error creating admin user.")
+        status = Path(f"/proc/{int(pid)}/status").read_text()
+    except (ValueError, OSError):
+        return 0
+
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) * 1024
+    return 0
+
+
+def storage_usage(
+    data_dir: str = INFLUXDB_DATA_DIR, wal_dir: str = INFLUXDB_WAL_DIR
+) -> Dict[str, Optional[int]]:
+    """Return the usage of the filesystem holding the data directory, and the size of the WAL.
+
+    Both are cheap to read: the filesystem usage comes from `statvfs`, and the
+    WAL only holds the few segments not yet compacted into TSM files. Either
+    is None if its directory does not exist.
+    """
+    import shutil
+
+    usage: Dict[str, Optional[int]] = {"disk-used-percent": None, "wal-bytes": None}
+    try:
+        disk = shutil.disk_usage(data_dir)
+        usage["disk-used-percent"] = round(disk.used * 100 / disk.total) if disk.total else 0
+    except OSError:
+        pass
+    if Path(wal_dir).is_dir():
+        usage["wal-bytes"] = sum(
+            path.stat().st_size for path in Path(wal_dir).rglob("*") if path.is_file()
+        )
+    return usage
+
+
+def list_shards(data_dir: str = INFLUXDB_DATA_DIR) -> List[Tuple[str, str, str]]:
+    """Return the (database, retention policy, shard id) of every shard on disk."""
+    shards = []
+    for shard in sorted(Path(data_dir).glob("*/*/*")):
+        if shard.is_dir() and shard.name.isdigit():
+            shards.append((shard.parent.parent.name, shard.parent.name, shard.name))
+    return shards
+
+
+def shard_loading_progress(since: float, data_dir: str = INFLUXDB_DATA_DIR) -> Tuple[int, int]:
+    """Return how many of the shards on disk influxdb has opened since `since`.
+
+    Progress is read from the "Opened shard" messages influxdb logs to the
+    journal while it loads shards at startup.
+    """
+    journal = subprocess.run(
+        ["journalctl", "--unit", "influxdb", "--output", "cat", "--since", f"@{int(since)}"],
+        capture_output=True,
+        text=True,
+    ).stdout
+    opened = sum("Opened shard" in line for line in journal.splitlines())
+    return opened, len(list_shards(data_dir))
+
+
+def wait_until_ready(
+    timeout: float = INFLUXDB_READY_TIMEOUT,
+    progress: Optional[Callable[[int, int], None]] = None,
+    data_dir: str = INFLUXDB_DATA_DIR,
+) -> bool:
+    """Poll influxdb with capped exponential backoff until it is ready or `timeout` expires.
+
+    Args:
+        timeout: Seconds to wait for influxdb to become ready.
+        progress: Called with the number of opened and total shards between polls.
+        data_dir: The influxdb data directory, used to count shards.
+
+    Returns:
+        True if influxdb became ready before the deadline.
+    """
+    started = time.time()
+    deadline = time.monotonic() + timeout
+    delay = INFLUXDB_READY_BACKOFF_SECONDS
+    with InfluxDBProbe() as probe:
+        while not probe.ready():
+            if time.monotonic() + delay > deadline:
+                _logger.error(f"InfluxDB not ready after {timeout}s.")
+                return False
+            if progress is not None:
+                progress(*shard_loading_progress(started, data_dir))
+            time.sleep(delay)
+            delay = min(delay * 2, INFLUXDB_READY_BACKOFF_MAX_SECONDS)
+    _logger.debug(f"InfluxDB ready after {time.time() - started:.1f}s.")
+    return True
+
+
+def build_tsi_index(
+    workers: int = 0, data_dir: str = INFLUXDB_DATA_DIR, wal_dir: str = INFLUXDB_WAL_DIR
+) -> Dict[str, Any]:
+    """Convert every shard on disk to the tsi1 index.
+
+    influxdb is stopped while `influx_inspect buildtsi` runs for each shard,
+    in parallel on up to `workers` processes (default: one per core), and is
+    started again afterwards. `index-version` must already be set to tsi1 in
+    influxdb.conf for the new indexes to be used.
+
+    Returns:
+        The number of shards converted, the shards that failed, and the
+        resident memory of influxd before and after the migration.
+
+    Raises:
+        InfluxDBOpsError: Raised if influxdb cannot be stopped.
+    """
+    memory_before = influxdb_memory_usage()
+    if subprocess.run(["systemctl", "stop", "influxdb"]).returncode != 0:
+        raise InfluxDBOpsError("Failed to stop influxdb.")
+
+    def _buildtsi(shard: Tuple[str, str, str]) -> bool:
+        database, retention_policy, shard_id = shard
+        cmd = [
+            "runuser", "-u", "influxdb", "--",
+            "influx_inspect", "buildtsi",
+            "-datadir", data_dir,
+            "-waldir", wal_dir,
+            "-database", database,
+            "-retention", retention_policy,
+            "-shard", shard_id,
+        ]  # fmt: skip
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            _logger.error(f"buildtsi failed for shard {'/'.join(shard)}: {result.stderr}")
+        return result.returncode == 0
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    shards = list_shards(data_dir)
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+            succeeded = list(pool.map(_buildtsi, shards))
     finally:
-        client.close()
-    return vers
+        subprocess.run(["systemctl", "start", "influxdb"])
+    elapsed = time.monotonic() - start
+
+    wait_until_ready(data_dir=data_dir)
+    memory_after = influxdb_memory_usage()
+    _logger.debug(f"Built tsi1 index for {len(shards)} shards in {elapsed:.1f}s.")
+    return {
+        "shards": len(shards),
+        "failed": ["/".join(shard) for shard, ok in zip(shards, succeeded) if not ok],
+        "seconds": round(elapsed, 1),
+        "memory-before": memory_before,
+        "memory-after": memory_after,
+    }
+
+
+def _shard_last_write(shard: Tuple[str, str, str], data_dir: str, wal_dir: str) -> float:
+    """Return the newest modification time of the data and WAL files of a shard."""
+    mtimes = [
+        path.stat().st_mtime
+        for root in (Path(data_dir).joinpath(*shard), Path(wal_dir).joinpath(*shard))
+        for path in (root.rglob("*") if root.is_dir() else ())
+        if path.is_file()
+    ]
+    return max(mtimes, default=0.0)
+
+
+def cold_shards(
+    age: str,
+    cold_dir: str,
+    data_dir: str = INFLUXDB_DATA_DIR,
+    wal_dir: str = INFLUXDB_WAL_DIR,
+) -> List[Tuple[str, str, str]]:
+    """Return the shards on fast storage that have not been written to for `age`.
+
+    Args:
+        age: A duration literal such as 30d.
+        cold_dir: The cold storage directory, which must exist.
+        data_dir: The influxdb data directory.
+        wal_dir: The influxdb WAL directory.
+
+    Raises:
+        InfluxDBOpsError: Raised if `age` or `cold_dir` is invalid.
+    """
+    try:
+        seconds = _rp_duration_seconds(age)
+    except ValueError:
+        raise InfluxDBOpsError(f"Invalid cold-shard-age: {age}, expected a duration such as 30d.")
+    if not seconds:
+        raise InfluxDBOpsError("Invalid cold-shard-age: INF never moves shards.")
+    if not Path(cold_dir).is_absolute() or not Path(cold_dir).is_dir():
+        raise InfluxDBOpsError(f"Cold storage path {cold_dir} is not an existing directory.")
+
+    cutoff = time.time() - seconds
+    return [
+        shard
+        for shard in list_shards(data_dir)
+        if not Path(data_dir).joinpath(*shard).is_symlink()
+        and _shard_last_write(shard, data_dir, wal_dir) < cutoff
+    ]
+
+
+def move_shards_to_cold_storage(
+    shards: Sequence[Tuple[str, str, str]],
+    cold_dir: str,
+    data_dir: str = INFLUXDB_DATA_DIR,
+    wal_dir: str = INFLUXDB_WAL_DIR,
+) -> Dict[str, Any]:
+    """Move shards to cold storage, leaving a symlink in the data directory.
+
+    Shards are copied to `<cold_dir>/<database>/<retention policy>/<id>` while
+    influxdb keeps running. influxdb is then stopped only to swap each shard
+    directory for a symlink to its copy, and started again. A shard written to
+    while it was copied stays on fast storage until the next run. WAL segments
+    stay on fast storage.
+
+    Returns:
+        The shards moved and skipped, the time taken and the time influxdb was stopped.
+
+    Raises:
+        InfluxDBOpsError: Raised if influxdb cannot be stopped or a shard cannot be swapped.
+    """
+    import shutil
+
+    start = time.monotonic()
+    copies = {}
+    for shard in shards:
+        written = _shard_last_write(shard, data_dir, wal_dir)
+        copy = Path(cold_dir).joinpath(*shard[:2], f".{shard[2]}.tmp")
+        shutil.rmtree(copy, ignore_errors=True)
+        try:
+            shutil.copytree(Path(data_dir).joinpath(*shard), copy, symlinks=True)
+        except OSError as e:
+            _logger.error(f"Copying shard {'/'.join(shard)} to {cold_dir} failed: {e}")
+            shutil.rmtree(copy, ignore_errors=True)
+            continue
+        subprocess.run(["chown", "-R", "influxdb:influxdb", str(Path(cold_dir) / shard[0])])
+        copies[shard] = (copy, written)
+
+    if subprocess.run(["systemctl", "stop", "influxdb"]).returncode != 0:
+        for copy, _ in copies.values():
+            shutil.rmtree(copy, ignore_errors=True)
+        raise InfluxDBOpsError("Failed to stop influxdb.")
+
+    stopped = time.monotonic()
+    moved, skipped = [], ["/".join(shard) for shard in shards if shard not in copies]
+    try:
+        for shard, (copy, written) in copies.items():
+            if _shard_last_write(shard, data_dir, wal_dir) != written:
+                shutil.rmtree(copy, ignore_errors=True)
+                skipped.append("/".join(shard))
+                continue
+            hot = Path(data_dir).joinpath(*shard)
+            # Left behind if a previous run was interrupted before the symlink was made.
+            shutil.rmtree(copy.with_name(shard[2]), ignore_errors=True)
+            copy.rename(copy.with_name(shard[2]))
+            shutil.rmtree(hot)
+            hot.symlink_to(copy.with_name(shard[2]), target_is_directory=True)
+            moved.append("/".join(shard))
+    except OSError as e:
+        raise InfluxDBOpsError(f"Moving shards to {cold_dir} failed: {e}")
+    finally:
+        subprocess.run(["systemctl", "start", "influxdb"])
+    downtime = time.monotonic() - stopped
+
+    wait_until_ready(data_dir=data_dir)
+    _logger.debug(f"Moved {len(moved)} shards to {cold_dir} with {downtime:.1f}s of downtime.")
+    return {
+        "moved": moved,
+        "skipped": skipped,
+        "seconds": round(time.monotonic() - start, 1),
+        "downtime-seconds": round(downtime, 1),
+    }
+
+
+def tier_usage(cold_dir: str, data_dir: str = INFLUXDB_DATA_DIR) -> Dict[str, Dict[str, Any]]:
+    """Return the shards and bytes held by the hot and cold storage tiers.
+
+    Each tier also reports how full its filesystem is. Shards are on the cold
+    tier if their directory in the data directory is a symlink.
+    """
+    import shutil
+
+    usage = {
+        tier: {"shards": 0, "bytes": 0, "disk-used-percent": None} for tier in ("hot", "cold")
+    }
+    for shard in list_shards(data_dir):
+        path = Path(data_dir).joinpath(*shard)
+        tier = usage["cold" if path.is_symlink() else "hot"]
+        tier["shards"] += 1
+        tier["bytes"] += sum(file.stat().st_size for file in path.rglob("*") if file.is_file())
+    for tier, path in (("hot", data_dir), ("cold", cold_dir)):
+        try:
+            disk = shutil.disk_usage(path)
+            usage[tier]["disk-used-percent"] = round(disk.used * 100 / disk.total)
+        except (OSError, ZeroDivisionError):
+            pass
+    return usage
+
+
+@contextlib.contextmanager
+def _open_archive(path: Path, compression: str, mode: str) -> Iterator["tarfile.TarFile"]:
+    """Open a backup archive as a tar stream, compressed with gzip or piped through zstd.
+
+    Args:
+        path: The archive path.
+        compression: One of `INFLUXDB_BACKUP_COMPRESSIONS`.
+        mode: "r" to read or "w" to write the archive.
+
+    Raises:
+        InfluxDBOpsError: Raised if zstd fails.
+    """
+    import tarfile
+
+    if compression == "gzip":
+        with tarfile.open(str(path), "w|gz" if mode == "w" else "r|gz") as tar:
+            yield tar
+        return
+
+    with open(path, "wb" if mode == "w" else "rb") as file:
+        if mode == "w":
+            cmd = ["zstd", "-q", "-T0", "-c"]
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=file)
+            stream = proc.stdin
+        else:
+            cmd = ["zstd", "-q", "-d", "-c"]
+            proc = subprocess.Popen(cmd, stdin=file, stdout=subprocess.PIPE)
+            stream = proc.stdout
+        assert stream is not None
+        try:
+            with tarfile.open(fileobj=stream, mode="w|" if mode == "w" else "r|") as tar:
+                yield tar
+        finally:
+            stream.close()
+            if proc.wait() != 0:
+                raise InfluxDBOpsError(f"zstd failed for {path}.")
+
+
+def _validate_backup_options(
+    databases: Sequence[str], since: Optional[str], compression: str, incremental: bool
+) -> None:
+    """Raise InfluxDBOpsError if the options of a backup are invalid.
+
+    `since` is rejected for incremental backups: the shard index would record
+    every changed shard as backed up although only part of its data was.
+    """
+    if compression not in INFLUXDB_BACKUP_COMPRESSIONS:
+        raise InfluxDBOpsError(
+            f"Invalid compression: expected one of {INFLUXDB_BACKUP_COMPRESSIONS}."
+        )
+    if since is not None:
+        try:
+            datetime.fromisoformat(since.replace("Z", "+00:00"))
+        except ValueError:
+            raise InfluxDBOpsError(f"Invalid since: expected an RFC3339 timestamp, got {since}.")
+    if since is not None and incremental:
+        raise InfluxDBOpsError("Invalid since: incremental backups copy whole shards.")
+    if not databases:
+        raise InfluxDBOpsError("No databases to back up.")
+
+
+def _archive_backup(tar: "tarfile.TarFile", backup: Path, arcname: str) -> Dict[str, Any]:
+    """Stream a backup directory into the archive as `arcname` and remove it from disk.
+
+    Returns:
+        The manifest entry of the backup: its files and their total size.
+    """
+    import shutil
+
+    files = sorted(path for path in backup.iterdir() if path.is_file())
+    entry = {
+        "files": [path.name for path in files],
+        "bytes": sum(path.stat().st_size for path in files),
+    }
+    tar.add(backup, arcname=arcname)
+    shutil.rmtree(backup)
+    return entry
+
+
+def _rename_shard_backup(backup: Path, shard_id: str) -> None:
+    """Make the files of a shard backup unique within the backup of its database.
+
+    Shard backups taken in the same second share their `<timestamp>.manifest`
+    and `<timestamp>.meta` names. Each file is renamed to `<timestamp>-<shard>`
+    and the manifest rewritten to match, so the backups of every shard of a
+    database can be restored together from one directory.
+    """
+    renamed = {}
+    for path in sorted(backup.iterdir()):
+        stamp, _, rest = path.name.partition(".")
+        renamed[path.name] = f"{stamp}-{shard_id}.{rest}"
+        path.rename(backup / renamed[path.name])
+
+    for manifest in backup.glob("*.manifest"):
+        content = json.loads(manifest.read_text())
+        meta = content.get("meta") or {}
+        if "fileName" in meta:
+            meta["fileName"] = renamed.get(meta["fileName"], meta["fileName"])
+        for file in content.get("files") or []:
+            file["fileName"] = renamed.get(file["fileName"], file["fileName"])
+        manifest.write_text(json.dumps(content))
+
+
+def _add_manifest(tar: "tarfile.TarFile", manifest: Dict[str, Any]) -> None:
+    """Append the manifest of a backup to its archive as `manifest.json`."""
+    import io
+    import tarfile
+
+    data = json.dumps(manifest, indent=2).encode()
+    info = tarfile.TarInfo("manifest.json")
+    info.size, info.mtime = len(data), int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(1024**2):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def shard_signature(
+    shard: Tuple[str, str, str],
+    previous: Optional[Dict[str, Any]] = None,
+    data_dir: str = INFLUXDB_DATA_DIR,
+    wal_dir: str = INFLUXDB_WAL_DIR,
+) -> Dict[str, Dict[str, Any]]:
+    """Return the size, modification time and sha256 of every file of a shard.
+
+    The TSM, tombstone and index files under the data directory are keyed by
+    their path in the shard, the WAL segments by `wal/<segment>`. Checksums
+    are only computed for files whose size or modification time differ from
+    `previous`, so cold shards are signed without reading them.
+    """
+    roots = {"": Path(data_dir).joinpath(*shard), "wal/": Path(wal_dir).joinpath(*shard)}
+    signature = {}
+    for prefix, root in roots.items():
+        for path in sorted(root.rglob("*")) if root.is_dir() else []:
+            if not path.is_file():
+                continue
+            name = f"{prefix}{path.relative_to(root)}"
+            stat = path.stat()
+            known = (previous or {}).get(name, {})
+            unchanged = known.get("size") == stat.st_size and known.get("mtime") == stat.st_mtime
+            signature[name] = {
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "sha256": known["sha256"] if unchanged else _sha256(path),
+            }
+    return signature
+
+
+def load_backup_index(backup_dir: str = INFLUXDB_BACKUP_DIR) -> Dict[str, Any]:
+    """Load the shard index of incremental backups, or an empty one if there is none.
+
+    The index maps `<database>/<retention policy>/<shard id>` to the signature
+    of the shard's files when it was last backed up and the ID of that backup.
+
+    Raises:
+        InfluxDBOpsError: Raised if the index cannot be read.
+    """
+    path = Path(backup_dir) / INFLUXDB_BACKUP_INDEX
+    if not path.exists():
+        return {"version": 1, "last-backup": None, "backups": {}, "shards": {}}
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        raise InfluxDBOpsError(f"Failed to read backup index {path}: {e}")
+
+
+def _write_backup_index(backup_dir: str, index: Dict[str, Any]) -> None:
+    """Atomically replace the shard index of incremental backups."""
+    path = Path(backup_dir) / INFLUXDB_BACKUP_INDEX
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(index, indent=2, sort_keys=True))
+    os.replace(tmp, path)
+
+
+def export_backup_index(
+    path: Optional[str] = None, backup_dir: str = INFLUXDB_BACKUP_DIR
+) -> Dict[str, Any]:
+    """Export a copy of the shard index of incremental backups for verification.
+
+    Args:
+        path: Where to write the copy. Defaults to a timestamped file next to the index.
+        backup_dir: The directory holding the index.
+
+    Returns:
+        The path and sha256 of the copy, and the number of shards and backups indexed.
+
+    Raises:
+        InfluxDBOpsError: Raised if there is no index or it cannot be exported.
+    """
+    if not (Path(backup_dir) / INFLUXDB_BACKUP_INDEX).exists():
+        raise InfluxDBOpsError(f"No backup index in {backup_dir}: run an incremental backup.")
+    index = load_backup_index(backup_dir)
+    export = Path(
+        path or Path(backup_dir) / f"index-{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}.json"
+    )
+    data = json.dumps(index, indent=2, sort_keys=True).encode()
+    try:
+        export.parent.mkdir(parents=True, exist_ok=True)
+        export.write_bytes(data)
+    except OSError as e:
+        raise InfluxDBOpsError(f"Failed to export backup index to {export}: {e}")
+    return {
+        "path": str(export),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "shards": len(index["shards"]),
+        "backups": len(index["backups"]),
+        "last-backup": index["last-backup"],
+    }
+
+
+def _changed_shards(
+    databases: Sequence[str],
+    index: Dict[str, Any],
+    data_dir: str,
+    wal_dir: str,
+    workers: int,
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """Sign the shards of `databases` and split them into changed and unchanged shards.
+
+    A shard is unchanged if its files and their checksums match the index,
+    even if their modification times do not.
+
+    Returns:
+        The signature of each changed and each unchanged shard, by shard key.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    wanted = set(databases)
+    shards = [shard for shard in list_shards(data_dir) if shard[0] in wanted]
+    indexed = index["shards"]
+
+    def _sign(shard: Tuple[str, str, str]) -> Dict[str, Dict[str, Any]]:
+        previous = indexed.get("/".join(shard), {}).get("files")
+        return shard_signature(shard, previous, data_dir, wal_dir)
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        signatures = dict(zip(("/".join(shard) for shard in shards), pool.map(_sign, shards)))
+
+    def _checksums(files: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        return {name: file["sha256"] for name, file in files.items()}
+
+    changed, unchanged = {}, {}
+    for key, files in signatures.items():
+        previous = indexed.get(key, {}).get("files", {})
+        same = key in indexed and _checksums(files) == _checksums(previous)
+        (unchanged if same else changed)[key] = files
+    return changed, unchanged
+
+
+def _update_backup_index(
+    index: Dict[str, Any],
+    databases: Sequence[str],
+    backup_id: str,
+    archive: Path,
+    backed_up: Dict[str, Dict[str, Any]],
+    unchanged: Dict[str, Dict[str, Any]],
+) -> None:
+    """Record an incremental backup and the signatures of the shards it covered.
+
+    Shards of the backed up databases that are no longer on disk are dropped.
+    Shards whose backup failed keep their previous entry, so the next backup
+    retries them.
+    """
+    wanted = set(databases)
+    shards = index["shards"]
+    for key in [key for key in shards if key.split("/")[0] in wanted]:
+        if key not in backed_up and key not in unchanged:
+            shards.pop(key)
+    for key, files in unchanged.items():
+        shards[key]["files"] = files
+    for key, files in backed_up.items():
+        shards[key] = {"files": files, "backup": backup_id}
+    index["backups"][backup_id] = {"archive": str(archive), "shards": sorted(backed_up)}
+    index["last-backup"] = backup_id
+
+
+def _backup_targets(
+    databases: Sequence[str], changed: Optional[Dict[str, Any]]
+) -> Dict[str, List[str]]:
+    """Return the `influxd backup` arguments selecting each database or changed shard."""
+    if changed is None:
+        return {database: ["-database", database] for database in databases}
+    targets = {}
+    for key in changed:
+        database, retention_policy, shard_id = key.split("/")
+        targets[key] = ["-database", database, "-rp", retention_policy, "-shard", shard_id]
+    return targets
+
+
+def _record_backup(
+    tar: "tarfile.TarFile", staging: Path, manifest: Dict[str, Any], target: str, seconds: float
+) -> None:
+    """Archive the finished backup of a database or shard and add it to the manifest.
+
+    A shard backup is archived under the directory of its database, whose
+    manifest entry lists the files of every shard backed up.
+    """
+    if "/" not in target:
+        manifest["databases"][target] = {
+            **_archive_backup(tar, staging / target, target),
+            "seconds": round(seconds, 1),
+        }
+        return
+
+    database, _, shard_id = target.split("/")
+    _rename_shard_backup(staging / target, shard_id)
+    entry = _archive_backup(tar, staging / target, database)
+    manifest["shards"][target] = {**entry, "seconds": round(seconds, 1)}
+    backup = manifest["databases"].setdefault(database, {"files": [], "bytes": 0})
+    backup["files"] = sorted(backup["files"] + entry["files"])
+    backup["bytes"] += entry["bytes"]
+
+
+def create_backup(
+    databases: Sequence[str],
+    backup_dir: str = INFLUXDB_BACKUP_DIR,
+    since: Optional[str] = None,
+    compression: str = "gzip",
+    workers: int = 0,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+    incremental: bool = False,
+    data_dir: str = INFLUXDB_DATA_DIR,
+    wal_dir: str = INFLUXDB_WAL_DIR,
+) -> Dict[str, Any]:
+    """Back up databases into a single compressed archive with a manifest.
+
+    `influxd backup -portable` runs for each database in parallel on up to
+    `workers` processes (default: one per core). Each finished backup is
+    streamed into the archive, and its staging directory removed, while the
+    others are still running. `manifest.json` is written last.
+
+    An `incremental` backup only copies the shards whose files changed since
+    they were last backed up, according to the shard index in `backup_dir`,
+    and records the backup in the index. The first one copies every shard.
+
+    Args:
+        databases: The databases to back up.
+        backup_dir: The directory to write the archive to.
+        since: Only back up data written since this RFC3339 timestamp. Not
+            allowed for incremental backups.
+        compression: One of `INFLUXDB_BACKUP_COMPRESSIONS`.
+        workers: Number of databases, or shards, to back up in parallel.
+        progress: Called with each database, or shard, backed up and the number done and total.
+        incremental: Only back up the shards changed since the last incremental backup.
+        data_dir: The influxdb data directory, used to sign shards.
+        wal_dir: The influxdb WAL directory, used to sign shards.
+
+    Returns:
+        The archive path, the size of the backups and of the archive, the time
+        taken, the throughput, and the error of each database, or shard, that
+        failed. Incremental backups also report their ID and the number of
+        shards backed up and skipped.
+
+    Raises:
+        InfluxDBOpsError: Raised if an option is invalid or the archive cannot be written.
+    """
+    _validate_backup_options(databases, since, compression, incremental)
+
+    import shutil
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    Path(backup_dir).mkdir(parents=True, exist_ok=True)
+    start = time.monotonic()
+    backup_id = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    index: Optional[Dict[str, Any]] = None
+    changed: Optional[Dict[str, Dict[str, Any]]] = None
+    unchanged: Dict[str, Dict[str, Any]] = {}
+    if incremental:
+        index = load_backup_index(backup_dir)
+        changed, unchanged = _changed_shards(databases, index, data_dir, wal_dir, workers)
+    targets = _backup_targets(databases, changed)
+    extension = "gz" if compression == "gzip" else "zst"
+    archive = Path(backup_dir) / f"influxdb-backup-{backup_id}.tar.{extension}"
+    # Stage next to the archive rather than in /tmp, which may be much smaller.
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=backup_dir))
+
+    def _backup(target: str) -> Tuple[Optional[str], float]:
+        cmd = ["influxd", "backup", "-portable", *targets[target]]
+        if since is not None:
+            cmd += ["-since", since]
+        (staging / target).parent.mkdir(parents=True, exist_ok=True)
+        started = time.monotonic()
+        result = subprocess.run([*cmd, str(staging / target)], capture_output=True, text=True)
+        error = (result.stderr.strip() or "influxd backup failed") if result.returncode else None
+        return error, time.monotonic() - started
+
+    manifest: Dict[str, Any] = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "since": since,
+        "compression": compression,
+        "databases": {},
+        **({"backup-id": backup_id, "shards": {}} if incremental else {}),
+    }
+    failed: Dict[str, str] = {}
+    try:
+        with (
+            _open_archive(archive, compression, "w") as tar,
+            ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool,
+        ):
+            futures = {pool.submit(_backup, target): target for target in targets}
+            for done, future in enumerate(as_completed(futures), 1):
+                target = futures[future]
+                error, seconds = future.result()
+                if error is not None:
+                    _logger.error(f"Backing up {target} failed: {error}")
+                    failed[target] = error
+                    continue
+                _record_backup(tar, staging, manifest, target, seconds)
+                if progress is not None:
+                    progress(target, done, len(targets))
+
+            _add_manifest(tar, manifest)
+    except (OSError, ValueError) as e:
+        archive.unlink(missing_ok=True)
+        raise InfluxDBOpsError(f"Failed to write {archive}: {e}")
+    except InfluxDBOpsError:
+        archive.unlink(missing_ok=True)
+        raise
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    result = {"archive": str(archive), "databases": len(manifest["databases"])}
+    if index is not None and changed is not None:
+        backed_up = {key: changed[key] for key in manifest["shards"]}
+        _update_backup_index(index, databases, backup_id, archive, backed_up, unchanged)
+        _write_backup_index(backup_dir, index)
+        result.update(
+            {"backup-id": backup_id, "shards": len(backed_up), "skipped": len(unchanged)}
+        )
+
+    elapsed = time.monotonic() - start
+    size = sum(database["bytes"] for database in manifest["databases"].values())
+    _logger.debug(f"Backed up {len(targets) - len(failed)} to {archive} in {elapsed:.1f}s.")
+    return {
+        **result,
+        "bytes": size,
+        "archive-bytes": archive.stat().st_size,
+        "seconds": round(elapsed, 1),
+        "throughput": f"{size / 1024**2 / max(elapsed, 1e-3):.1f} MiB/s",
+        "failed": failed,
+    }
+
+
+def _restore_databases(
+    staging: Path,
+    databases: Sequence[str],
+    suffix: str,
+    workers: int,
+    progress: Optional[Callable[[str, int, int], None]],
+) -> Dict[str, str]:
+    """Run `influxd restore -portable` in parallel for each database staged in `staging`.
+
+    Returns:
+        The error of each database that failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    def _restore(database: str) -> Optional[str]:
+        cmd = [
+            "influxd", "restore", "-portable",
+            "-db", database,
+            "-newdb", f"{database}{suffix}",
+            str(staging / database),
+        ]  # fmt: skip
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        return (result.stderr.strip() or "influxd restore failed") if result.returncode else None
+
+    failed: Dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(_restore, database): database for database in databases}
+        for done, future in enumerate(as_completed(futures), 1):
+            database = futures[future]
+            if (error := future.result()) is not None:
+                _logger.error(f"Restoring {database} failed: {error}")
+                failed[database] = error
+            elif progress is not None:
+                progress(database, done, len(databases))
+    return failed
+
+
+def restore_backup(
+    archive: str,
+    databases: Optional[Sequence[str]] = None,
+    suffix: str = "",
+    workers: int = 0,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Restore databases from an archive written by `create_backup`.
+
+    The archive is extracted in a single streaming pass, then `influxd restore
+    -portable` runs for each database in parallel on up to `workers` processes
+    (default: one per core), each restoring the shards of its database.
+    Portable restores fail for databases that already exist; `suffix` restores
+    each database alongside the original as `<database><suffix>`.
+
+    An incremental archive only holds the shards changed since the previous
+    incremental backup; use `restore_backup_chain` to restore every shard.
+
+    Returns:
+        The number of databases restored, the time taken, and the error of each
+        database that failed.
+
+    Raises:
+        InfluxDBOpsError: Raised if the archive cannot be read or lacks a database.
+    """
+    import shutil
+    import tempfile
+
+    path = Path(archive)
+    if not path.is_file():
+        raise InfluxDBOpsError(f"Backup archive not found: {archive}.")
+    compression = "zstd" if path.suffix == ".zst" else "gzip"
+    wanted = set(databases or ())
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=path.parent))
+    start = time.monotonic()
+    try:
+        with _open_archive(path, compression, "r") as tar:
+            for member in tar:
+                if (
+                    not wanted
+                    or member.name == "manifest.json"
+                    or member.name.split("/")[0] in wanted
+                ):
+                    tar.extract(member, staging, filter="data")
+        manifest = json.loads((staging / "manifest.json").read_text())
+    except (OSError, ValueError) as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise InfluxDBOpsError(f"Failed to read {archive}: {e}")
+
+    if missing := wanted - set(manifest["databases"]):
+        shutil.rmtree(staging, ignore_errors=True)
+        raise InfluxDBOpsError(f"Databases not in {archive}: {', '.join(sorted(missing))}.")
+
+    restore = sorted(wanted or manifest["databases"])
+    try:
+        failed = _restore_databases(staging, restore, suffix, workers, progress)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    elapsed = time.monotonic() - start
+    _logger.debug(
+        f"Restored {len(restore) - len(failed)} databases from {archive} in {elapsed:.1f}s."
+    )
+    return {
+        "databases": len(restore) - len(failed),
+        "seconds": round(elapsed, 1),
+        "failed": failed,
+    }
+
+
+def _chain_archives(
+    index: Dict[str, Any], databases: Sequence[str], backup_dir: str
+) -> Dict[str, Dict[str, Set[str]]]:
+    """Return the shard IDs of each database to extract from each archive of the chain.
+
+    Raises:
+        InfluxDBOpsError: Raised if a database is not indexed or an archive is missing.
+    """
+    wanted = set(databases)
+    archives: Dict[str, Dict[str, Set[str]]] = {}
+    for key, entry in index["shards"].items():
+        database, _, shard_id = key.split("/")
+        if wanted and database not in wanted:
+            continue
+        archive = index["backups"][entry["backup"]]["archive"]
+        archives.setdefault(archive, {}).setdefault(database, set()).add(shard_id)
+
+    indexed = {database for shards in archives.values() for database in shards}
+    if missing := wanted - indexed:
+        raise InfluxDBOpsError(
+            f"Databases not in the backup index of {backup_dir}: {', '.join(sorted(missing))}."
+        )
+    if not indexed:
+        raise InfluxDBOpsError(f"No shards in the backup index of {backup_dir}.")
+    for archive in archives:
+        if not Path(archive).is_file():
+            raise InfluxDBOpsError(f"Backup archive not found: {archive}.")
+    return archives
+
+
+def restore_backup_chain(
+    databases: Optional[Sequence[str]] = None,
+    backup_dir: str = INFLUXDB_BACKUP_DIR,
+    suffix: str = "",
+    workers: int = 0,
+    progress: Optional[Callable[[str, int, int], None]] = None,
+) -> Dict[str, Any]:
+    """Restore databases as of the last incremental backup from the chain of archives.
+
+    Each incremental archive only holds the shards changed since the previous
+    one. The shard index in `backup_dir` records the backup holding the latest
+    copy of every shard, so each archive of the chain is streamed once and the
+    files of the shards it holds the latest copy of are extracted into one
+    staging directory per database. Each database is then restored once, as
+    with `restore_backup`.
+
+    Returns:
+        The number of databases restored and archives read, the time taken,
+        and the error of each database that failed.
+
+    Raises:
+        InfluxDBOpsError: Raised if there is no index, a database is not
+            indexed, or an archive of the chain is missing or unreadable.
+    """
+    import shutil
+    import tempfile
+
+    if not (Path(backup_dir) / INFLUXDB_BACKUP_INDEX).exists():
+        raise InfluxDBOpsError(f"No backup index in {backup_dir}: run an incremental backup.")
+    archives = _chain_archives(load_backup_index(backup_dir), databases or (), backup_dir)
+
+    staging = Path(tempfile.mkdtemp(prefix=".staging-", dir=backup_dir))
+    start = time.monotonic()
+    archive = ""
+    try:
+        for archive, shards in archives.items():
+            compression = "zstd" if archive.endswith(".zst") else "gzip"
+            with _open_archive(Path(archive), compression, "r") as tar:
+                for member in tar:
+                    database, _, name = member.name.partition("/")
+                    # Shard backup files are named `<timestamp>-<shard id>.<rest>`.
+                    shard_id = name.split(".")[0].rpartition("-")[2]
+                    if member.isfile() and shard_id in shards.get(database, ()):
+                        tar.extract(member, staging, filter="data")
+    except (OSError, ValueError) as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise InfluxDBOpsError(f"Failed to read {archive}: {e}")
+
+    restore = sorted({database for shards in archives.values() for database in shards})
+    try:
+        failed = _restore_databases(staging, restore, suffix, workers, progress)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    elapsed = time.monotonic() - start
+    _logger.debug(
+        f"Restored {len(restore) - len(failed)} databases from {len(archives)} archives "
+        f"in {elapsed:.1f}s."
+    )
+    return {
+        "databases": len(restore) - len(failed),
+        "archives": len(archives),
+        "seconds": round(elapsed, 1),
+        "failed": failed,
+    }
 
 
 class InfluxDBOpsError(RuntimeError):
@@ -81,20 +1525,458 @@ class InfluxDBOpsError(RuntimeError):
         return self.args[0]
 
 
+class InfluxQLStatementError(InfluxDBOpsError):
+    """Exception raised when a statement within an InfluxQL batch fails."""
+
+    def __init__(self, message: str, statement_id: int, error: str):
+        super().__init__(message)
+        self.statement_id = statement_id
+        self.error = error
+
+
+def quote_ident(value: str) -> str:
+    """Quote an InfluxQL identifier."""
+    return '"{}"'.format(value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+
+
+def quote_literal(value: str) -> str:
+    """Quote an InfluxQL string literal."""
+    return "'{}'".format(value.replace("\\", "\\\\").replace("'", "\\'"))
+
+
+# Error InfluxDB reports for each statement after the first failing one of a request.
+INFLUXQL_NOT_EXECUTED = "not executed"
+
+
+class InfluxQLBatch:
+    """An ordered list of InfluxQL statements sent in a single `/query` request.
+
+    Each statement is paired with the error message raised if InfluxDB
+    reports a failure for it. InfluxDB stops executing a batch at the first
+    failing statement, so at most one error is raised per batch.
+    """
+
+    def __init__(self) -> None:
+        self._statements: List[Tuple[str, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    @property
+    def query(self) -> str:
+        """Return the batch compiled to a single multi-statement query."""
+        return "; ".join(statement for statement, _ in self._statements)
+
+    def add(self, statement: str, error_msg: str) -> "InfluxQLBatch":
+        """Append a statement and the error message used if it fails."""
+        self._statements.append((statement, error_msg))
+        return self
+
+    def create_user(self, username: str, password: str) -> "InfluxQLBatch":
+        """Append a CREATE USER statement."""
+        return self.add(
+            f"CREATE USER {quote_ident(username)} WITH PASSWORD {quote_literal(password)}",
+            "Error creating user.",
+        )
+
+    def create_database(self, database: str) -> "InfluxQLBatch":
+        """Append a CREATE DATABASE statement."""
+        return self.add(f"CREATE DATABASE {quote_ident(database)}", "Error creating database.")
+
+    def create_retention_policy(
+        self,
+        database: str,
+        name: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        duration: str = DEFAULT_INFLUXDB_RETENTION_DURATION,
+        replication: int = DEFAULT_INFLUXDB_REPLICATION,
+        default: bool = True,
+        shard_duration: Optional[str] = None,
+    ) -> "InfluxQLBatch":
+        """Append a CREATE RETENTION POLICY statement.
+
+        Without a `shard_duration`, InfluxDB derives the shard group duration
+        from the retention duration.
+        """
+        statement = (
+            f"CREATE RETENTION POLICY {quote_ident(name)} ON {quote_ident(database)} "
+            f"DURATION {duration} REPLICATION {replication}"
+        )
+        if shard_duration:
+            statement += f" SHARD DURATION {shard_duration}"
+        if default:
+            statement += " DEFAULT"
+        return self.add(statement, f"Error creating {name} retention policy.")
+
+    def alter_retention_policy(
+        self,
+        database: str,
+        name: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        duration: Optional[str] = None,
+        replication: Optional[int] = None,
+        default: bool = False,
+        shard_duration: Optional[str] = None,
+    ) -> "InfluxQLBatch":
+        """Append an ALTER RETENTION POLICY statement changing only the given options."""
+        statement = f"ALTER RETENTION POLICY {quote_ident(name)} ON {quote_ident(database)}"
+        if duration:
+            statement += f" DURATION {duration}"
+        if replication:
+            statement += f" REPLICATION {replication}"
+        if shard_duration:
+            statement += f" SHARD DURATION {shard_duration}"
+        if default:
+            statement += " DEFAULT"
+        return self.add(statement, f"Error altering {name} retention policy.")
+
+    def grant_privilege(
+        self, username: str, database: str, privilege: str = "all"
+    ) -> "InfluxQLBatch":
+        """Append a GRANT statement."""
+        return self.add(
+            f"GRANT {privilege.upper()} ON {quote_ident(database)} TO {quote_ident(username)}",
+            f"Error granting {privilege} to {username} on {database}.",
+        )
+
+    def revoke_privilege(
+        self, username: str, database: str, privilege: str = "all"
+    ) -> "InfluxQLBatch":
+        """Append a REVOKE statement."""
+        return self.add(
+            f"REVOKE {privilege.upper()} ON {quote_ident(database)} FROM {quote_ident(username)}",
+            f"Error revoking {privilege} from {username} on {database}.",
+        )
+
+    def drop_user(self, username: str) -> "InfluxQLBatch":
+        """Append a DROP USER statement."""
+        return self.add(f"DROP USER {quote_ident(username)}", "Error dropping user.")
+
+    def drop_database(self, database: str) -> "InfluxQLBatch":
+        """Append a DROP DATABASE statement."""
+        return self.add(f"DROP DATABASE {quote_ident(database)}", "Error dropping database.")
+
+    def set_password(self, username: str, password: str) -> "InfluxQLBatch":
+        """Append a SET PASSWORD statement."""
+        return self.add(
+            f"SET PASSWORD FOR {quote_ident(username)} = {quote_literal(password)}",
+            "Error updating user password.",
+        )
+
+    def drop_retention_policy(self, database: str, name: str) -> "InfluxQLBatch":
+        """Append a DROP RETENTION POLICY statement."""
+        return self.add(
+            f"DROP RETENTION POLICY {quote_ident(name)} ON {quote_ident(database)}",
+            f"Error dropping {name} retention policy.",
+        )
+
+    def create_continuous_query(
+        self,
+        database: str,
+        name: str,
+        select: str,
+        resample_every: Optional[str] = None,
+        resample_for: Optional[str] = None,
+    ) -> "InfluxQLBatch":
+        """Append a CREATE CONTINUOUS QUERY statement running `select`."""
+        statement = f"CREATE CONTINUOUS QUERY {quote_ident(name)} ON {quote_ident(database)}"
+        if resample_every or resample_for:
+            statement += " RESAMPLE"
+            if resample_every:
+                statement += f" EVERY {resample_every}"
+            if resample_for:
+                statement += f" FOR {resample_for}"
+        return self.add(
+            f"{statement} BEGIN {select} END", f"Error creating {name} continuous query."
+        )
+
+    def drop_continuous_query(self, database: str, name: str) -> "InfluxQLBatch":
+        """Append a DROP CONTINUOUS QUERY statement."""
+        return self.add(
+            f"DROP CONTINUOUS QUERY {quote_ident(name)} ON {quote_ident(database)}",
+            f"Error dropping {name} continuous query.",
+        )
+
+    def create_rollup(
+        self,
+        database: str,
+        interval: str,
+        duration: str,
+        source: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        aggregate: str = "mean",
+        shard_duration: Optional[str] = None,
+    ) -> "InfluxQLBatch":
+        """Append a downsampling retention policy and the continuous query filling it.
+
+        Every measurement of the `source` policy is aggregated per `interval`
+        into the `rollup_<interval>` policy, keeping tags and field names
+        prefixed by the aggregate, e.g. `mean_value`.
+        """
+        name = rollup_name(interval)
+        self.create_retention_policy(
+            database, name, duration, default=False, shard_duration=shard_duration
+        )
+        select = (
+            f"SELECT {aggregate}(*) INTO {quote_ident(database)}.{quote_ident(name)}.:MEASUREMENT "
+            f"FROM {quote_ident(database)}.{quote_ident(source)}./.*/ "
+            f"GROUP BY time({interval}), *"
+        )
+        return self.create_continuous_query(database, name, select)
+
+    def provision_database(
+        self,
+        database: str,
+        username: str,
+        password: str,
+        retention_policy: Optional[Dict[str, Any]] = None,
+        rollups: Sequence[Tuple[str, str]] = (),
+    ) -> "InfluxQLBatch":
+        """Append the statements creating a database and a user with all privileges on it.
+
+        The user is created last, so a batch failing on the database, which
+        is retried with a new username, does not leave an orphan user behind.
+        """
+        self.create_database(database)
+        self.create_retention_policy(database, **(retention_policy or {}))
+        for interval, duration in rollups:
+            self.create_rollup(database, interval, duration)
+        return self.create_user(username, password).grant_privilege(username, database)
+
+    def drop_rollup(self, database: str, interval: str) -> "InfluxQLBatch":
+        """Append the statements dropping a rollup and its downsampled data."""
+        name = rollup_name(interval)
+        return self.drop_continuous_query(database, name).drop_retention_policy(database, name)
+
+    def _send(self, client: "InfluxDBClient") -> Dict[int, Any]:
+        """Send the batch and return the result sets keyed by statement id."""
+        try:
+            results = client.query(self.query, method="POST", raise_errors=False)
+        except Exception as e:
+            msg = f"Error executing InfluxQL batch of {len(self)} statements."
+            _logger.error(msg)
+            raise InfluxDBOpsError(msg) from e
+
+        # Unchunked queries return a result set, or a list of them for several statements.
+        result_sets = cast(List["ResultSet"], results if isinstance(results, list) else [results])
+        return {result.raw.get("statement_id", i): result for i, result in enumerate(result_sets)}
+
+    def results(self, client: "InfluxDBClient") -> List[Optional["ResultSet"]]:
+        """Send the batch and return the result set of each statement, failed or not.
+
+        Statements InfluxDB did not execute, those after the first failing
+        one, are returned as None whether they are missing from the response
+        or reported as not executed.
+
+        Raises:
+            InfluxDBOpsError: Raised if the request itself fails.
+        """
+        if not self._statements:
+            return []
+
+        by_id = self._send(client)
+        results: List[Optional["ResultSet"]] = []
+        for statement_id in range(len(self._statements)):
+            result = by_id.get(statement_id)
+            if result is not None and result.error == INFLUXQL_NOT_EXECUTED:
+                result = None
+            results.append(result)
+        return results
+
+    def errors(self, client: "InfluxDBClient") -> List[Optional[str]]:
+        """Send the batch and return the InfluxDB error, if any, of each statement.
+
+        Raises:
+            InfluxDBOpsError: Raised if the request itself fails.
+        """
+        return [
+            "statement not executed" if result is None else result.error
+            for result in self.results(client)
+        ]
+
+    def execute(self, client: "InfluxDBClient") -> list:
+        """Send the batch and return one result set per statement.
+
+        Raises:
+            InfluxDBOpsError: Raised if the request itself fails.
+            InfluxQLStatementError: Raised for the first statement InfluxDB
+                reports as failed, or that was not executed at all.
+        """
+        if not self._statements:
+            return []
+
+        by_id = self._send(client)
+        self.raise_for_errors({statement_id: r.error for statement_id, r in by_id.items()})
+        return [by_id[statement_id] for statement_id in range(len(self._statements))]
+
+    def raise_for_errors(self, errors: Dict[int, Optional[str]]) -> None:
+        """Raise for the first failed statement, given the error of each executed statement.
+
+        Raises:
+            InfluxQLStatementError: Raised for the first statement InfluxDB
+                reports as failed, or that was not executed at all.
+        """
+        for statement_id, (_, error_msg) in enumerate(self._statements):
+            if statement_id not in errors:
+                error = "statement not executed"
+            elif (error := errors[statement_id]) is None:
+                continue
+            _logger.error(f"{error_msg} InfluxDB: {error}")
+            raise InfluxQLStatementError(error_msg, statement_id, error)
+
+
+def _rp_duration_seconds(value: str) -> int:
+    """Return a retention policy duration literal in seconds; `INF` is 0."""
+    if value.upper() == "INF":
+        return 0
+    if not _RP_DURATION_RE.match(value):
+        raise ValueError(value)
+    return sum(
+        int(n) * _RP_DURATION_UNITS[unit] for n, unit in re.findall(r"(\d+)([wdhms])", value)
+    )
+
+
+def parse_retention_policy(options: Dict[str, Any], defaults: bool = True) -> Dict[str, Any]:
+    """Validate retention policy options given as action params or relation data.
+
+    `duration`, `shard-duration` and `replication` are recognised. With
+    `defaults`, a missing duration or replication falls back to the charm
+    defaults and a missing shard duration is left for InfluxDB to derive;
+    otherwise only the given options are returned. The result can be passed
+    as keyword arguments to `InfluxQLBatch.create_retention_policy`.
+
+    Raises:
+        InfluxDBOpsError: Raised if an option is invalid.
+    """
+    policy: Dict[str, Any] = {}
+    if defaults:
+        policy = {
+            "duration": DEFAULT_INFLUXDB_RETENTION_DURATION,
+            "replication": DEFAULT_INFLUXDB_REPLICATION,
+        }
+
+    seconds = {}
+    for option in ("duration", "shard-duration"):
+        if value := str(options.get(option) or "").strip():
+            try:
+                seconds[option] = _rp_duration_seconds(value)
+            except ValueError:
+                raise InfluxDBOpsError(
+                    f"Invalid {option}: expected a duration such as 30d or INF."
+                )
+            policy[option.replace("-", "_")] = value
+    if 0 < seconds.get("duration", 0) < 3600:
+        raise InfluxDBOpsError("Invalid duration: the minimum retention duration is 1h.")
+    if seconds.get("shard-duration", 3600) < 3600:
+        raise InfluxDBOpsError("Invalid shard-duration: the minimum shard duration is 1h.")
+    if 0 < seconds.get("duration", 0) < seconds.get("shard-duration", 0):
+        raise InfluxDBOpsError("Invalid shard-duration: it must not exceed the duration.")
+
+    if (replication := options.get("replication")) not in (None, ""):
+        if not str(replication).isdigit() or int(replication) < 1:
+            raise InfluxDBOpsError("Invalid replication: expected a positive integer.")
+        policy["replication"] = int(replication)
+    return policy
+
+
+def rollup_name(interval: str) -> str:
+    """Return the retention policy and continuous query name of a rollup."""
+    return f"rollup_{interval}"
+
+
+def validate_rollup(interval: str, duration: str, aggregate: str = "mean") -> None:
+    """Validate the interval, retention duration and aggregate of a rollup.
+
+    Raises:
+        InfluxDBOpsError: Raised if an option is invalid.
+    """
+    try:
+        seconds = _rp_duration_seconds(interval)
+    except ValueError:
+        seconds = 0
+    if not seconds:
+        raise InfluxDBOpsError("Invalid interval: expected a duration such as 5m or 1h.")
+    parse_retention_policy({"duration": duration})
+    if aggregate not in INFLUXDB_ROLLUP_AGGREGATES:
+        raise InfluxDBOpsError(
+            f"Invalid aggregate: expected one of {', '.join(INFLUXDB_ROLLUP_AGGREGATES)}."
+        )
+
+
+def parse_provision_spec(spec: str) -> Dict[str, list]:
+    """Parse a YAML or JSON provisioning spec.
+
+    The spec declares the users, databases and grants that should exist::
+
+        users: [alice]
+        databases: [metrics]
+        grants:
+          - {username: alice, database: metrics, privilege: read}
+
+    Users and databases may also be given as mappings with a `name` key.
+    The privilege of a grant defaults to `all`.
+
+    Raises:
+        InfluxDBOpsError: Raised if the spec is malformed.
+    """
+    try:
+        data = yaml.safe_load(spec) or {}
+    except yaml.YAMLError as e:
+        raise InfluxDBOpsError(f"Invalid provisioning spec: {e}")
+
+    if not isinstance(data, dict) or not set(data) <= {"users", "databases", "grants"}:
+        raise InfluxDBOpsError(
+            "Invalid provisioning spec: expected a mapping of users, databases and grants."
+        )
+
+    def _names(kind: str) -> List[str]:
+        names = []
+        for item in data.get(kind) or []:
+            name = item.get("name") if isinstance(item, dict) else item
+            if not isinstance(name, str) or not name:
+                raise InfluxDBOpsError(f"Invalid provisioning spec: bad entry in {kind}: {item}")
+            names.append(name)
+        return names
+
+    grants = []
+    for item in data.get("grants") or []:
+        if not isinstance(item, dict) or not {"username", "database"} <= set(item):
+            raise InfluxDBOpsError(f"Invalid provisioning spec: bad entry in grants: {item}")
+        privilege = str(item.get("privilege", "all")).lower()
+        if privilege not in INFLUXDB_PRIVILEGES:
+            raise InfluxDBOpsError(f"Invalid provisioning spec: unknown privilege {privilege}.")
+        grants.append((str(item["username"]), str(item["database"]), privilege))
+
+    return {"users": _names("users"), "databases": _names("databases"), "grants": grants}
+
+
 class InfluxDBOps:
     """InfluxDBOps."""
 
     def __init__(self, charm):
         self._charm = charm
+        self._client: Optional["InfluxDBClient"] = None
 
-    def _influxdb_admin_client(self) -> InfluxDBClient:
-        """Create and return influxdbclient."""
-        return InfluxDBClient(
-            host="127.0.0.1",
-            port=int(INFLUXDB_PORT),
-            username=INFLUXDB_ADMIN_USERNAME,
-            password=self._charm.influxdb_admin_password,
-        )
+    def _influxdb_admin_client(self) -> "InfluxDBClient":
+        """Return the pooled admin influxdbclient, creating it on first use.
+
+        The client holds a keep-alive HTTP session that is shared by every
+        operation for the rest of the hook. Call `close()` to release it.
+        """
+        if self._client is None:
+            from influxdb import InfluxDBClient
+
+            self._client = InfluxDBClient(
+                host="127.0.0.1",
+                port=int(INFLUXDB_PORT),
+                username=INFLUXDB_ADMIN_USERNAME,
+                password=self._charm.influxdb_admin_password,
+                pool_size=INFLUXDB_ADMIN_POOL_SIZE,
+            )
+        return self._client
+
+    def close(self) -> None:
+        """Close the pooled admin client, if one was opened."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
 
     def create_user(self, influxdb_username: str) -> Dict[str, str]:
         """Create an influxdb user."""
@@ -108,8 +1990,6 @@ class InfluxDBOps:
             msg = "Error creating user."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("User creation succeeded.")
         return {"username": influxdb_username, "password": influxdb_password}
@@ -124,8 +2004,6 @@ class InfluxDBOps:
             msg = "Error dropping user."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("User dropped succeeded.")
 
@@ -140,41 +2018,20 @@ class InfluxDBOps:
             msg = "Error listing users."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("Listing users succeeded.")
         return users
 
-    def create_database(self, influxdb_database: str) -> None:
-        """Create an influxdb database and retention policy."""
-        # Database
-        client = self._influxdb_admin_client()
-        try:
-            client.create_database(influxdb_database)
-        except Exception:
-            msg = "Error creating database."
-            _logger.error(msg)
-            raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
+    def create_database(
+        self, influxdb_database: str, retention_policy: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Create an influxdb database and retention policy.
 
-        # Retention policy
-        client = self._influxdb_admin_client()
-        try:
-            client.create_retention_policy(
-                name=DEFAULT_INFLUXDB_RETENTION_POLICY,
-                duration="7d",
-                replication="1",
-                database=influxdb_database,
-                default=True,
-            )
-        except Exception:
-            msg = "Error creating default retention policy."
-            _logger.error(msg)
-            raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
+        `retention_policy` holds the options returned by `parse_retention_policy`.
+        """
+        batch = InfluxQLBatch().create_database(influxdb_database)
+        batch.create_retention_policy(influxdb_database, **(retention_policy or {}))
+        batch.execute(self._influxdb_admin_client())
 
         _logger.debug("Database creation succeeded.")
 
@@ -188,8 +2045,6 @@ class InfluxDBOps:
             msg = "Error dropping database."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("Database dropped succeeded.")
 
@@ -204,8 +2059,6 @@ class InfluxDBOps:
             msg = "Error listing databases."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("Listing users succeeded.")
         return databases
@@ -222,8 +2075,6 @@ class InfluxDBOps:
             msg = f"Error granting {privilege} to {influxdb_username} on {influxdb_database}."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug(
             f"Successfully granted {privilege} to {influxdb_username} on {influxdb_database}."
@@ -241,8 +2092,6 @@ class InfluxDBOps:
             msg = f"Error revoking {privilege} from {influxdb_username} on {influxdb_database}."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug(
             f"Successfully revoked {privilege} to {influxdb_username} on {influxdb_database}."
@@ -259,32 +2108,240 @@ class InfluxDBOps:
             msg = "Error listing privileges."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
 
         _logger.debug("Listing privileges succeeded.")
         return privileges
 
-    def create_user_and_database(self, influxdb_database: str) -> Dict[Any, Any]:
-        """Create an influxdb user."""
+    def alter_retention_policy(
+        self,
+        influxdb_database: str,
+        name: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        default: bool = False,
+        **options: Any,
+    ) -> None:
+        """Alter a retention policy of a database.
+
+        `options` holds the options returned by
+        `parse_retention_policy(..., defaults=False)`. A new shard duration only
+        applies to shard groups created after the change.
+        """
+        batch = InfluxQLBatch()
+        batch.alter_retention_policy(influxdb_database, name, default=default, **options)
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug(f"Altered retention policy {name} on {influxdb_database}.")
+
+    def list_retention_policies(self, influxdb_database: str) -> list:
+        """List the retention policies of an influxdb database."""
         client = self._influxdb_admin_client()
 
-        influxdb_username = secrets.token_urlsafe(10)
+        try:
+            policies = client.get_list_retention_policies(influxdb_database)
+        except Exception:
+            msg = f"Error listing retention policies of {influxdb_database}."
+            _logger.error(msg)
+            raise InfluxDBOpsError(msg)
+
+        _logger.debug("Listing retention policies succeeded.")
+        return policies
+
+    def create_continuous_query(
+        self,
+        influxdb_database: str,
+        name: str,
+        select: str,
+        resample_every: Optional[str] = None,
+        resample_for: Optional[str] = None,
+    ) -> None:
+        """Create a continuous query running `select` on a database."""
+        batch = InfluxQLBatch().create_continuous_query(
+            influxdb_database, name, select, resample_every, resample_for
+        )
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug(f"Created continuous query {name} on {influxdb_database}.")
+
+    def drop_continuous_query(self, influxdb_database: str, name: str) -> None:
+        """Drop a continuous query of a database."""
+        batch = InfluxQLBatch().drop_continuous_query(influxdb_database, name)
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug(f"Dropped continuous query {name} on {influxdb_database}.")
+
+    def list_continuous_queries(self, influxdb_database: Optional[str] = None) -> list:
+        """List the continuous queries of every database, or of one database."""
+        client = self._influxdb_admin_client()
 
-        user_pass = {}
         try:
-            user_pass = self.create_user(influxdb_username)
-            self.create_database(influxdb_database)
-            self.grant_privilege(influxdb_username, influxdb_database)
-            _logger.debug("Create user password updated successfully.")
+            queries = client.get_list_continuous_queries()
         except Exception:
-            msg = "Error creating user and database."
+            msg = "Error listing continuous queries."
             _logger.error(msg)
-            InfluxDBOpsError(msg)
-        finally:
-            client.close()
+            raise InfluxDBOpsError(msg)
+
+        _logger.debug("Listing continuous queries succeeded.")
+        return [
+            {"database": database, **query}
+            for databases in queries
+            for database, database_queries in databases.items()
+            if influxdb_database in (None, database)
+            for query in database_queries
+        ]
 
-        return user_pass
+    def create_rollup(
+        self,
+        influxdb_database: str,
+        interval: str,
+        duration: str,
+        source: str = DEFAULT_INFLUXDB_RETENTION_POLICY,
+        aggregate: str = "mean",
+        shard_duration: Optional[str] = None,
+    ) -> str:
+        """Create a downsampling retention policy and its continuous query in one request.
+
+        Returns:
+            The name of the rollup retention policy.
+        """
+        batch = InfluxQLBatch().create_rollup(
+            influxdb_database, interval, duration, source, aggregate, shard_duration
+        )
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug(f"Created {interval} rollup on {influxdb_database}.")
+        return rollup_name(interval)
+
+    def drop_rollup(self, influxdb_database: str, interval: str) -> None:
+        """Drop a rollup continuous query and its downsampling retention policy."""
+        batch = InfluxQLBatch().drop_rollup(influxdb_database, interval)
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug(f"Dropped {interval} rollup on {influxdb_database}.")
+
+    def sample_cardinality(
+        self, influxdb_databases: Sequence[str]
+    ) -> Dict[str, Union[Dict[str, int], InfluxDBOpsError]]:
+        """Estimate the series and tag value cardinality of several databases.
+
+        The databases are sampled in batches of `INFLUXDB_CARDINALITY_BATCH_SIZE`
+        per request. InfluxDB stops a batch at the first failing statement, e.g.
+        for a database dropped since it was provisioned, so the statements after
+        it are resent.
+
+        Returns:
+            A mapping of each database to its estimated number of series and the
+            highest number of tag values of any of its measurements, or to the
+            `InfluxDBOpsError` raised while sampling it.
+        """
+        client = self._influxdb_admin_client()
+        results: Dict[str, Union[Dict[str, int], InfluxDBOpsError]] = {}
+        remaining = list(influxdb_databases)
+        while remaining:
+            batch = InfluxQLBatch()
+            for database in remaining[:INFLUXDB_CARDINALITY_BATCH_SIZE]:
+                msg = f"Error sampling the cardinality of {database}."
+                batch.add(f"SHOW SERIES CARDINALITY ON {quote_ident(database)}", msg)
+                batch.add(
+                    f"SHOW TAG VALUES CARDINALITY ON {quote_ident(database)} WITH KEY =~ /.*/", msg
+                )
+            result_sets = batch.results(client)
+
+            sampled = 0
+            for i, database in enumerate(remaining[:INFLUXDB_CARDINALITY_BATCH_SIZE]):
+                if (series := result_sets[2 * i]) is None:
+                    break
+                sampled += 1
+                tag_values = result_sets[2 * i + 1]
+                error = series.error or (tag_values.error if tag_values is not None else None)
+                if error or tag_values is None:
+                    error = error or INFLUXQL_NOT_EXECUTED
+                    _logger.warning(
+                        f"Error sampling the cardinality of {database}. InfluxDB: {error}"
+                    )
+                    results[database] = InfluxQLStatementError(
+                        f"Error sampling the cardinality of {database}.", 2 * i, error
+                    )
+                    continue
+                results[database] = {
+                    "series": sum(p["cardinality estimation"] for p in series.get_points()),
+                    "tag-values": max((p["count"] for p in tag_values.get_points()), default=0),
+                }
+            if not sampled:
+                raise InfluxDBOpsError(f"Error sampling the cardinality of {remaining[0]}.")
+            remaining = remaining[sampled:]
+
+        _logger.debug(f"Sampled the cardinality of {len(results)} databases.")
+        return results
+
+    def create_user_and_database(
+        self,
+        influxdb_database: str,
+        retention_policy: Optional[Dict[str, Any]] = None,
+        rollups: Sequence[Tuple[str, str]] = (),
+    ) -> Dict[Any, Any]:
+        """Create an influxdb user with all privileges on a new database.
+
+        The database, retention policy, rollups, user and grant are provisioned,
+        in that order, with a single multi-statement request. `retention_policy` holds the
+        options returned by `parse_retention_policy`, and `rollups` the
+        (interval, duration) pairs of the rollups to create.
+
+        Raises:
+            InfluxDBOpsError: Raised if any of the provisioning statements fail.
+        """
+        influxdb_username = secrets.token_urlsafe(10)
+        influxdb_password = secrets.token_urlsafe(32)
+
+        batch = InfluxQLBatch().provision_database(
+            influxdb_database, influxdb_username, influxdb_password, retention_policy, rollups
+        )
+        batch.execute(self._influxdb_admin_client())
+
+        _logger.debug("User and database creation succeeded.")
+        return {"username": influxdb_username, "password": influxdb_password}
+
+    def create_users_and_databases(
+        self,
+        influxdb_databases: List[str],
+        retention_policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        rollups: Optional[Dict[str, Sequence[Tuple[str, str]]]] = None,
+    ) -> Dict[str, Union[Dict[str, str], InfluxDBOpsError]]:
+        """Run `create_user_and_database` for several databases concurrently.
+
+        The requests share the pooled admin client and run on a thread pool no
+        larger than its connection pool. `retention_policies` and `rollups`
+        optionally map databases to their retention policy options and rollups.
+
+        Returns:
+            A mapping of each database to the created user credentials, or to
+            the `InfluxDBOpsError` raised while provisioning it.
+        """
+        if not influxdb_databases:
+            return {}
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Open the pooled client in the calling thread; the charm model is not thread-safe.
+        self._influxdb_admin_client()
+
+        workers = min(INFLUXDB_ADMIN_POOL_SIZE, len(influxdb_databases))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                database: pool.submit(
+                    self.create_user_and_database,
+                    database,
+                    (retention_policies or {}).get(database),
+                    (rollups or {}).get(database, ()),
+                )
+                for database in influxdb_databases
+            }
+
+        results: Dict[str, Union[Dict[str, str], InfluxDBOpsError]] = {}
+        for database, future in futures.items():
+            try:
+                results[database] = future.result()
+            except InfluxDBOpsError as e:
+                results[database] = e
+        return results
 
     def update_user_password(self, influxdb_username: str, influxdb_password: str) -> None:
         """Create the influxdb admin user."""
@@ -296,8 +2353,6 @@ class InfluxDBOps:
             msg = "Error updating user password."
             _logger.error(msg)
             raise InfluxDBOpsError(msg)
-        finally:
-            client.close()
         _logger.debug("Updating user password succeeded.")
 
     def update_influxdb_admin_user_password(self) -> str:
@@ -305,3 +2360,94 @@ class InfluxDBOps:
         password = secrets.token_urlsafe(32)
         self.update_user_password(INFLUXDB_ADMIN_USERNAME, password)
         return password
+
+    def _current_privileges(self, usernames: Set[str]) -> Dict[Tuple[str, str], str]:
+        """Return the privilege of each user on each database, keyed by (user, database)."""
+        privileges = {}
+        for username in usernames:
+            for privilege in self.list_privileges(username):
+                privileges[(username, privilege["database"])] = privilege["privilege"]
+        return privileges
+
+    def _plan_provisioning(
+        self, spec: Dict[str, list]
+    ) -> Tuple[InfluxQLBatch, List[Dict[str, str]], List[Dict[str, str]], Dict[str, str]]:
+        """Diff a parsed provisioning spec against influxdb and batch the delta.
+
+        Returns the batch, the per-item report, the report item each statement
+        of the batch belongs to, and the passwords generated for new users.
+        """
+        existing_users = {user["user"] for user in self.list_users()}
+        existing_databases = {database["name"] for database in self.list_databases()}
+        current_privileges = self._current_privileges(
+            {username for username, _, _ in spec["grants"]} & existing_users
+        )
+
+        batch = InfluxQLBatch()
+        report: List[Dict[str, str]] = []
+        statement_items: List[Dict[str, str]] = []
+        passwords: Dict[str, str] = {}
+
+        def _add(kind: str, name: str, unchanged: bool) -> None:
+            report.append({"kind": kind, "name": name, "result": "unchanged"})
+            if not unchanged:
+                statement_items.extend([report[-1]] * (len(batch) - len(statement_items)))
+
+        for username in spec["users"]:
+            if username not in existing_users:
+                passwords[username] = secrets.token_urlsafe(32)
+                batch.create_user(username, passwords[username])
+            _add("user", username, username in existing_users)
+
+        for database in spec["databases"]:
+            if database not in existing_databases:
+                batch.create_database(database).create_retention_policy(database)
+            _add("database", database, database in existing_databases)
+
+        for username, database, privilege in spec["grants"]:
+            granted = (
+                current_privileges.get((username, database)) == INFLUXDB_PRIVILEGES[privilege]
+            )
+            if not granted:
+                batch.grant_privilege(username, database, privilege)
+            _add("grant", f"{username}:{database}:{privilege}", granted)
+
+        return batch, report, statement_items, passwords
+
+    def provision(
+        self, spec: Dict[str, list], dry_run: bool = False
+    ) -> Tuple[List[Dict[str, str]], Dict[str, str]]:
+        """Apply the delta between a parsed provisioning spec and influxdb.
+
+        Only the users, databases and grants missing from influxdb are created,
+        all in one batched request.
+
+        Returns:
+            The per-item report, and the generated password of every user
+            that was created.
+
+        Raises:
+            InfluxDBOpsError: Raised if the current state cannot be read or the
+                batch cannot be sent.
+        """
+        batch, report, statement_items, passwords = self._plan_provisioning(spec)
+
+        if dry_run:
+            for item in statement_items:
+                item["result"] = "planned"
+            return report, {}
+
+        for item, error in zip(statement_items, batch.errors(self._influxdb_admin_client())):
+            if error is None:
+                if item["result"] == "unchanged":
+                    item["result"] = "created"
+            elif not item["result"].startswith("failed"):
+                item["result"] = f"failed: {error}"
+
+        created = [
+            item["name"]
+            for item in report
+            if item["kind"] == "user" and item["result"] == "created"
+        ]
+        _logger.debug(f"Provisioning applied {len(batch)} statements.")
+        return report, {username: passwords[username] for username in created}
@@ -0,0 +1,149 @@
+# Copyright (c) 2025 Vantage Compute Corporation
+# See LICENSE file for licensing details.
+
+"""Lightweight influxdb health probe.
+
+Only the standard library is used so that health checks, which run on every
+update-status hook, do not pay for importing the full influxdb client.
+"""
+
+import http.client
+import json
+import logging
+import math
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from constants import INFLUXDB_PORT
+
+_logger = logging.getLogger(__name__)
+
+
+class InfluxDBProbe:
+    """Probe influxdb over a single reusable keep-alive HTTP connection."""
+
+    def __init__(self, host: str = "127.0.0.1", port: Optional[int] = None, timeout=2.0):
+        self._host = host
+        self._port = port or int(INFLUXDB_PORT)
+        self._timeout = timeout
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def __enter__(self) -> "InfluxDBProbe":
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying connection, if open."""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _request(self, method: str, path: str) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        """Send a request, reconnecting once if the kept-alive connection was dropped."""
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(
+                    self._host, self._port, timeout=self._timeout
+                )
+            try:
+                self._conn.request(method, path)
+                response = self._conn.getresponse()
+                return response.status, response.headers, response.read()
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    raise
+        raise AssertionError("unreachable")
+
+    def ping(self) -> str:
+        """Return the influxdb version from `HEAD /ping`, or an empty string if unreachable."""
+        try:
+            status, headers, _ = self._request("HEAD", "/ping")
+        except (http.client.HTTPException, OSError) as e:
+            _logger.debug(f"InfluxDB ping failed: {e}")
+            return ""
+        if status != 204:
+            return ""
+        return headers.get("X-Influxdb-Version", "")
+
+    def health(self) -> Optional[Dict[str, Any]]:
+        """Return the `GET /health` report, or None if influxdb is unhealthy or unreachable.
+
+        InfluxDB releases before 1.8 have no `/health` endpoint; an empty report
+        is returned for those.
+        """
+        try:
+            status, _, body = self._request("GET", "/health")
+        except (http.client.HTTPException, OSError) as e:
+            _logger.debug(f"InfluxDB health check failed: {e}")
+            return None
+        if status == 404:
+            return {}
+        if status != 200:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def debug_vars(self) -> Optional[Dict[str, Any]]:
+        """Return the `GET /debug/vars` runtime statistics, or None if unavailable.
+
+        The document grows with the number of shards, so it is only fetched to
+        diagnose influxdb once the cheap probes report a problem.
+        """
+        try:
+            status, _, body = self._request("GET", "/debug/vars")
+        except (http.client.HTTPException, OSError) as e:
+            _logger.debug(f"InfluxDB debug vars request failed: {e}")
+            return None
+        if status != 200:
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    def ready(self) -> bool:
+        """Return True if influxdb answers both `/ping` and `/health`."""
+        return bool(self.ping()) and self.health() is not None
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Return the nearest-rank `q` percentile of `values`, or 0.0 if there are none."""
+    if not values:
+        return 0.0
+    ranked = sorted(values)
+    rank = math.ceil(len(ranked) * q / 100)
+    return ranked[min(max(rank, 1), len(ranked)) - 1]
+
+
+def summarize_debug_vars(debug_vars: Dict[str, Any]) -> Dict[str, int]:
+    """Return the runtime statistics of a `/debug/vars` document worth keeping in a snapshot."""
+    summary = {
+        "heap-bytes": 0,
+        "goroutines": 0,
+        "cache-bytes": 0,
+        "points-dropped": 0,
+        "queries-active": 0,
+        "compactions-active": 0,
+    }
+    for stat in debug_vars.values():
+        if not isinstance(stat, dict) or "values" not in stat:
+            continue
+        name, values = stat.get("name"), stat["values"]
+        if name == "runtime":
+            summary["heap-bytes"] = values.get("HeapAlloc", 0)
+            summary["goroutines"] = values.get("NumGoroutine", 0)
+        elif name == "tsm1_cache":
+            summary["cache-bytes"] += values.get("memBytes", 0)
+        elif name == "write":
+            summary["points-dropped"] += values.get("writeDrop", 0)
+        elif name == "queryExecutor":
+            summary["queries-active"] += values.get("queriesActive", 0)
+        elif name == "tsm1_engine":
+            summary["compactions-active"] += sum(
+                value for key, value in values.items() if key.endswith("CompactionsActive")
+            )
+    return summary
@@ -1,17 +1,64 @@
 """influxdb-apiinterface."""
 
+import json
 import logging
+import time
 import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import ops
 
-from constants import DEFAULT_INFLUXDB_RETENTION_POLICY, INFLUXDB_PORT
+from constants import (
+    DEFAULT_INFLUXDB_RETENTION_POLICY,
+    INFLUXDB_CARDINALITY_SAMPLE_INTERVAL,
+    INFLUXDB_PORT,
+    INFLUXDB_ROLLUP_PROFILES,
+    PROVISION_BACKOFF_MAX_SECONDS,
+    PROVISION_BACKOFF_SECONDS,
+    PROVISION_MAX_ATTEMPTS,
+)
+from influxdb_ops import InfluxDBOpsError, parse_retention_policy, rollup_name
 
 _logger = logging.getLogger()
 
 
 class InfluxDB(ops.Object):
-    """InfluxDB API interface."""
+    """InfluxDB API interface.
+
+    Relations that still need a database and credentials are kept in a
+    provisioning queue in stored state, keyed by relation id. The queue is
+    filled with every relation lacking credentials and drained in one go on
+    relation-joined, start and update-status, so many relations joining at
+    once are provisioned concurrently by a single hook instead of deferring
+    one event per relation, and a new leader picks up the relations its
+    predecessor did not provision. Failed entries are retried with
+    exponential backoff; after `PROVISION_MAX_ATTEMPTS` failures an error is
+    logged, the relation is listed in `failed_relations` until it is
+    provisioned, and the attempts start over at the maximum backoff.
+
+    The related application may request the retention duration, shard
+    duration and replication of its database with the `retention-duration`,
+    `shard-duration` and `replication` keys of its application data. Changes
+    to them after provisioning alter the retention policy in place; the
+    applied policy is published as `influxdb_retention_policy`.
+
+    A `rollup-profile` naming one of `INFLUXDB_ROLLUP_PROFILES` sets up the
+    downsampling retention policies and continuous queries of the profile
+    along with the database. The rollup policy of each interval is published
+    as `influxdb_rollups` so long-range queries can target pre-aggregated data.
+
+    The series and tag value cardinality of every provisioned database is
+    sampled on update-status at most every `INFLUXDB_CARDINALITY_SAMPLE_INTERVAL`
+    seconds, cached in stored state and published as `influxdb_cardinality`.
+    A database over its series threshold, the `series-threshold` config or the
+    lower `series-threshold` of the related application, sets `series_limit`
+    and is flagged with `over-threshold` in its `influxdb_cardinality`.
+
+    The ingest listeners of the `ingest-listeners` config are published as
+    `influxdb_ingest_endpoints` once a relation is provisioned.
+    """
+
+    _stored = ops.StoredState()
 
     def __init__(self, charm, relation_name):
         """Set self._relation_name and self.charm."""
@@ -19,46 +66,322 @@ class InfluxDB(ops.Object):
         self._charm = charm
         self._relation_name = relation_name
 
+        self._stored.set_default(pending={}, provisioned={}, cardinality={}, sampled_at=0.0)
+
         self.framework.observe(
             self._charm.on[self._relation_name].relation_joined,
             self._on_relation_joined,
         )
 
+        self.framework.observe(
+            self._charm.on[self._relation_name].relation_changed,
+            self._on_relation_changed,
+        )
+
         self.framework.observe(
             self._charm.on[self._relation_name].relation_broken,
             self._on_relation_broken,
         )
 
+        self.framework.observe(self._charm.on.start, self._drain_provisioning_queue)
+        self.framework.observe(self._charm.on.update_status, self._drain_provisioning_queue)
+        self.framework.observe(self._charm.on.update_status, self._sample_cardinality)
+
+    @property
+    def pending_relations(self) -> int:
+        """Return the number of relations waiting to be provisioned."""
+        return len(self._stored.pending)
+
+    @property
+    def failed_relations(self) -> List[str]:
+        """Return the applications of the queued relations that ran out of attempts."""
+        failed = []
+        for relation_id, item in self._stored.pending.items():
+            if not item.get("exhausted"):
+                continue
+            relation = self.model.get_relation(self._relation_name, int(relation_id))
+            failed.append(relation.app.name if relation and relation.app else relation_id)
+        return sorted(failed)
+
+    @property
+    def over_threshold(self) -> List[str]:
+        """Return the databases whose last sampled series cardinality exceeded their threshold."""
+        return sorted(
+            database
+            for database, sample in self._stored.cardinality.items()
+            if sample["threshold"] and sample["series"] > sample["threshold"]
+        )
+
+    @property
+    def series_limit(self) -> int:
+        """Return the instance-wide series limit the cardinality guard requires, or 0 for none.
+
+        InfluxDB 1.x can only apply `max-series-per-database` to every database
+        at once, so a single cap is applied: the largest threshold of the
+        databases over their threshold, but never less than the threshold of a
+        database under it, or the series of a database without one. A database
+        over a lower threshold than that cap keeps creating series up to it.
+        """
+        if not (over := self.over_threshold):
+            return 0
+        cardinality = self._stored.cardinality
+        limits = [cardinality[database]["threshold"] for database in over]
+        limits += [
+            sample["threshold"] or sample["series"]
+            for database, sample in cardinality.items()
+            if database not in over
+        ]
+        return max(limits)
+
     def _on_relation_joined(self, event: ops.RelationJoinedEvent) -> None:
-        """Create a database and user/password for influxdb."""
-        if not self.model.unit.is_leader():
+        """Provision the new relation along with the rest of the queue."""
+        self._drain_provisioning_queue(event)
+
+    def _enqueue_unprovisioned(self) -> None:
+        """Queue every relation without credentials that is not queued yet."""
+        for relation in self.model.relations[self._relation_name]:
+            if str(relation.id) in self._stored.pending:
+                continue
+            if relation.data[self.model.app].get("influx_client_creds_secret_id"):
+                continue
+            self._stored.pending[str(relation.id)] = {
+                "database": f"{uuid.uuid4()}",
+                "attempts": 0,
+                "retry_at": 0.0,
+            }
+
+    def _drain_provisioning_queue(self, _: ops.EventBase) -> None:
+        """Create a database and user/password for every queued relation that is due."""
+        if not self.model.unit.is_leader() or not self._charm.influxdb_installed:
             return
 
-        if not self._charm.influxdb_installed:
-            event.defer()
+        self._enqueue_unprovisioned()
+        now = time.time()
+        due = {}
+        for relation_id, item in list(self._stored.pending.items()):
+            relation = self.model.get_relation(self._relation_name, int(relation_id))
+            if relation is None:
+                del self._stored.pending[relation_id]
+            elif item["retry_at"] <= now:
+                due[item["database"]] = (relation_id, relation)
+
+        if not due:
             return
 
-        database_name = f"{uuid.uuid4()}"
-        if user_pass := self._charm.influxdb_ops.create_user_and_database(database_name):
-            secret = self.model.app.add_secret(
+        _logger.debug(f"Provisioning {len(due)} of {len(self._stored.pending)} queued relations.")
+        policies = {
+            database: self._retention_policy(relation) for database, (_, relation) in due.items()
+        }
+        rollups = {database: self._rollups(relation) for database, (_, relation) in due.items()}
+        results = self._charm.influxdb_ops.create_users_and_databases(list(due), policies, rollups)
+        for database, result in results.items():
+            relation_id, relation = due[database]
+            if isinstance(result, InfluxDBOpsError):
+                self._retry_later(relation_id, result)
+                continue
+            self._publish_credentials(relation, database, result)
+            self.publish_ingest_endpoints([relation])
+            self._stored.provisioned[relation_id] = database
+            relation.data[self.model.app]["influxdb_retention_policy"] = json.dumps(
+                policies[database], sort_keys=True
+            )
+            if rollups[database]:
+                relation.data[self.model.app]["influxdb_rollups"] = json.dumps(
+                    {interval: rollup_name(interval) for interval, _ in rollups[database]}
+                )
+            del self._stored.pending[relation_id]
+
+    def _retention_policy(self, relation: ops.Relation) -> Dict[str, Any]:
+        """Return the retention policy options requested by the related application."""
+        data = relation.data[relation.app] if relation.app is not None else {}
+        try:
+            return parse_retention_policy(
                 {
-                    **user_pass,
-                    "host": self._charm.ingress_address,
-                    "port": INFLUXDB_PORT,
-                    "database": database_name,
-                    "policy": DEFAULT_INFLUXDB_RETENTION_POLICY,
-                },
-                label=f"{event.app.name}-influxdb-credentials",
+                    "duration": data.get("retention-duration"),
+                    "shard-duration": data.get("shard-duration"),
+                    "replication": data.get("replication"),
+                }
+            )
+        except InfluxDBOpsError as e:
+            _logger.warning(
+                f"Ignoring the retention policy requested by relation {relation.id}: {e.message}"
+            )
+            return parse_retention_policy({})
+
+    def _retry_later(self, relation_id: str, error: InfluxDBOpsError) -> None:
+        """Schedule a failed relation for retry, starting over once out of attempts."""
+        item = dict(self._stored.pending[relation_id])
+        item["attempts"] += 1
+        if item["attempts"] >= PROVISION_MAX_ATTEMPTS:
+            _logger.error(
+                f"Provisioning relation {relation_id} failed {item['attempts']} times "
+                f"({error.message}), retrying in {PROVISION_BACKOFF_MAX_SECONDS}s."
+            )
+            item["attempts"] = 0
+            item["exhausted"] = True
+            item["retry_at"] = time.time() + PROVISION_BACKOFF_MAX_SECONDS
+            self._stored.pending[relation_id] = item
+            return
+
+        backoff = min(
+            PROVISION_BACKOFF_SECONDS * 2 ** (item["attempts"] - 1), PROVISION_BACKOFF_MAX_SECONDS
+        )
+        item["retry_at"] = time.time() + backoff
+        self._stored.pending[relation_id] = item
+        _logger.warning(
+            f"Provisioning relation {relation_id} failed ({error.message}), "
+            f"retrying in {backoff}s."
+        )
+
+    def _publish_credentials(self, relation: ops.Relation, database: str, user_pass: dict) -> None:
+        """Share the provisioned credentials with the related application."""
+        app_name = relation.app.name if relation.app is not None else f"{relation.id}"
+        secret = self.model.app.add_secret(
+            {
+                **user_pass,
+                "host": self._charm.ingress_address,
+                "port": INFLUXDB_PORT,
+                "database": database,
+                "policy": DEFAULT_INFLUXDB_RETENTION_POLICY,
+            },
+            label=f"{app_name}-influxdb-credentials",
+        )
+        secret.grant(relation)
+
+        secret_id = secret.id if secret.id is not None else ""
+        relation.data[self.model.app]["influx_client_creds_secret_id"] = secret_id
+
+    def publish_ingest_endpoints(self, relations: Optional[Sequence[ops.Relation]] = None) -> None:
+        """Advertise the ingest listeners as `influxdb_ingest_endpoints` on provisioned relations.
+
+        Each endpoint carries the protocol, transport, host and port of a
+        listener and the database it writes to. The key is removed when no
+        listener is configured.
+        """
+        if not self.model.unit.is_leader():
+            return
+
+        endpoints = self._charm.ingest_endpoints
+        published = (
+            json.dumps(
+                [{**endpoint, "host": self._charm.ingress_address} for endpoint in endpoints],
+                sort_keys=True,
+            )
+            if endpoints
+            else ""
+        )
+        if relations is None:
+            relations = self.model.relations[self._relation_name]
+        for relation in relations:
+            app_data = relation.data[self.model.app]
+            if not app_data.get("influx_client_creds_secret_id"):
+                continue
+            if app_data.get("influxdb_ingest_endpoints", "") != published:
+                app_data["influxdb_ingest_endpoints"] = published
+
+    def _rollups(self, relation: ops.Relation) -> Sequence[Tuple[str, str]]:
+        """Return the (interval, duration) rollups of the requested rollup profile."""
+        data = relation.data[relation.app] if relation.app is not None else {}
+        if not (profile := data.get("rollup-profile")):
+            return ()
+        if profile not in INFLUXDB_ROLLUP_PROFILES:
+            _logger.warning(
+                f"Ignoring unknown rollup profile {profile} of relation {relation.id}."
+            )
+            return ()
+        return INFLUXDB_ROLLUP_PROFILES[profile]
+
+    def _series_threshold(self, relation: ops.Relation) -> int:
+        """Return the series threshold of a relation's database, or 0 if it has none."""
+        threshold = self._charm.config["series-threshold"]
+        data = relation.data[relation.app] if relation.app is not None else {}
+        try:
+            requested = int(data.get("series-threshold") or 0)
+        except ValueError:
+            _logger.warning(f"Ignoring the invalid series threshold of relation {relation.id}.")
+            requested = 0
+        # A related application may only tighten the guard on its own database.
+        if requested > 0 and (not threshold or requested < threshold):
+            return requested
+        return threshold
+
+    def _provisioned_databases(self) -> Dict[str, ops.Relation]:
+        """Return the relation of every provisioned database."""
+        databases = {}
+        for relation in self.model.relations[self._relation_name]:
+            relation_id = str(relation.id)
+            if relation_id not in self._stored.provisioned:
+                # Relations provisioned before the database was kept in stored state.
+                if not (
+                    secret_id := relation.data[self.model.app].get("influx_client_creds_secret_id")
+                ):
+                    continue
+                secret = self.model.get_secret(id=secret_id)
+                self._stored.provisioned[relation_id] = secret.get_content()["database"]
+            databases[self._stored.provisioned[relation_id]] = relation
+        return databases
+
+    def _sample_cardinality(self, _: ops.EventBase) -> None:
+        """Sample the cardinality of every provisioned database, if the cached sample is stale."""
+        if not self.model.unit.is_leader() or not self._charm.influxdb_installed:
+            return
+        if time.time() < self._stored.sampled_at + INFLUXDB_CARDINALITY_SAMPLE_INTERVAL:
+            return
+
+        databases = self._provisioned_databases()
+        try:
+            samples = self._charm.influxdb_ops.sample_cardinality(list(databases))
+        except InfluxDBOpsError as e:
+            _logger.error(
+                f"Sampling the cardinality of {len(databases)} databases failed: {e.message}"
+            )
+            return
+
+        cardinality = {}
+        for database, sample in samples.items():
+            if isinstance(sample, InfluxDBOpsError):
+                continue
+            relation = databases[database]
+            threshold = self._series_threshold(relation)
+            cardinality[database] = {**sample, "threshold": threshold}
+            over = bool(threshold) and sample["series"] > threshold
+            published = json.dumps(
+                {**cardinality[database], "over-threshold": over}, sort_keys=True
             )
-            secret.grant(event.relation)
+            if relation.data[self.model.app].get("influxdb_cardinality") != published:
+                relation.data[self.model.app]["influxdb_cardinality"] = published
+        self._stored.cardinality = cardinality
+        self._stored.sampled_at = time.time()
 
-            secret_id = secret.id if secret.id is not None else ""
-            event.relation.data[self.model.app]["influx_client_creds_secret_id"] = secret_id
+        if over := self.over_threshold:
+            _logger.warning(f"Series cardinality over threshold for: {', '.join(over)}.")
+
+    def _on_relation_changed(self, event: ops.RelationChangedEvent) -> None:
+        """Alter the retention policy of a provisioned relation if its request changed."""
+        if not self.model.unit.is_leader() or not self._charm.influxdb_installed:
+            return
+
+        app_data = event.relation.data[self.model.app]
+        # Queued relations pick up the latest request when they are provisioned.
+        if not (secret_id := app_data.get("influx_client_creds_secret_id")):
             return
 
-        event.defer()
+        policy = self._retention_policy(event.relation)
+        if json.dumps(policy, sort_keys=True) == app_data.get("influxdb_retention_policy"):
+            return
+
+        database = self.model.get_secret(id=secret_id).get_content()["database"]
+        try:
+            self._charm.influxdb_ops.alter_retention_policy(database, **policy)
+        except InfluxDBOpsError as e:
+            _logger.error(f"Altering the retention policy of {database} failed: {e.message}")
+            event.defer()
+            return
+        app_data["influxdb_retention_policy"] = json.dumps(policy, sort_keys=True)
 
     def _on_relation_broken(self, event: ops.RelationBrokenEvent) -> None:
         """Clear the influxdb info if the relation is broken."""
         if self.model.unit.is_leader():
+            self._stored.pending.pop(str(event.relation.id), None)
+            self._stored.provisioned.pop(str(event.relation.id), None)
             event.relation.data[self.model.app]["influxdb_info"] = ""
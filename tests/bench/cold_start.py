@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Measure the cold-start cost of a single charm hook.
+
+Run as `python cold_start.py <hook>` from the charm root with `src` and `lib`
+on PYTHONPATH. A fresh interpreter imports the charm, dispatches the hook
+through `scenario.Context` and prints a JSON record with the import and
+handling times and the heavy modules the hook loaded.
+"""
+
+import json
+import sys
+import time
+from unittest.mock import Mock, patch
+
+# Modules that should only be loaded by hooks that talk to influxdb or apt.
+HEAVY_MODULES = (
+    "charms.operator_libs_linux.v0.apt",
+    "dateutil",
+    "influxdb",
+    "msgpack",
+    "numpy",
+    "pandas",
+    "requests",
+    "urllib3",
+)
+
+INSTALLED = {"influxdb_installed": True}
+# Return values of the patched targets that are not a plain dict.
+RETURN_VALUES = {"charm.write_influxdb_configuration_and_restart_service": ({}, True)}
+
+
+def _hooks(scenario, ctx):
+    """Return the event, initial state and patches of each benchmarked hook."""
+    admin_secret = scenario.Secret({"password": "admin"}, label="influxdb-admin-password")
+    installed = scenario.StoredState(owner_path="InfluxDBOperator", content=INSTALLED)
+    ctx_on = ctx.on
+    return {
+        "install": (
+            ctx_on.install(),
+            scenario.State(),
+            [
+                "charms.operator_libs_linux.v0.apt.update",
+                "charms.operator_libs_linux.v0.apt.add_package",
+                "charm.create_influxdb_admin_user",
+                "charm.write_influxdb_configuration_and_restart_service",
+                "charm.configure_exporter_service",
+                "charm.wait_until_ready",
+            ],
+        ),
+        "start": (ctx_on.start(), scenario.State(), []),
+        "config-changed": (ctx_on.config_changed(), scenario.State(), []),
+        "update-status": (
+            ctx_on.update_status(),
+            scenario.State(stored_states=[installed]),
+            [],
+        ),
+        "get-admin-password": (
+            ctx_on.action("get-admin-password"),
+            scenario.State(secrets=[admin_secret]),
+            [],
+        ),
+        "list-users": (
+            ctx_on.action("list-users"),
+            scenario.State(secrets=[admin_secret]),
+            ["influxdb.InfluxDBClient"],
+        ),
+    }
+
+
+def main(hook: str) -> dict:
+    """Dispatch `hook` in this interpreter and return its cold-start record."""
+    start = time.perf_counter()
+    import ops  # noqa: F401
+
+    ops_imported = time.perf_counter()
+    import charm
+
+    charm_imported = time.perf_counter()
+    charm_modules = set(sys.modules)
+
+    import scenario
+
+    ctx = scenario.Context(charm.InfluxDBOperator)
+    event, state, targets = _hooks(scenario, ctx)[hook]
+    patches = [
+        patch(target, Mock(return_value=RETURN_VALUES.get(target, {}))) for target in targets
+    ]
+    for p in patches:
+        p.start()
+    dispatched = time.perf_counter()
+    try:
+        ctx.run(event, state)
+    except scenario.errors.UncaughtCharmError:
+        pass
+    finally:
+        handled = time.perf_counter()
+        for p in patches:
+            p.stop()
+
+    loaded = set(sys.modules)
+    return {
+        "hook": hook,
+        "ops_import_seconds": round(ops_imported - start, 6),
+        "charm_import_seconds": round(charm_imported - ops_imported, 6),
+        "hook_seconds": round(handled - dispatched, 6),
+        "heavy_modules_at_import": sorted(m for m in HEAVY_MODULES if m in charm_modules),
+        "heavy_modules_loaded": sorted(m for m in HEAVY_MODULES if m in loaded),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(main(sys.argv[1])))
@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process stand-in for the InfluxDB 1.x HTTP API.
+
+Implements `/ping`, `/health`, `/write` and the InfluxQL statements the charm
+issues against `/query` (users, databases, retention policies, grants,
+continuous queries, cardinality and their SHOW statements), keeping all state
+in memory. Every request is counted so benchmarks can assert on the number of
+HTTP calls a hook makes.
+
+`latency` delays every `/query` and `/write` response, and `error_rate` and
+`fail_pattern` inject failures, so the control-plane code can be load tested
+at thousands of tenants without a live service. Run the module directly to
+serve it on a fixed port:
+
+    python tests/bench/fake_influxdb.py --port 8086 --latency 0.005
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+VERSION = "1.8.10"
+
+_IDENT = r'"((?:[^"\\]|\\.)*)"'
+_LITERAL = r"'((?:[^'\\]|\\.)*)'"
+_RP_OPTIONS = r"((?: (?:DURATION \w+|REPLICATION \d+|SHARD DURATION \w+|DEFAULT))*)"
+_STATEMENTS = {
+    "create_user": rf"CREATE USER {_IDENT} WITH PASSWORD {_LITERAL}( WITH ALL PRIVILEGES)?",
+    "drop_user": rf"DROP USER {_IDENT}",
+    "set_password": rf"SET PASSWORD FOR {_IDENT} = {_LITERAL}",
+    "show_users": r"SHOW USERS",
+    "create_database": rf"CREATE DATABASE {_IDENT}",
+    "drop_database": rf"DROP DATABASE {_IDENT}",
+    "show_databases": r"SHOW DATABASES",
+    "create_retention_policy": rf"CREATE RETENTION POLICY {_IDENT} ON {_IDENT}{_RP_OPTIONS}",
+    "alter_retention_policy": rf"ALTER RETENTION POLICY {_IDENT} ON {_IDENT}{_RP_OPTIONS}",
+    "drop_retention_policy": rf"DROP RETENTION POLICY {_IDENT} ON {_IDENT}",
+    "show_retention_policies": rf"SHOW RETENTION POLICIES ON {_IDENT}",
+    "grant": rf"GRANT (ALL|ALL PRIVILEGES|READ|WRITE) ON {_IDENT} TO {_IDENT}",
+    "revoke": rf"REVOKE (ALL|ALL PRIVILEGES|READ|WRITE) ON {_IDENT} FROM {_IDENT}",
+    "show_grants": rf"SHOW GRANTS FOR {_IDENT}",
+    "create_continuous_query": (
+        rf"CREATE CONTINUOUS QUERY {_IDENT} ON {_IDENT}"
+        r"(?: RESAMPLE(?: EVERY \w+)?(?: FOR \w+)?)? BEGIN (.+) END"
+    ),
+    "drop_continuous_query": rf"DROP CONTINUOUS QUERY {_IDENT} ON {_IDENT}",
+    "show_continuous_queries": r"SHOW CONTINUOUS QUERIES",
+    "show_series_cardinality": rf"SHOW SERIES CARDINALITY ON {_IDENT}",
+    "show_tag_values_cardinality": rf"SHOW TAG VALUES CARDINALITY ON {_IDENT} WITH KEY =~ /\.\*/",
+}
+_PATTERNS = {name: re.compile(f"{pattern}$", re.I) for name, pattern in _STATEMENTS.items()}
+_DURATION_UNITS = {"w": 604800, "d": 86400, "h": 3600, "m": 60, "s": 1}
+_DURATION_PART = re.compile(r"(\d+)(w|d|h|m|s)")
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\(.)", r"\1", value)
+
+
+def _duration(value: str) -> int:
+    """Return an InfluxQL duration literal in seconds; `INF` is 0."""
+    if value.upper() == "INF":
+        return 0
+    parts = _DURATION_PART.findall(value)
+    if not parts or "".join(n + u for n, u in parts) != value:
+        raise ValueError(f"invalid duration: {value}")
+    return sum(int(n) * _DURATION_UNITS[u] for n, u in parts)
+
+
+def _format_duration(seconds: int) -> str:
+    """Format seconds the way InfluxDB reports durations, e.g. `168h0m0s`."""
+    return f"{seconds // 3600}h{seconds % 3600 // 60}m{seconds % 60}s"
+
+
+def _shard_duration(duration: int) -> int:
+    """Return the shard group duration InfluxDB derives from an RP duration."""
+    if duration == 0 or duration > 180 * 86400:
+        return 7 * 86400
+    if duration < 2 * 86400:
+        return 3600
+    return 86400
+
+
+def split_statements(query: str) -> List[str]:
+    """Split a multi-statement query on semicolons outside of quotes."""
+    statements, current, quote = [], "", None
+    escaped = False
+    for char in query:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif quote and char == quote:
+            quote = None
+        elif not quote and char in "\"'":
+            quote = char
+        elif not quote and char == ";":
+            statements.append(current.strip())
+            current = ""
+            continue
+        current += char
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+
+def _split_unescaped(line: str, separators: str) -> List[str]:
+    """Split a line protocol point on unescaped separators."""
+    parts, start, escaped = [], 0, False
+    for i, char in enumerate(line):
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in separators:
+            parts.append(line[start:i])
+            start = i + 1
+    return parts + [line[start:]]
+
+
+def _series_key(line: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Return the measurement and tags of a line protocol point."""
+    key = _split_unescaped(line, " ")
+    if len(key) < 2:
+        raise ValueError(f"unable to parse '{line}': missing fields")
+    measurement, *tags = _split_unescaped(key[0], ",")
+    return measurement, tuple(sorted(tuple(tag.split("=", 1)) for tag in tags))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept bursts of concurrent connections from pooled clients.
+    request_queue_size = 1024
+
+
+class FakeInfluxDB:
+    """In-memory InfluxDB 1.x served over HTTP on a local port.
+
+    Args:
+        port: Port to listen on; 0 picks a free one.
+        latency: Seconds to delay every `/query` and `/write` response.
+        error_rate: Probability of answering a `/query` or `/write` request
+            with an HTTP 500 instead of handling it.
+        seed: Seed for the failure injection, for reproducible runs.
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.error_rate = error_rate
+        # Statements matching this pattern fail with an InfluxQL error.
+        self.fail_pattern: Optional[Pattern] = None
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.databases: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.continuous_queries: Dict[str, Dict[str, str]] = {}
+        self.points: Dict[Tuple[str, str, str], int] = {}
+        self.series: Dict[str, Set[Tuple[str, Tuple[Tuple[str, str], ...]]]] = {}
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", port), _Handler)
+        self._server.fake = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """Return the port the server listens on."""
+        return self._server.server_address[1]
+
+    def __enter__(self) -> "FakeInfluxDB":
+        self.start()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop serving and close the listening socket."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self) -> None:
+        """Drop all users, databases and points, and zero the request counter."""
+        with self._lock:
+            self.users.clear()
+            self.databases.clear()
+            self.continuous_queries.clear()
+            self.points.clear()
+            self.series.clear()
+            self.requests = 0
+
+    def inject_error(self) -> bool:
+        """Return True if the current request should fail, per `error_rate`."""
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def query(self, query: str) -> Dict[str, Any]:
+        """Execute a multi-statement query, stopping at the first failing statement.
+
+        Like InfluxDB, every statement after the failing one is reported as
+        not executed.
+        """
+        results = []
+        failed = False
+        with self._lock:
+            for statement_id, statement in enumerate(split_statements(query)):
+                if failed:
+                    results.append({"statement_id": statement_id, "error": "not executed"})
+                    continue
+                try:
+                    if self.fail_pattern is not None and self.fail_pattern.search(statement):
+                        raise ValueError(f"injected failure: {statement}")
+                    result = self._execute(statement)
+                except ValueError as e:
+                    results.append({"statement_id": statement_id, "error": str(e)})
+                    failed = True
+                    continue
+                results.append({"statement_id": statement_id, **result})
+        return {"results": results}
+
+    def write(self, database: str, retention_policy: Optional[str], body: str) -> None:
+        """Store the points of a line protocol body, counted per measurement."""
+        with self._lock:
+            if database not in self.databases:
+                raise LookupError(f'database not found: "{database}"')
+            policies = self.databases[database]
+            rp = retention_policy or next((n for n, p in policies.items() if p["default"]), "")
+            if rp not in policies:
+                raise LookupError(f'retention policy not found: "{rp}"')
+            for line in body.splitlines():
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                series = _series_key(line)
+                key = (database, rp, series[0])
+                self.points[key] = self.points.get(key, 0) + 1
+                self.series.setdefault(database, set()).add(series)
+
+    def _execute(self, statement: str) -> Dict[str, Any]:
+        for name, pattern in _PATTERNS.items():
+            if match := pattern.match(statement):
+                args = [_unescape(arg) if arg else arg for arg in match.groups()]
+                if name == "create_continuous_query":
+                    args.append(statement)
+                return getattr(self, f"_{name}")(*args) or {}
+        raise ValueError(f"error parsing query: {statement}")
+
+    @staticmethod
+    def _series(name: Optional[str], columns: List[str], values: List[list]) -> Dict[str, Any]:
+        if not values:
+            return {}
+        series = {"columns": columns, "values": values}
+        if name:
+            series["name"] = name
+        return {"series": [series]}
+
+    def _user(self, username: str) -> Dict[str, Any]:
+        if username not in self.users:
+            raise ValueError("user not found")
+        return self.users[username]
+
+    def _policies(self, database: str) -> Dict[str, Dict[str, Any]]:
+        if database not in self.databases:
+            raise ValueError("database not found")
+        return self.databases[database]
+
+    def _create_user(self, username: str, password: str, admin: Optional[str]) -> None:
+        if username in self.users and self.users[username]["password"] != password:
+            raise ValueError("user already exists")
+        self.users.setdefault(username, {"password": password, "admin": bool(admin)})
+        self.users[username].setdefault("grants", {})
+
+    def _drop_user(self, username: str) -> None:
+        self._user(username)
+        del self.users[username]
+
+    def _set_password(self, username: str, password: str) -> None:
+        self._user(username)["password"] = password
+
+    def _show_users(self) -> Dict[str, Any]:
+        values = [[name, user["admin"]] for name, user in sorted(self.users.items())]
+        return self._series(None, ["user", "admin"], values)
+
+    def _create_database(self, database: str) -> None:
+        if database not in self.databases:
+            self.databases[database] = {}
+            self._create_retention_policy("autogen", database, " DURATION INF DEFAULT")
+
+    def _drop_database(self, database: str) -> None:
+        self.databases.pop(database, None)
+        self.continuous_queries.pop(database, None)
+        self.series.pop(database, None)
+        for user in self.users.values():
+            user["grants"].pop(database, None)
+
+    def _show_databases(self) -> Dict[str, Any]:
+        return self._series("databases", ["name"], [[name] for name in sorted(self.databases)])
+
+    def _set_retention_policy(self, policy: Dict[str, Any], options: str) -> bool:
+        """Apply RP options to `policy`, returning True if it was made the default."""
+        options = options.strip()
+        if match := re.search(r"SHARD DURATION (\w+)", options, re.I):
+            policy["shard_duration"] = _duration(match.group(1))
+            options = options.replace(match.group(0), "")
+        if match := re.search(r"DURATION (\w+)", options, re.I):
+            policy["duration"] = _duration(match.group(1))
+        if match := re.search(r"REPLICATION (\d+)", options, re.I):
+            policy["replication"] = int(match.group(1))
+        return bool(re.search(r"\bDEFAULT\b", options, re.I))
+
+    def _make_default(self, database: str, name: str) -> None:
+        for rp_name, policy in self.databases[database].items():
+            policy["default"] = rp_name == name
+
+    def _create_retention_policy(self, name: str, database: str, options: str) -> None:
+        policies = self._policies(database)
+        if not re.search(r"\bDURATION\b", options, re.I):
+            raise ValueError("found EOF, expected DURATION")
+        policy = {"duration": 0, "shard_duration": 0, "replication": 1, "default": False}
+        default = self._set_retention_policy(policy, options)
+        policy["shard_duration"] = policy["shard_duration"] or _shard_duration(policy["duration"])
+        if name in policies:
+            if {**policies[name], "default": False} != {**policy, "default": False}:
+                raise ValueError("retention policy already exists")
+            policy = policies[name]
+        policies[name] = policy
+        if default:
+            self._make_default(database, name)
+
+    def _alter_retention_policy(self, name: str, database: str, options: str) -> None:
+        policies = self._policies(database)
+        if name not in policies:
+            raise ValueError("retention policy not found")
+        if not options.strip():
+            raise ValueError("found EOF, expected DURATION, REPLICATION, SHARD, DEFAULT")
+        if self._set_retention_policy(policies[name], options):
+            self._make_default(database, name)
+
+    def _drop_retention_policy(self, name: str, database: str) -> None:
+        self._policies(database).pop(name, None)
+
+    def _show_retention_policies(self, database: str) -> Dict[str, Any]:
+        values = [
+            [
+                name,
+                _format_duration(policy["duration"]),
+                _format_duration(policy["shard_duration"]),
+                policy["replication"],
+                policy["default"],
+            ]
+            for name, policy in self._policies(database).items()
+        ]
+        columns = ["name", "duration", "shardGroupDuration", "replicaN", "default"]
+        return self._series(None, columns, values)
+
+    def _grant(self, privilege: str, database: str, username: str) -> None:
+        user = self._user(username)
+        self._policies(database)
+        privilege = privilege.upper()
+        user["grants"][database] = "ALL PRIVILEGES" if privilege.startswith("ALL") else privilege
+
+    def _revoke(self, privilege: str, database: str, username: str) -> None:
+        grants = self._user(username)["grants"]
+        current = grants.get(database)
+        privilege = privilege.upper()
+        if current is None or privilege.startswith("ALL") or current == privilege:
+            grants.pop(database, None)
+        elif current == "ALL PRIVILEGES":
+            grants[database] = "WRITE" if privilege == "READ" else "READ"
+
+    def _show_grants(self, username: str) -> Dict[str, Any]:
+        grants = sorted(self._user(username)["grants"].items())
+        return self._series(None, ["database", "privilege"], [list(grant) for grant in grants])
+
+    def _create_continuous_query(
+        self, name: str, database: str, select: str, statement: str
+    ) -> None:
+        self._policies(database)
+        queries = self.continuous_queries.setdefault(database, {})
+        if queries.get(name, statement) != statement:
+            raise ValueError("continuous query already exists")
+        queries[name] = statement
+
+    def _drop_continuous_query(self, name: str, database: str) -> None:
+        if self.continuous_queries.get(database, {}).pop(name, None) is None:
+            raise ValueError(f"continuous query not found: {name}")
+
+    def _show_continuous_queries(self) -> Dict[str, Any]:
+        series = []
+        for database in sorted(self.databases):
+            queries = sorted(self.continuous_queries.get(database, {}).items())
+            series.append({"name": database, "columns": ["name", "query"]})
+            if queries:
+                series[-1]["values"] = [list(query) for query in queries]
+        return {"series": series} if series else {}
+
+    def _show_series_cardinality(self, database: str) -> Dict[str, Any]:
+        self._policies(database)
+        count = len(self.series.get(database, ()))
+        return self._series(None, ["cardinality estimation"], [[count]])
+
+    def _show_tag_values_cardinality(self, database: str) -> Dict[str, Any]:
+        self._policies(database)
+        tag_values: Dict[str, set] = {}
+        for measurement, tags in self.series.get(database, ()):
+            tag_values.setdefault(measurement, set()).update(tags)
+        series = [
+            {"name": measurement, "columns": ["count"], "values": [[len(values)]]}
+            for measurement, values in sorted(tag_values.items())
+            if values
+        ]
+        return {"series": series} if series else {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: _Server
+
+    def _reply(self, status: int, body: Optional[Dict[str, Any]] = None) -> None:
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("X-Influxdb-Version", VERSION)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _handle(self) -> None:
+        fake = self.server.fake
+        with fake._lock:
+            fake.requests += 1
+
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        body = b""
+        if length := int(self.headers.get("Content-Length") or 0):
+            body = self.rfile.read(length)
+
+        if url.path == "/ping":
+            self._reply(204)
+            return
+        if url.path == "/health":
+            self._reply(200, {"name": "influxdb", "status": "pass", "version": VERSION})
+            return
+        if url.path not in ("/query", "/write"):
+            self._reply(404, {"error": "not found"})
+            return
+
+        if fake.latency:
+            time.sleep(fake.latency)
+        if fake.inject_error():
+            self._reply(500, {"error": "injected failure"})
+        elif url.path == "/write":
+            self._write(fake, params, body.decode())
+        else:
+            if self.headers.get("Content-Type", "").startswith("application/x-www-form"):
+                params.update(parse_qs(body.decode()))
+            if "q" in params:
+                self._reply(200, fake.query(params["q"][0]))
+            else:
+                self._reply(400, {"error": 'missing required parameter "q"'})
+
+    def _write(self, fake: FakeInfluxDB, params: Dict[str, List[str]], body: str) -> None:
+        if "db" not in params:
+            self._reply(400, {"error": "database is required"})
+            return
+        try:
+            fake.write(params["db"][0], params.get("rp", [None])[0], body)
+        except LookupError as e:
+            self._reply(404, {"error": e.args[0]})
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+        else:
+            self._reply(204)
+
+    do_GET = do_HEAD = do_POST = _handle  # noqa: N815
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+def main() -> None:
+    """Serve the fake server in the foreground until interrupted."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8086)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fake = FakeInfluxDB(args.port, args.latency, args.error_rate, args.seed)
+    print(f"Serving fake InfluxDB {VERSION} on 127.0.0.1:{fake.port}")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
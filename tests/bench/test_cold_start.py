@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cold-start benchmarks for the InfluxDB operator hooks."""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest import TestCase
+
+ROOT = Path(__file__).parents[2]
+COLD_START = Path(__file__).parent / "cold_start.py"
+
+# Hooks that must not import the influxdb client or the apt library.
+LIGHT_HOOKS = ("start", "config-changed", "update-status", "get-admin-password")
+HEAVY_HOOKS = ("install", "list-users")
+
+
+def cold_start(hook: str) -> dict:
+    """Run `hook` in a fresh interpreter and return its cold-start record."""
+    env = {**os.environ, "PYTHONPATH": f"{ROOT / 'src'}:{ROOT / 'lib'}"}
+    out = subprocess.run(
+        [sys.executable, str(COLD_START), hook],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+class TestColdStart(TestCase):
+    """Benchmark the import cost of each hook."""
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Run every hook once in its own interpreter."""
+        cls.records = {hook: cold_start(hook) for hook in LIGHT_HOOKS + HEAVY_HOOKS}
+        if output_dir := os.environ.get("BENCH_OUTPUT_DIR"):
+            (Path(output_dir) / "cold_start.json").write_text(
+                json.dumps(list(cls.records.values()), indent=2)
+            )
+        for record in cls.records.values():
+            print(json.dumps(record))
+
+    def test_charm_import_is_light(self) -> None:
+        """Test importing the charm loads none of the heavy modules."""
+        for hook, record in self.records.items():
+            self.assertEqual(record["heavy_modules_at_import"], [], hook)
+
+    def test_light_hooks_stay_light(self) -> None:
+        """Test hooks that do not talk to influxdb or apt never import their clients."""
+        for hook in LIGHT_HOOKS:
+            self.assertEqual(self.records[hook]["heavy_modules_loaded"], [], hook)
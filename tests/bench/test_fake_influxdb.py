@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the fake InfluxDB server used by the benchmarks."""
+
+import http.client
+import json
+import re
+from unittest import TestCase
+from urllib.parse import urlencode
+
+from fake_influxdb import FakeInfluxDB
+
+
+class TestFakeInfluxDB(TestCase):
+    """Test the fake server behaves like InfluxDB 1.x for the paths the charm uses."""
+
+    def setUp(self) -> None:
+        self.fake = FakeInfluxDB()
+        self.fake.start()
+        self.conn = http.client.HTTPConnection("127.0.0.1", self.fake.port)
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.fake.stop()
+
+    def _request(self, method: str, path: str, body: str = "") -> tuple:
+        self.conn.request(method, path, body=body)
+        response = self.conn.getresponse()
+        payload = response.read()
+        return response.status, json.loads(payload) if payload else None
+
+    def test_retention_policies(self) -> None:
+        """Test retention policies are created, altered and listed like InfluxDB does."""
+        q = (
+            'CREATE DATABASE "metrics"; '
+            'CREATE RETENTION POLICY "default" ON "metrics" DURATION 7d REPLICATION 1 DEFAULT; '
+            'ALTER RETENTION POLICY "default" ON "metrics" SHARD DURATION 2h; '
+            'SHOW RETENTION POLICIES ON "metrics"'
+        )
+        status, body = self._request("GET", "/query?" + urlencode({"q": q}))
+
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            body["results"][3]["series"][0]["values"],
+            [
+                ["autogen", "0h0m0s", "168h0m0s", 1, False],
+                ["default", "168h0m0s", "2h0m0s", 1, True],
+            ],
+        )
+
+    def test_continuous_queries(self) -> None:
+        """Test continuous queries are created, listed and dropped with their database."""
+        self.fake.query(
+            'CREATE DATABASE "metrics"; '
+            'CREATE CONTINUOUS QUERY "cpu_1h" ON "metrics" BEGIN '
+            'SELECT max(*) INTO "cpu_1h" FROM "cpu" GROUP BY time(1h) END'
+        )
+        result = self.fake.query("SHOW CONTINUOUS QUERIES")
+        self.assertEqual(
+            result["results"][0]["series"][0]["values"][0][0],
+            "cpu_1h",
+        )
+
+        result = self.fake.query('CREATE CONTINUOUS QUERY "cpu_1h" ON "logs" BEGIN SELECT 1 END')
+        self.assertEqual(result["results"][0]["error"], "database not found")
+
+        self.fake.query('DROP DATABASE "metrics"')
+        self.assertEqual(self.fake.continuous_queries, {})
+
+    def test_write(self) -> None:
+        """Test points are counted per database, default retention policy and measurement."""
+        self.fake.query('CREATE DATABASE "metrics"')
+
+        status, _ = self._request("POST", "/write?db=metrics", "cpu,host=a value=1\ncpu value=2")
+        self.assertEqual(status, 204)
+        self.assertEqual(self.fake.points, {("metrics", "autogen", "cpu"): 2})
+
+        status, body = self._request("POST", "/write?db=logs", "cpu value=1")
+        self.assertEqual(status, 404)
+        self.assertEqual(body["error"], 'database not found: "logs"')
+
+    def test_cardinality(self) -> None:
+        """Test series and tag values written are counted by the cardinality statements."""
+        self.fake.query('CREATE DATABASE "metrics"')
+        self.fake.write(
+            "metrics",
+            None,
+            "cpu,host=a value=1\ncpu,host=b value=1\ncpu,host=a value=2\nmem value=1",
+        )
+
+        result = self.fake.query(
+            'SHOW SERIES CARDINALITY ON "metrics"; '
+            'SHOW TAG VALUES CARDINALITY ON "metrics" WITH KEY =~ /.*/; '
+            'SHOW SERIES CARDINALITY ON "logs"'
+        )["results"]
+        self.assertEqual(result[0]["series"][0]["values"], [[3]])
+        self.assertEqual(
+            result[1]["series"], [{"name": "cpu", "columns": ["count"], "values": [[2]]}]
+        )
+        self.assertEqual(result[2]["error"], "database not found")
+
+    def test_failure_injection(self) -> None:
+        """Test injected request and statement failures."""
+        self.fake.fail_pattern = re.compile("GRANT")
+        result = self.fake.query('CREATE DATABASE "metrics"; GRANT READ ON "metrics" TO "bob"')
+        self.assertEqual(len(result["results"]), 2)
+        self.assertIn("injected failure", result["results"][1]["error"])
+
+        # Statements after the failing one are reported as not executed.
+        result = self.fake.query(
+            'GRANT READ ON "metrics" TO "bob"; CREATE DATABASE "logs"; SHOW DATABASES'
+        )
+        self.assertEqual(
+            [r.get("error") for r in result["results"][1:]], ["not executed", "not executed"]
+        )
+        self.assertNotIn("logs", self.fake.databases)
+
+        self.fake.error_rate = 1.0
+        status, _ = self._request("GET", "/query?q=SHOW+DATABASES")
+        self.assertEqual(status, 500)
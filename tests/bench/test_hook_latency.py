@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""End-to-end hook latency benchmarks for the InfluxDB operator.
+
+Every event and action handler is dispatched through `scenario.Context`
+against the in-process fake InfluxDB server. The number of HTTP requests of
+each hook is compared with `baseline.json`, so any extra request fails the
+suite. Wall time depends on the machine, so the median is only checked
+against `BENCH_TIMING_TOLERANCE` (default 3) times its baseline, which
+catches order-of-magnitude regressions; 0 only reports it. Set
+`BENCH_OUTPUT_DIR` to also write the measurements to `hook_latency.json` in
+that directory.
+"""
+
+import json
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from fake_influxdb import FakeInfluxDB
+from scenario import Context, Relation, Secret, State, StoredState
+
+from charm import InfluxDBOperator
+from influxdb_ops import InfluxQLBatch, create_backup
+
+REPEATS = 5
+TIMING_TOLERANCE = float(os.environ.get("BENCH_TIMING_TOLERANCE", "3"))
+BASELINE = json.loads((Path(__file__).parent / "baseline.json").read_text())
+ADMIN_SECRET = Secret({"password": "admin-password"}, label="influxdb-admin-password", owner="app")
+ALICE_SECRET = Secret(
+    {"username": "alice", "password": "alice"}, label="influxdb-user-alice", owner="app"
+)
+INSTALLED = StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+
+ACTIONS = {
+    "get-admin-password": {},
+    "get-user-password": {"username": "alice"},
+    "update-user-password": {"username": "alice", "password": "new-password"},
+    "create-user": {"username": "bob"},
+    "drop-user": {"username": "alice"},
+    "list-users": {},
+    "create-database": {"database": "logs"},
+    "drop-database": {"database": "metrics"},
+    "list-databases": {},
+    "grant-privilege": {"username": "alice", "database": "metrics", "permission": "write"},
+    "revoke-privilege": {"username": "alice", "database": "metrics", "permission": "read"},
+    "list-privileges": {"username": "alice"},
+    "list-privileges-all": {},
+    "alter-retention-policy": {"database": "metrics", "name": "autogen", "shard-duration": "7d"},
+    "create-continuous-query": {
+        "database": "metrics",
+        "name": "cpu_1h",
+        "query": 'SELECT max(*) INTO "cpu_1h" FROM "cpu" GROUP BY time(1h)',
+    },
+    "list-continuous-queries": {},
+    "drop-continuous-query": {"database": "metrics", "name": "cpu_1h"},
+    "create-rollup": {"database": "metrics", "interval": "5m", "duration": "90d"},
+    "drop-rollup": {"database": "metrics", "interval": "1h"},
+    "provision": {
+        "spec": "users: [bob]\ndatabases: [logs]\ngrants: [{username: bob, database: logs}]"
+    },
+    "build-tsi-index": {},
+    "restart": {},
+    "show-tier-usage": {},
+}
+
+
+def _run(cmd: List[str], **_: Any) -> Mock:
+    """Stand in for subprocess.run, writing a backup file for `influxd backup`."""
+    if cmd[:2] == ["influxd", "backup"]:
+        Path(cmd[-1]).mkdir(parents=True, exist_ok=True)
+        (Path(cmd[-1]) / "20250101T000000Z.manifest").write_text("{}")
+    return Mock(returncode=0, stdout="", stderr="")
+
+
+class TestHookLatency(TestCase):
+    """Benchmark hook wall time and HTTP calls against the fake InfluxDB server."""
+
+    results: Dict[str, dict] = {}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Start the fake server and point the charm at it."""
+        cls.fake = FakeInfluxDB()
+        cls.fake.start()
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.patches = [
+            patch("influxdb_ops.INFLUXDB_PORT", str(cls.fake.port)),
+            patch("influxdb_probe.INFLUXDB_PORT", str(cls.fake.port)),
+            patch("influxdb_async.INFLUXDB_PORT", str(cls.fake.port)),
+            patch("influxdb_ops.INFLUXDB_CONFIG_PATH", Path(cls.tmp.name) / "influxdb.conf"),
+            patch("influxdb_ops.INFLUXDB_EXPORTER_SCRIPT", Path(cls.tmp.name) / "exporter"),
+            patch(
+                "influxdb_ops.INFLUXDB_EXPORTER_UNIT_PATH", Path(cls.tmp.name) / "exporter.service"
+            ),
+            patch("influxdb_ops.subprocess.run", Mock(side_effect=_run)),
+            patch("charms.operator_libs_linux.v0.apt.update"),
+            patch("charms.operator_libs_linux.v0.apt.add_package"),
+        ]
+        for p in cls.patches:
+            p.start()
+
+        # An archive to restore, and an incremental backup whose index is exported.
+        backups = Path(cls.tmp.name) / "backups"
+        archive = create_backup(["metrics"], str(backups))["archive"]
+        create_backup(["metrics"], str(backups), incremental=True, data_dir=cls.tmp.name)
+        cls.backup_actions = {
+            "create-backup": {"path": str(backups)},
+            "restore-backup": {"archive": archive, "suffix": "_restored"},
+            "export-backup-index": {
+                "backup-dir": str(backups),
+                "path": str(Path(cls.tmp.name) / "index.json"),
+            },
+        }
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Stop the fake server and write the measurements."""
+        for p in cls.patches:
+            p.stop()
+        cls.fake.stop()
+        cls.tmp.cleanup()
+        if output_dir := os.environ.get("BENCH_OUTPUT_DIR"):
+            path = Path(output_dir) / "hook_latency.json"
+            path.write_text(json.dumps(list(cls.results.values()), indent=2))
+
+    def _seed(self, empty: bool) -> None:
+        """Reset the fake server to a user `alice` with read access to `metrics`."""
+        self.fake.reset()
+        if empty:
+            return
+        self.fake.query(
+            "CREATE USER \"admin\" WITH PASSWORD 'admin-password' WITH ALL PRIVILEGES; "
+            "CREATE USER \"alice\" WITH PASSWORD 'alice'; "
+            'CREATE DATABASE "metrics"; '
+            'GRANT READ ON "metrics" TO "alice"; '
+            'CREATE CONTINUOUS QUERY "cpu_1h" ON "metrics" '
+            'BEGIN SELECT max(*) INTO "cpu_1h" FROM "cpu" GROUP BY time(1h) END; '
+            + InfluxQLBatch().create_rollup("metrics", "1h", "365d").query
+        )
+
+    def _bench(
+        self,
+        name: str,
+        event: Callable[[Context, State], object],
+        state: State,
+        empty: bool = False,
+    ) -> None:
+        """Run a hook `REPEATS` times and check it against its baseline."""
+        seconds = []
+        for _ in range(REPEATS):
+            self._seed(empty)
+            ctx = Context(InfluxDBOperator)
+            self.fake.requests = 0
+            start = time.perf_counter()
+            ctx.run(event(ctx, state), state)
+            seconds.append(time.perf_counter() - start)
+
+        record = {
+            "hook": name,
+            "median_seconds": round(statistics.median(seconds), 6),
+            "max_seconds": round(max(seconds), 6),
+            "http_requests": self.fake.requests,
+        }
+        self.results[name] = record
+        print(json.dumps(record))
+
+        if name not in BASELINE:
+            self.fail(f"No baseline for {name} in baseline.json.")
+        self.assertLessEqual(record["http_requests"], BASELINE[name]["http_requests"], name)
+        if TIMING_TOLERANCE:
+            self.assertLessEqual(
+                record["median_seconds"], BASELINE[name]["seconds"] * TIMING_TOLERANCE, name
+            )
+
+    def test_lifecycle_hooks(self) -> None:
+        """Benchmark install, start, config-changed and update-status."""
+        installed = State(secrets=[ADMIN_SECRET], stored_states=[INSTALLED])
+        hooks = {
+            "install": (lambda ctx, _: ctx.on.install(), State(), True),
+            "start": (lambda ctx, _: ctx.on.start(), installed, False),
+            "config-changed": (lambda ctx, _: ctx.on.config_changed(), installed, False),
+            "update-status": (lambda ctx, _: ctx.on.update_status(), installed, False),
+        }
+        for name, (event, state, empty) in hooks.items():
+            with self.subTest(name):
+                self._bench(name, event, state, empty)
+
+    def test_relation_joined(self) -> None:
+        """Benchmark provisioning 1, 10 and 100 relations joining at once."""
+        for count in (1, 10, 100):
+            relations = [Relation("influxdb", remote_app_name=f"app-{i}") for i in range(count)]
+            state = State(
+                leader=True,
+                relations=relations,
+                secrets=[ADMIN_SECRET],
+                stored_states=[INSTALLED],
+            )
+            with self.subTest(count):
+                self._bench(
+                    f"relation-joined-{count}",
+                    lambda ctx, state: ctx.on.relation_joined(relations[0]),
+                    state,
+                )
+
+    def test_actions(self) -> None:
+        """Benchmark every action."""
+        for name, params in {**ACTIONS, **self.backup_actions}.items():
+            state = State(
+                leader=True,
+                config={"index-version": "tsi1"},
+                secrets=[ADMIN_SECRET, ALICE_SECRET],
+                stored_states=[INSTALLED],
+            )
+            with self.subTest(name):
+                self._bench(
+                    f"action-{name}",
+                    lambda ctx, _: ctx.on.action(name, params=params),
+                    state,
+                )
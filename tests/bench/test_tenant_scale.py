@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tenant scale benchmarks for the InfluxDB operator control plane.
+
+`InfluxDBOps` and the influxdb relation handler provision thousands of
+tenants against the fake InfluxDB server with per-request latency, and with
+injected failures. Request counts are checked against `baseline.json`, and
+wall times against `BENCH_TIMING_TOLERANCE` (default 3) times their baseline,
+or only reported if it is 0. Set `BENCH_OUTPUT_DIR` to also write them to
+`tenant_scale.json`.
+"""
+
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from fake_influxdb import FakeInfluxDB
+from scenario import Context, Relation, Secret, State, StoredState
+
+from charm import InfluxDBOperator
+from influxdb_async import AsyncInfluxDBOps
+from influxdb_ops import InfluxDBOps, InfluxDBOpsError
+
+BASELINE = json.loads((Path(__file__).parent / "baseline.json").read_text())
+TIMING_TOLERANCE = float(os.environ.get("BENCH_TIMING_TOLERANCE", "3"))
+TENANTS = 2000
+RELATIONS = 500
+LATENCY = 0.002
+
+
+class TestTenantScale(TestCase):
+    """Benchmark provisioning at thousands of tenants against the fake server."""
+
+    results: Dict[str, dict] = {}
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """Start a fake server with per-request latency and point the charm at it."""
+        cls.fake = FakeInfluxDB(latency=LATENCY, seed=0)
+        cls.fake.start()
+        cls.patches = [
+            patch("influxdb_ops.INFLUXDB_PORT", str(cls.fake.port)),
+            patch("influxdb_async.INFLUXDB_PORT", str(cls.fake.port)),
+        ]
+        for p in cls.patches:
+            p.start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        """Stop the fake server and write the measurements."""
+        for p in cls.patches:
+            p.stop()
+        cls.fake.stop()
+        if output_dir := os.environ.get("BENCH_OUTPUT_DIR"):
+            path = Path(output_dir) / "tenant_scale.json"
+            path.write_text(json.dumps(list(cls.results.values()), indent=2))
+
+    def setUp(self) -> None:
+        """Start every benchmark from an empty server without injected failures."""
+        self.fake.reset()
+        self.fake.error_rate = 0.0
+
+    def _record(self, name: str, seconds: float) -> None:
+        record = {
+            "benchmark": name,
+            "seconds": round(seconds, 6),
+            "http_requests": self.fake.requests,
+        }
+        self.results[name] = record
+        print(json.dumps(record))
+
+        if name not in BASELINE:
+            self.fail(f"No baseline for {name} in baseline.json.")
+        self.assertLessEqual(record["http_requests"], BASELINE[name]["http_requests"], name)
+        if TIMING_TOLERANCE:
+            self.assertLessEqual(
+                record["seconds"], BASELINE[name]["seconds"] * TIMING_TOLERANCE, name
+            )
+
+    def test_create_users_and_databases(self) -> None:
+        """Benchmark provisioning thousands of tenants with `InfluxDBOps`."""
+        ops = InfluxDBOps(Mock(influxdb_admin_password="admin-password"))
+        databases = [f"tenant-{i}" for i in range(TENANTS)]
+
+        start = time.perf_counter()
+        results = ops.create_users_and_databases(databases)
+        seconds = time.perf_counter() - start
+        ops.close()
+
+        self.assertFalse([r for r in results.values() if isinstance(r, InfluxDBOpsError)])
+        self.assertEqual(len(self.fake.databases), TENANTS)
+        self._record(f"create-users-and-databases-{TENANTS}", seconds)
+
+    def test_create_users_and_databases_with_failures(self) -> None:
+        """Test injected failures are reported per tenant without failing the rest."""
+        self.fake.error_rate = 0.2
+        ops = InfluxDBOps(Mock(influxdb_admin_password="admin-password"))
+        databases = [f"tenant-{i}" for i in range(TENANTS)]
+
+        start = time.perf_counter()
+        results = ops.create_users_and_databases(databases)
+        seconds = time.perf_counter() - start
+        ops.close()
+
+        failed = {db for db, r in results.items() if isinstance(r, InfluxDBOpsError)}
+        self.assertTrue(failed)
+        self.assertEqual(set(self.fake.databases), set(databases) - failed)
+        self._record(f"create-users-and-databases-{TENANTS}-with-failures", seconds)
+
+    def test_privilege_matrix(self) -> None:
+        """Benchmark building the privilege matrix of thousands of users."""
+        self.fake.query(
+            "; ".join(
+                f'CREATE DATABASE "db-{i % 200}"; '
+                f"CREATE USER \"user-{i}\" WITH PASSWORD 'password'; "
+                f'GRANT READ ON "db-{i % 200}" TO "user-{i}"'
+                for i in range(TENANTS)
+            )
+        )
+        self.fake.requests = 0
+
+        async def _matrix() -> dict:
+            charm = Mock(influxdb_admin_password="admin-password")
+            async with AsyncInfluxDBOps(charm) as influxdb:
+                return await influxdb.privilege_matrix()
+
+        start = time.perf_counter()
+        matrix = asyncio.run(_matrix())
+        seconds = time.perf_counter() - start
+
+        self.assertEqual(len(matrix["matrix"]), TENANTS)
+        self.assertEqual(sum(row.count("1") for row in matrix["matrix"]), TENANTS)
+        self._record(f"privilege-matrix-{TENANTS}", seconds)
+
+    def test_sample_cardinality(self) -> None:
+        """Benchmark sampling the cardinality of thousands of databases."""
+        databases = [f"tenant-{i}" for i in range(TENANTS)]
+        self.fake.query("; ".join(f'CREATE DATABASE "{db}"' for db in databases))
+        for i, database in enumerate(databases):
+            self.fake.write(database, None, "\n".join(f"cpu,host={h} v=1" for h in range(i % 10)))
+        self.fake.requests = 0
+        ops = InfluxDBOps(Mock(influxdb_admin_password="admin-password"))
+
+        start = time.perf_counter()
+        results = ops.sample_cardinality(databases)
+        seconds = time.perf_counter() - start
+        ops.close()
+
+        self.assertEqual(results["tenant-9"], {"series": 9, "tag-values": 9})
+        self._record(f"sample-cardinality-{TENANTS}", seconds)
+
+    def test_relation_joined(self) -> None:
+        """Benchmark the relation handler provisioning hundreds of relations at once."""
+        relations = [Relation("influxdb", remote_app_name=f"app-{i}") for i in range(RELATIONS)]
+        state = State(
+            leader=True,
+            relations=relations,
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+        ctx = Context(InfluxDBOperator)
+
+        start = time.perf_counter()
+        out = ctx.run(ctx.on.relation_joined(relations[0]), state)
+        seconds = time.perf_counter() - start
+
+        published = [
+            r for r in out.relations if r.local_app_data.get("influx_client_creds_secret_id")
+        ]
+        self.assertEqual(len(published), RELATIONS)
+        self._record(f"relation-joined-{RELATIONS}", seconds)
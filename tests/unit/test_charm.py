@@ -15,14 +15,29 @@
 
 """Unit tests for the InfluxDB operator."""
 
+import dataclasses
+import json
+import time
 from unittest import TestCase
 from unittest.mock import Mock, PropertyMock, patch
 
 from charm import InfluxDBOperator
+from constants import PROVISION_BACKOFF_MAX_SECONDS, PROVISION_MAX_ATTEMPTS
 from influxdb_ops import InfluxDBOpsError
 
 from ops.model import ActiveStatus, BlockedStatus
-from scenario import Context, State
+from influxdb.resultset import ResultSet
+from scenario import (
+    ActionFailed,
+    Context,
+    Relation,
+    Secret,
+    State,
+    Storage,
+    StoredState,
+    TCPPort,
+    UDPPort,
+)
 
 
 class TestCharm(TestCase):
@@ -32,15 +47,18 @@ class TestCharm(TestCase):
         """Set up unit test."""
         self.ctx = Context(InfluxDBOperator)
 
-    @patch("influxdb_ops.apt.update")
-    @patch("influxdb_ops.apt.add_package")
+    @patch("charms.operator_libs_linux.v0.apt.update")
+    @patch("charms.operator_libs_linux.v0.apt.add_package")
+    @patch("charm.create_influxdb_admin_user", Mock(return_value="admin-password"))
+    @patch("charm.configure_exporter_service", Mock())
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
     @patch("ops.framework.EventBase.defer")
-    def test_install_success(self, defer, *_) -> None:
+    def test_install_success(self, defer, write_config, *_) -> None:
         """Test install success behavior."""
+        write_config.side_effect = lambda settings, _: (settings, True)
         with self.ctx(self.ctx.on.install(), State()) as manager:
-            manager.charm.influxdb_ops.install = Mock()
-            manager.charm.influxdb_ops.write_influxdb_configuration_and_restart_service = Mock()
-            manager.charm.influxdb_ops.version = Mock(return_value="24.05.2-1")
             manager.run()
             self.assertEqual(
                 manager.charm.unit.status,
@@ -49,14 +67,13 @@ class TestCharm(TestCase):
             self.assertTrue(manager.charm._stored.influxdb_installed)
 
         defer.assert_not_called()
+        write_config.assert_called_once_with(manager.charm.influxdb_settings, {})
 
+    @patch("charm.influxdb_install", Mock(side_effect=InfluxDBOpsError("Failed to install.")))
     @patch("ops.framework.EventBase.defer")
     def test_install_fail(self, defer, *_) -> None:
         """Test install failure behavior."""
         with self.ctx(self.ctx.on.install(), State()) as manager:
-            manager.charm.influxdb_ops.install = Mock(
-                side_effect=InfluxDBOpsError("Failed to install InfluxDB.")
-            )
             manager.run()
             self.assertEqual(
                 manager.charm.unit.status,
@@ -64,3 +81,652 @@ class TestCharm(TestCase):
             )
             self.assertFalse(manager.charm._stored.influxdb_installed)
         defer.assert_called()
+
+    def test_admin_password_memoized(self) -> None:
+        """Test the admin password secret is read once per hook."""
+        secret = Secret({"password": "admin-password"}, label="influxdb-admin-password")
+        with self.ctx(self.ctx.on.update_status(), State(secrets=[secret])) as manager:
+            charm = manager.charm
+            with patch.object(charm.model, "get_secret", wraps=charm.model.get_secret) as get:
+                self.assertEqual(charm.influxdb_admin_password, "admin-password")
+                self.assertEqual(charm.influxdb_admin_password, "admin-password")
+                get.assert_called_once()
+
+    @patch("influxdb.InfluxDBClient")
+    def test_relation_joined_drains_queue(self, client_cls) -> None:
+        """Test one relation-joined provisions every relation lacking credentials."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(4)
+        ]
+        relations = [Relation("influxdb", remote_app_name=f"client-{i}") for i in range(3)]
+        state = State(
+            leader=True,
+            relations=relations,
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.relation_joined(relations[0]), state)
+
+        self.assertEqual(client_cls.return_value.query.call_count, 3)
+        for relation in relations:
+            secret_id = out.get_relation(relation.id).local_app_data
+            self.assertIn("influx_client_creds_secret_id", secret_id)
+        queue = out.get_stored_state("_stored", owner_path="InfluxDBOperator/InfluxDB[influxdb]")
+        self.assertEqual(queue.content["pending"], {})
+
+    @patch("influxdb.InfluxDBClient")
+    @patch("ops.framework.EventBase.defer")
+    def test_relation_joined_failure_backs_off(self, defer, client_cls) -> None:
+        """Test a failed provisioning is queued for retry instead of deferred."""
+        client_cls.return_value.query.side_effect = ConnectionError()
+        relation = Relation("influxdb", remote_app_name="client")
+        state = State(
+            leader=True,
+            relations=[relation],
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.relation_joined(relation), state)
+
+        defer.assert_not_called()
+        queue = out.get_stored_state("_stored", owner_path="InfluxDBOperator/InfluxDB[influxdb]")
+        item = queue.content["pending"][str(relation.id)]
+        self.assertEqual(item["attempts"], 1)
+        self.assertGreater(item["retry_at"], 0)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_update_status_provisions_unqueued_relations(self, client_cls) -> None:
+        """Test relations never queued on this unit, as after a leader change, are provisioned."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(4)
+        ]
+        relation = Relation("influxdb", remote_app_name="client")
+        state = State(
+            leader=True,
+            relations=[relation],
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.update_status(), state)
+
+        self.assertIn(
+            "influx_client_creds_secret_id", out.get_relation(relation.id).local_app_data
+        )
+
+    @patch("charm.influxdb_version", Mock(return_value="1.8.10"))
+    @patch("influxdb.InfluxDBClient")
+    def test_provisioning_out_of_attempts_starts_over(self, client_cls) -> None:
+        """Test a relation out of attempts blocks the unit, retried after the maximum backoff."""
+        client_cls.return_value.query.side_effect = ConnectionError()
+        relation = Relation("influxdb", remote_app_name="client")
+        pending = {"database": "db", "attempts": PROVISION_MAX_ATTEMPTS - 1, "retry_at": 0.0}
+        state = State(
+            leader=True,
+            relations=[relation],
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True}),
+                StoredState(
+                    owner_path="InfluxDBOperator/InfluxDB[influxdb]",
+                    content={"pending": {str(relation.id): pending}},
+                ),
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.update_status(), state)
+
+        queue = out.get_stored_state("_stored", owner_path="InfluxDBOperator/InfluxDB[influxdb]")
+        item = queue.content["pending"][str(relation.id)]
+        self.assertEqual((item["database"], item["attempts"], item["exhausted"]), ("db", 0, True))
+        self.assertGreater(item["retry_at"], time.time() + PROVISION_BACKOFF_MAX_SECONDS - 60)
+        self.assertIsInstance(out.unit_status, BlockedStatus)
+        self.assertTrue(out.unit_status.message.startswith("Provisioning failed for: client;"))
+
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    def test_config_changed_invalid(self, write_config) -> None:
+        """Test invalid tuning options block the unit."""
+        write_config.side_effect = InfluxDBOpsError("Invalid wal-fsync-delay.")
+        state = State(
+            config={"wal-fsync-delay": "soon"},
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.config_changed(), state)
+
+        self.assertEqual(write_config.call_args.args[0]["wal-fsync-delay"], "soon")
+        self.assertEqual(out.unit_status, BlockedStatus("Invalid wal-fsync-delay."))
+
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.wait_until_ready")
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
+    @patch("charm.configure_exporter_service", Mock())
+    def test_config_changed_waits_only_after_restart(self, wait, write_config) -> None:
+        """Test the charm only waits for influxdb to open its shards after restarting it."""
+        write_config.return_value = ({}, False)
+        state = State(
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        self.ctx.run(self.ctx.on.config_changed(), state)
+        wait.assert_not_called()
+
+        write_config.return_value = ({}, True)
+        self.ctx.run(self.ctx.on.config_changed(), state)
+        wait.assert_called_once()
+
+    @patch(
+        "charm.write_influxdb_configuration_and_restart_service", Mock(return_value=({}, False))
+    )
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
+    @patch("charm.configure_exporter_service")
+    def test_config_changed_exporter_port(self, configure_exporter) -> None:
+        """Test the exporter is reconfigured and only its current port is opened."""
+        state = State(
+            config={"exporter-port": 9200},
+            opened_ports=[TCPPort(8086), TCPPort(9122)],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.config_changed(), state)
+
+        configure_exporter.assert_called_once_with(9200)
+        self.assertEqual(out.opened_ports, frozenset({TCPPort(8086), TCPPort(9200)}))
+
+        state = dataclasses.replace(state, config={"exporter-port": 0})
+        out = self.ctx.run(self.ctx.on.config_changed(), state)
+        self.assertEqual(out.opened_ports, frozenset({TCPPort(8086)}))
+
+    @patch(
+        "charm.write_influxdb_configuration_and_restart_service", Mock(return_value=({}, False))
+    )
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
+    @patch("charm.configure_exporter_service", Mock())
+    def test_config_changed_ingest_listeners(self) -> None:
+        """Test listener ports are opened and advertised on provisioned relations."""
+        secret = Secret({"database": "db-1"}, owner="app")
+        relation = Relation(
+            "influxdb", local_app_data={"influx_client_creds_secret_id": secret.id}
+        )
+        listeners = "udp: [{bind-address: ':8089'}, {bind-address: ':8090'}]\nopentsdb: [{}]"
+        state = State(
+            leader=True,
+            config={"ingest-listeners": listeners},
+            relations=[relation],
+            secrets=[secret],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.config_changed(), state)
+
+        self.assertEqual(
+            out.opened_ports,
+            frozenset({TCPPort(8086), TCPPort(9122), UDPPort(8089), UDPPort(8090), TCPPort(4242)}),
+        )
+        endpoints = json.loads(
+            out.get_relation(relation.id).local_app_data["influxdb_ingest_endpoints"]
+        )
+        self.assertEqual(len(endpoints), 3)
+        self.assertIn(
+            {
+                "protocol": "udp",
+                "transport": "udp",
+                "host": "192.0.2.0",
+                "port": 8090,
+                "database": "udp",
+            },
+            endpoints,
+        )
+
+        out = self.ctx.run(
+            self.ctx.on.config_changed(), dataclasses.replace(out, config={"ingest-listeners": ""})
+        )
+        self.assertNotIn("influxdb_ingest_endpoints", out.get_relation(relation.id).local_app_data)
+        self.assertEqual(out.opened_ports, frozenset({TCPPort(8086), TCPPort(9122)}))
+
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
+    @patch("influxdb_ops.InfluxDBOps.sample_cardinality")
+    def test_update_status_cardinality_guard(self, sample, write_config) -> None:
+        """Test a database over its series threshold lowers the instance-wide series limit."""
+        sample.return_value = {"tenant": {"series": 80, "tag-values": 3}}
+        write_config.side_effect = lambda settings, _: (settings, True)
+        relation = Relation(
+            "influxdb",
+            remote_app_data={"series-threshold": "50"},
+            local_app_data={"influx_client_creds_secret_id": "secret:tenant"},
+        )
+        state = State(
+            leader=True,
+            config={"series-threshold": 100},
+            relations=[relation],
+            stored_states=[
+                StoredState(
+                    owner_path="InfluxDBOperator",
+                    content={
+                        "influxdb_installed": True,
+                        "applied_settings": {"max-series-per-database": 1000000},
+                    },
+                ),
+                StoredState(
+                    owner_path="InfluxDBOperator/InfluxDB[influxdb]",
+                    content={"provisioned": {str(relation.id): "tenant"}},
+                ),
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.update_status(), state)
+
+        sample.assert_called_once_with(["tenant"])
+        self.assertEqual(write_config.call_args.args[0]["max-series-per-database"], 50)
+        self.assertEqual(
+            out.get_relation(relation.id).local_app_data["influxdb_cardinality"],
+            '{"over-threshold": true, "series": 80, "tag-values": 3, "threshold": 50}',
+        )
+        self.assertEqual(out.unit_status, ActiveStatus("Series threshold exceeded by: tenant"))
+
+        # The cached sample is reused until it is stale.
+        stored = out.get_stored_state("_stored", owner_path="InfluxDBOperator/InfluxDB[influxdb]")
+        installed = out.get_stored_state("_stored", owner_path="InfluxDBOperator")
+        state = dataclasses.replace(state, stored_states=[stored, installed])
+        self.ctx.run(self.ctx.on.update_status(), state)
+        sample.assert_called_once()
+
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.influxdb_version", Mock(return_value="1.6.7~rc0"))
+    @patch("influxdb_ops.InfluxDBOps.sample_cardinality")
+    def test_update_status_cardinality_guard_mixed_thresholds(self, sample, write_config) -> None:
+        """Test the series limit never caps the databases under or without a threshold.
+
+        Only the offending database is flagged, in the unit status and in its
+        relation data.
+        """
+        sample.return_value = {
+            "over": {"series": 80, "tag-values": 3},
+            "under": {"series": 80, "tag-values": 3},
+            "unguarded": {"series": 90000, "tag-values": 3},
+        }
+        write_config.side_effect = lambda settings, _: (settings, True)
+        relations = [
+            Relation(
+                "influxdb",
+                remote_app_data={"series-threshold": threshold},
+                local_app_data={"influx_client_creds_secret_id": f"secret:{database}"},
+            )
+            for database, threshold in (("over", "50"), ("under", "5000"), ("unguarded", "0"))
+        ]
+        state = State(
+            leader=True,
+            relations=relations,
+            stored_states=[
+                StoredState(
+                    owner_path="InfluxDBOperator",
+                    content={
+                        "influxdb_installed": True,
+                        "applied_settings": {"max-series-per-database": 1000000},
+                    },
+                ),
+                StoredState(
+                    owner_path="InfluxDBOperator/InfluxDB[influxdb]",
+                    content={
+                        "provisioned": {
+                            str(relation.id): database
+                            for relation, database in zip(relations, sample.return_value)
+                        }
+                    },
+                ),
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.update_status(), state)
+
+        self.assertEqual(write_config.call_args.args[0]["max-series-per-database"], 90000)
+        self.assertEqual(out.unit_status, ActiveStatus("Series threshold exceeded by: over"))
+        self.assertEqual(
+            [
+                json.loads(out.get_relation(relation.id).local_app_data["influxdb_cardinality"])[
+                    "over-threshold"
+                ]
+                for relation in relations
+            ],
+            [True, False, False],
+        )
+
+    @patch("charm.influxdb_version", Mock(return_value="1.8.10"))
+    @patch("charm.storage_usage")
+    @patch("influxdb_probe.InfluxDBProbe.debug_vars")
+    def test_update_status_health_snapshot(self, debug_vars, usage) -> None:
+        """Test diagnostics are only fetched when a health threshold is first crossed."""
+        debug_vars.return_value = {
+            "runtime": {"name": "runtime", "values": {"HeapAlloc": 4096, "NumGoroutine": 12}}
+        }
+        installed = StoredState(
+            owner_path="InfluxDBOperator", content={"influxdb_installed": True}
+        )
+
+        usage.return_value = {"disk-used-percent": 40, "wal-bytes": 1024}
+        out = self.ctx.run(self.ctx.on.update_status(), State(stored_states=[installed]))
+        health = out.get_stored_state("_stored", owner_path="InfluxDBOperator").content["health"]
+        self.assertEqual(health["version"], "1.8.10")
+        self.assertEqual(len(health["latencies"]), 1)
+        self.assertEqual(health["degraded"], [])
+        debug_vars.assert_not_called()
+
+        usage.return_value = {"disk-used-percent": 95, "wal-bytes": 1024}
+        for _ in range(2):
+            out = self.ctx.run(self.ctx.on.update_status(), out)
+        health = out.get_stored_state("_stored", owner_path="InfluxDBOperator").content["health"]
+        self.assertEqual(len(health["latencies"]), 3)
+        self.assertEqual(health["degraded"], ["disk"])
+        self.assertEqual(health["diagnostics"]["heap-bytes"], 4096)
+        self.assertTrue(out.unit_status.message.startswith("Degraded: disk 95% used;"))
+        debug_vars.assert_called_once()
+
+    @patch("charm.influxdb_version", Mock(return_value="1.8.10"))
+    @patch("charm.move_shards_to_cold_storage")
+    @patch("charm.cold_shards")
+    def test_update_status_tiers_shards(self, cold_shards, move) -> None:
+        """Test old shards are moved to cold storage at most once per tiering interval."""
+        cold_shards.return_value = [("metrics", "autogen", "1")]
+        move.return_value = {"moved": ["metrics/autogen/1"], "downtime-seconds": 0.2}
+        state = State(
+            config={"cold-storage-path": "/srv/cold", "cold-shard-age": "14d"},
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.update_status(), state)
+        out = self.ctx.run(self.ctx.on.update_status(), out)
+
+        cold_shards.assert_called_once_with(
+            "14d", "/srv/cold", "/var/lib/influxdb/data", "/var/lib/influxdb/wal"
+        )
+        move.assert_called_once_with(
+            [("metrics", "autogen", "1")],
+            "/srv/cold",
+            "/var/lib/influxdb/data",
+            "/var/lib/influxdb/wal",
+        )
+        # The restart applied every setting deferred until a restart.
+        self.assertEqual(out.unit_status, ActiveStatus())
+
+        cold_shards.side_effect = InfluxDBOpsError("Invalid cold-shard-age: soon.")
+        out = self.ctx.run(
+            self.ctx.on.update_status(),
+            dataclasses.replace(state, config={"cold-storage-path": "/srv/cold"}),
+        )
+        self.assertEqual(out.unit_status, BlockedStatus("Invalid cold-shard-age: soon."))
+
+    @patch("charm.influxdb_version", Mock(return_value="1.8.10"))
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.restart_influxdb")
+    def test_restart_action_applies_pending_settings(self, restart, write_config) -> None:
+        """Test the restart action applies the settings deferred until a restart."""
+        write_config.side_effect = lambda settings, applied: (applied, False)
+        state = State(
+            config={"cache-max-memory-size": "2g"},
+            stored_states=[
+                StoredState(
+                    owner_path="InfluxDBOperator",
+                    content={
+                        "influxdb_installed": True,
+                        "applied_settings": {"cache-max-memory-size": "1g"},
+                    },
+                )
+            ],
+        )
+        with self.ctx(self.ctx.on.update_status(), state) as manager:
+            settings = manager.charm.influxdb_settings
+        state = dataclasses.replace(
+            state,
+            stored_states=[
+                StoredState(
+                    owner_path="InfluxDBOperator",
+                    content={
+                        "influxdb_installed": True,
+                        "applied_settings": {**settings, "cache-max-memory-size": "1g"},
+                    },
+                )
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.action("restart"), state)
+
+        restart.assert_called_once()
+        self.assertEqual(self.ctx.action_results, {"applied": "cache-max-memory-size"})
+        self.assertEqual(out.unit_status, ActiveStatus())
+
+        restart.side_effect = InfluxDBOpsError("Failed to restart influxdb.")
+        with self.assertRaises(ActionFailed) as ctx:
+            self.ctx.run(self.ctx.on.action("restart"), state)
+        self.assertEqual(ctx.exception.message, "Failed to restart influxdb.")
+
+    @patch("charm.influxdb_version", Mock(return_value="1.8.10"))
+    @patch("charm.wait_until_ready", Mock(return_value=True))
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    @patch("charm.remove_storage")
+    @patch("charm.migrate_storage")
+    def test_storage_attached_and_detaching(self, migrate, remove, write_config) -> None:
+        """Test the WAL moves onto attached storage and back before the storage detaches."""
+        migrate.return_value = {"bytes": 1024, "downtime-seconds": 0.1}
+        write_config.side_effect = lambda settings, applied: (settings, True)
+        storage = Storage("wal")
+        location = storage.get_filesystem(self.ctx)
+        state = State(
+            storages=[storage],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.storage_attached(storage), state)
+        migrate.assert_called_once_with("/var/lib/influxdb/wal", f"{location}/wal", False)
+        self.assertEqual(write_config.call_args.args[0]["wal-dir"], f"{location}/wal")
+        self.assertEqual(write_config.call_args.args[0]["dir"], "/var/lib/influxdb/data")
+        remove.assert_called_once_with("/var/lib/influxdb/wal")
+
+        out = self.ctx.run(self.ctx.on.storage_detaching(storage), out)
+        migrate.assert_called_with(f"{location}/wal", "/var/lib/influxdb/wal", False)
+        self.assertEqual(write_config.call_args.args[0]["wal-dir"], "/var/lib/influxdb/wal")
+
+        migrate.side_effect = InfluxDBOpsError("Not enough space in /srv/influxdb-wal/wal.")
+        out = self.ctx.run(self.ctx.on.storage_attached(storage), out)
+        self.assertEqual(
+            out.unit_status, BlockedStatus("Not enough space in /srv/influxdb-wal/wal.")
+        )
+        stored = out.get_stored_state("_stored", owner_path="InfluxDBOperator").content
+        self.assertEqual(stored["storage"], {})
+
+        # A failed move back keeps the WAL recorded on the detaching storage.
+        migrate.side_effect = None
+        out = self.ctx.run(self.ctx.on.storage_attached(storage), out)
+        migrate.side_effect = InfluxDBOpsError("Not enough space in /var/lib/influxdb/wal.")
+        out = self.ctx.run(self.ctx.on.storage_detaching(storage), out)
+        stored = out.get_stored_state("_stored", owner_path="InfluxDBOperator").content
+        self.assertEqual(stored["storage"], {"wal": str(location)})
+        self.assertEqual(write_config.call_args.args[0]["wal-dir"], f"{location}/wal")
+
+    @patch("charm.restart_influxdb")
+    @patch("charm.remove_storage")
+    @patch("charm.migrate_storage", Mock(return_value={"bytes": 1024, "downtime-seconds": 0.1}))
+    @patch("charm.write_influxdb_configuration_and_restart_service")
+    def test_storage_attached_write_failure(self, write_config, remove, restart) -> None:
+        """Test influxdb restarts on the kept source if influxdb.conf cannot be written."""
+        write_config.side_effect = InfluxDBOpsError("Failed to restart influxdb.")
+        storage = Storage("wal")
+        state = State(
+            storages=[storage],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.storage_attached(storage), state)
+
+        restart.assert_called_once_with()
+        remove.assert_not_called()
+        self.assertEqual(
+            out.unit_status,
+            BlockedStatus(
+                "Kept the influxdb wal directory in /var/lib/influxdb/wal: "
+                "Failed to restart influxdb."
+            ),
+        )
+        stored = out.get_stored_state("_stored", owner_path="InfluxDBOperator").content
+        self.assertEqual(stored["storage"], {})
+
+    @patch("influxdb.InfluxDBClient")
+    @patch("charm.create_backup")
+    def test_create_backup_action(self, create_backup, client_cls) -> None:
+        """Test every database but _internal is backed up, and failed databases fail the action."""
+        client_cls.return_value.get_list_database.return_value = [
+            {"name": "_internal"},
+            {"name": "metrics"},
+            {"name": "logs"},
+        ]
+        create_backup.return_value = {
+            "archive": "/var/lib/influxdb/backups/influxdb-backup.tar.zst",
+            "databases": 1,
+            "throughput": "120.0 MiB/s",
+            "failed": {"logs": "influxd backup failed"},
+        }
+        state = State(
+            leader=True,
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+        )
+
+        with self.assertRaises(ActionFailed) as ctx:
+            self.ctx.run(
+                self.ctx.on.action("create-backup", params={"compression": "zstd"}), state
+            )
+
+        self.assertEqual(create_backup.call_args.args[0], ["metrics", "logs"])
+        self.assertEqual(create_backup.call_args.kwargs["compression"], "zstd")
+        self.assertIn("Failed to back up 1 of 2 databases", ctx.exception.message)
+        self.assertEqual(self.ctx.action_results["throughput"], "120.0 MiB/s")
+
+    @patch("charm.create_backup")
+    def test_create_incremental_backup_action(self, create_backup) -> None:
+        """Test incremental backups report their shards and fail on failed shards."""
+        create_backup.return_value = {
+            "archive": "/var/lib/influxdb/backups/influxdb-backup.tar.gz",
+            "backup-id": "20250101T000000Z",
+            "shards": 3,
+            "skipped": 40,
+            "failed": {"metrics/autogen/7": "influxd backup failed"},
+        }
+
+        with self.assertRaises(ActionFailed) as ctx:
+            self.ctx.run(
+                self.ctx.on.action(
+                    "create-backup", params={"databases": "metrics", "incremental": True}
+                ),
+                State(),
+            )
+
+        self.assertTrue(create_backup.call_args.kwargs["incremental"])
+        self.assertIn("Failed to back up 1 shards", ctx.exception.message)
+        self.assertEqual(self.ctx.action_results["skipped"], "40")
+
+    @patch("charm.export_backup_index")
+    def test_export_backup_index_action(self, export_backup_index) -> None:
+        """Test the shard index is exported to the requested path."""
+        export_backup_index.return_value = {"path": "/tmp/index.json", "shards": 43}
+
+        self.ctx.run(
+            self.ctx.on.action("export-backup-index", params={"path": "/tmp/index.json"}),
+            State(),
+        )
+
+        export_backup_index.assert_called_once_with("/tmp/index.json", "/var/lib/influxdb/backups")
+        self.assertEqual(self.ctx.action_results, {"path": "/tmp/index.json", "shards": "43"})
+
+    @patch("influxdb_async.AsyncInfluxDBOps.drop_users")
+    def test_drop_users_fans_out(self, drop_users) -> None:
+        """Test dropping several users runs concurrently and fails on any error."""
+        drop_users.return_value = {"alice": None, "bob": InfluxDBOpsError("Error dropping user.")}
+        state = State(
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")]
+        )
+
+        with self.assertRaises(ActionFailed) as e:
+            self.ctx.run(self.ctx.on.action("drop-user", params={"username": "alice, bob"}), state)
+
+        drop_users.assert_awaited_once_with(["alice", "bob"])
+        self.assertIn('"bob": "Error dropping user."', e.exception.message)
+
+    @patch("influxdb_ops.InfluxDBOps.alter_retention_policy")
+    def test_relation_changed_alters_retention_policy(self, alter) -> None:
+        """Test a changed retention policy request alters the provisioned database."""
+        secret = Secret({"database": "db-1"}, owner="app")
+        relation = Relation(
+            "influxdb",
+            remote_app_data={"retention-duration": "30d", "shard-duration": "1d"},
+            local_app_data={
+                "influx_client_creds_secret_id": secret.id,
+                "influxdb_retention_policy": '{"duration": "7d", "replication": 1}',
+            },
+        )
+        state = State(
+            leader=True,
+            relations=[relation],
+            secrets=[secret],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.relation_changed(relation), state)
+
+        alter.assert_called_once_with("db-1", duration="30d", replication=1, shard_duration="1d")
+        self.assertEqual(
+            out.get_relation(relation.id).local_app_data["influxdb_retention_policy"],
+            '{"duration": "30d", "replication": 1, "shard_duration": "1d"}',
+        )
+
+    @patch("influxdb.InfluxDBClient")
+    def test_relation_joined_rollup_profile(self, client_cls) -> None:
+        """Test a requested rollup profile is provisioned along with the database."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(8)
+        ]
+        relation = Relation("influxdb", remote_app_data={"rollup-profile": "standard"})
+        state = State(
+            leader=True,
+            relations=[relation],
+            secrets=[Secret({"password": "admin-password"}, label="influxdb-admin-password")],
+            stored_states=[
+                StoredState(owner_path="InfluxDBOperator", content={"influxdb_installed": True})
+            ],
+        )
+
+        out = self.ctx.run(self.ctx.on.relation_joined(relation), state)
+
+        query = client_cls.return_value.query.call_args.args[0]
+        self.assertEqual(query.count("CREATE CONTINUOUS QUERY"), 2)
+        self.assertEqual(
+            out.get_relation(relation.id).local_app_data["influxdb_rollups"],
+            '{"5m": "rollup_5m", "1h": "rollup_1h"}',
+        )
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the asyncio InfluxDB admin operations."""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+from unittest.mock import Mock
+from urllib.parse import parse_qs
+
+from influxdb_async import AsyncInfluxDBOps
+from influxdb_ops import InfluxDBOpsError, InfluxQLStatementError
+
+USERS = ["alice", "bob", "carol", "dave", "erin", "frank"]
+
+
+def _result(statement: str) -> dict:
+    """Return the result of a statement; `dave` has been dropped and `bob` cannot be."""
+    if statement == "SHOW USERS":
+        values = [[user, user == "alice"] for user in USERS]
+        return {"series": [{"columns": ["user", "admin"], "values": values}]}
+    if statement == "SHOW DATABASES":
+        values = [["bob-db"], ["carol-db"]]
+        return {"series": [{"name": "databases", "columns": ["name"], "values": values}]}
+    if statement in ('SHOW GRANTS FOR "dave"', 'DROP USER "bob"'):
+        return {"error": "user not found"}
+    if match := re.match(r'SHOW GRANTS FOR "(\w+)"', statement):
+        values = [[f"{match.group(1)}-db", "READ"], ["carol-db", "WRITE"]]
+        return {"series": [{"columns": ["database", "privilege"], "values": values}]}
+    return {}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self) -> None:  # noqa: N802
+        length = int(self.headers["Content-Length"])
+        query = parse_qs(self.rfile.read(length).decode())["q"][0]
+        with self.server.lock:
+            self.server.requests += 1
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        time.sleep(0.05)
+        with self.server.lock:
+            self.server.active -= 1
+
+        # Like InfluxDB, report every statement after the first failing one as not executed.
+        results, failed = [], False
+        for statement_id, statement in enumerate(query.split("; ")):
+            if failed:
+                results.append({"statement_id": statement_id, "error": "not executed"})
+                continue
+            results.append({"statement_id": statement_id, **_result(statement)})
+            failed = "error" in results[-1]
+        body = json.dumps({"results": results}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class TestAsyncInfluxDBOps(TestCase):
+    """Unit test AsyncInfluxDBOps."""
+
+    def setUp(self) -> None:
+        """Start a local HTTP server standing in for influxdb."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.connections = self.server.requests = 0
+        self.server.active = self.server.peak = 0
+        self.server.lock = threading.Lock()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def _run(self, operation):
+        async def _main():
+            charm = Mock(influxdb_admin_password="admin-password")
+            async with AsyncInfluxDBOps(charm, port=self.server.server_address[1], limit=3) as ops:
+                return await operation(ops)
+
+        return asyncio.run(_main())
+
+    def test_list_all_privileges_fans_out(self) -> None:
+        """Test privileges of every user are listed concurrently within the connection limit."""
+        privileges = self._run(lambda ops: ops.list_all_privileges())
+
+        self.assertEqual(
+            privileges["bob"],
+            [
+                {"database": "bob-db", "privilege": "READ"},
+                {"database": "carol-db", "privilege": "WRITE"},
+            ],
+        )
+        self.assertIsInstance(privileges["dave"], InfluxQLStatementError)
+        self.assertEqual(self.server.peak, 3)
+        self.assertLessEqual(self.server.connections, 3)
+
+    def test_privilege_matrix(self) -> None:
+        """Test the matrix is built from batched grants, skipping users dropped meanwhile."""
+        matrix = self._run(lambda ops: ops.privilege_matrix(batch_size=3))
+
+        self.assertEqual(
+            matrix,
+            {
+                "users": ["alice", "bob", "carol", "erin", "frank"],
+                "databases": ["bob-db", "carol-db"],
+                "admins": ["alice"],
+                "matrix": ["02", "12", "02", "02", "02"],
+            },
+        )
+        # One request for users and databases, one per batch of three users, and one
+        # more to resend the rest of the batch stopped by the dropped user.
+        self.assertEqual(self.server.requests, 1 + 2 + 1)
+
+    def test_drop_users_reports_errors(self) -> None:
+        """Test a failed drop is reported per user without failing the rest."""
+        results = self._run(lambda ops: ops.drop_users(["alice", "bob"]))
+
+        self.assertIsNone(results["alice"])
+        self.assertIsInstance(results["bob"], InfluxQLStatementError)
+        self.assertEqual(results["bob"].error, "user not found")
+
+    def test_unreachable(self) -> None:
+        """Test an unreachable influxdb raises InfluxDBOpsError."""
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(InfluxDBOpsError):
+            self._run(lambda ops: ops.list_users())
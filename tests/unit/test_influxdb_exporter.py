@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the influxdb Prometheus exporter."""
+
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from influxdb_exporter import InfluxDBExporter, render, serve
+
+
+def _shard(name: str, shard_id: int, values: dict) -> dict:
+    return {
+        "name": name,
+        "tags": {"database": "metrics", "retentionPolicy": "autogen", "id": str(shard_id)},
+        "values": values,
+    }
+
+
+DEBUG_VARS = {
+    "system": {"PID": 1, "uptime": 3600},
+    "memstats": {"HeapAlloc": 1},
+    "httpd::8086": {
+        "name": "httpd",
+        "tags": {"bind": ":8086"},
+        "values": {"writeReq": 10, "queryReq": 4, "queryReqDurationNs": 2_000_000_000},
+    },
+    "write": {"name": "write", "tags": None, "values": {"pointReq": 500, "writeDrop": 3}},
+    "database:metrics": {
+        "name": "database",
+        "tags": {"database": "metrics"},
+        "values": {"numSeries": 1200, "numMeasurements": 7},
+    },
+    "tsm1_cache:1": _shard("tsm1_cache", 1, {"memBytes": 1024}),
+    "tsm1_cache:2": _shard("tsm1_cache", 2, {"memBytes": 2048}),
+    "tsm1_engine:1": _shard("tsm1_engine", 1, {"cacheCompactions": 5, "tsmFullCompactions": 1}),
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:  # noqa: N802
+        body = json.dumps(DEBUG_VARS).encode()
+        self.send_response(200 if self.path == "/debug/vars" else 404)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class TestInfluxDBExporter(TestCase):
+    """Unit test the influxdb exporter."""
+
+    def test_render(self) -> None:
+        """Test statistics are converted to Prometheus samples, summed over shards."""
+        lines = render(DEBUG_VARS).splitlines()
+
+        for sample in (
+            "influxdb_up 1",
+            "influxdb_uptime_seconds 3600",
+            "influxdb_write_requests_total 10",
+            "influxdb_points_written_total 500",
+            "influxdb_points_dropped_total 3",
+            'influxdb_series{database="metrics"} 1200',
+            'influxdb_cache_size_bytes{database="metrics",retention_policy="autogen"} 3072',
+            'influxdb_compactions_total{database="metrics",retention_policy="autogen",'
+            'level="cache"} 5',
+            'influxdb_compactions_total{database="metrics",retention_policy="autogen",'
+            'level="full"} 1',
+            "influxdb_query_request_duration_seconds_total 2",
+        ):
+            self.assertIn(sample, lines)
+        self.assertEqual(lines.count("# TYPE influxdb_compactions_total counter"), 1)
+
+    def test_render_unreachable(self) -> None:
+        """Test only `influxdb_up` and the poll duration are reported when polling fails."""
+        metrics = render(None, 0.5)
+
+        self.assertIn("influxdb_up 0", metrics.splitlines())
+        self.assertIn("influxdb_exporter_poll_duration_seconds 0.500000", metrics.splitlines())
+        self.assertNotIn("influxdb_series", metrics)
+
+    def test_serve(self) -> None:
+        """Test the polled metrics are served on `/metrics`."""
+        influxdb = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=influxdb.serve_forever, daemon=True).start()
+        self.addCleanup(influxdb.server_close)
+        self.addCleanup(influxdb.shutdown)
+
+        exporter = InfluxDBExporter("127.0.0.1", influxdb.server_address[1], interval=60)
+        self.assertEqual(exporter.poll(), DEBUG_VARS)
+        server = serve(exporter, "127.0.0.1", 0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1])
+        conn.request("GET", "/metrics")
+        response = conn.getresponse()
+        self.assertEqual(response.status, 200)
+        self.assertIn("influxdb_up 1", response.read().decode().splitlines())
+        conn.close()
@@ -0,0 +1,714 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the InfluxDB operations."""
+
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from influxdb.resultset import ResultSet
+
+from influxdb_ops import (
+    InfluxDBOps,
+    InfluxDBOpsError,
+    InfluxQLStatementError,
+    build_tsi_index,
+    cold_shards,
+    configure_exporter_service,
+    create_backup,
+    export_backup_index,
+    list_shards,
+    migrate_storage,
+    move_shards_to_cold_storage,
+    parse_ingest_listeners,
+    parse_provision_spec,
+    parse_retention_policy,
+    render_influxdb_configuration,
+    restore_backup,
+    restore_backup_chain,
+    storage_usage,
+    tier_usage,
+    validate_rollup,
+    wait_until_ready,
+    write_influxdb_configuration_and_restart_service,
+)
+
+
+class TestInfluxDBOps(TestCase):
+    """Unit test InfluxDBOps."""
+
+    def setUp(self) -> None:
+        """Set up unit test."""
+        self.charm = Mock(influxdb_admin_password="admin-password")
+        self.ops = InfluxDBOps(self.charm)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_admin_client_is_pooled(self, client_cls) -> None:
+        """Test that every operation shares one admin client until closed."""
+        self.ops.create_user("user")
+        self.ops.list_databases()
+        self.ops.grant_privilege("user", "db")
+        client_cls.assert_called_once()
+        client_cls.return_value.close.assert_not_called()
+
+        self.ops.close()
+        client_cls.return_value.close.assert_called_once()
+
+        self.ops.list_users()
+        self.assertEqual(client_cls.call_count, 2)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_create_user_and_database_single_request(self, client_cls) -> None:
+        """Test provisioning is sent as one multi-statement query."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(4)
+        ]
+        user_pass = self.ops.create_user_and_database("db")
+
+        client_cls.return_value.query.assert_called_once()
+        query = client_cls.return_value.query.call_args.args[0]
+        self.assertEqual(
+            [statement.split(" ")[:2] for statement in query.split("; ")],
+            [
+                ["CREATE", "DATABASE"],
+                ["CREATE", "RETENTION"],
+                ["CREATE", "USER"],
+                ["GRANT", "ALL"],
+            ],
+        )
+        self.assertIn(f'"{user_pass["username"]}"', query)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_create_database_retention_policy(self, client_cls) -> None:
+        """Test the requested retention policy options are sent."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(2)
+        ]
+        policy = parse_retention_policy({"duration": "90d", "shard-duration": "7d"})
+        self.ops.create_database("db", policy)
+
+        self.assertIn(
+            'CREATE RETENTION POLICY "default" ON "db" DURATION 90d REPLICATION 1 '
+            "SHARD DURATION 7d DEFAULT",
+            client_cls.return_value.query.call_args.args[0],
+        )
+
+    @patch("influxdb.InfluxDBClient")
+    def test_create_rollup(self, client_cls) -> None:
+        """Test a rollup policy and its continuous query are created in one request."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(2)
+        ]
+        self.assertEqual(self.ops.create_rollup("db", "5m", "90d"), "rollup_5m")
+
+        client_cls.return_value.query.assert_called_once()
+        self.assertEqual(
+            client_cls.return_value.query.call_args.args[0].split("; "),
+            [
+                'CREATE RETENTION POLICY "rollup_5m" ON "db" DURATION 90d REPLICATION 1',
+                'CREATE CONTINUOUS QUERY "rollup_5m" ON "db" BEGIN '
+                'SELECT mean(*) INTO "db"."rollup_5m".:MEASUREMENT FROM "db"."default"./.*/ '
+                "GROUP BY time(5m), * END",
+            ],
+        )
+
+    def test_validate_rollup(self) -> None:
+        """Test invalid rollup options are rejected."""
+        validate_rollup("1h", "INF", "max")
+        for options in (("0m", "30d"), ("5 minutes", "30d"), ("5m", "soon"), ("5m", "30d", "p99")):
+            with self.assertRaises(InfluxDBOpsError, msg=options):
+                validate_rollup(*options)
+
+    def test_parse_retention_policy(self) -> None:
+        """Test retention policy options are validated and defaulted."""
+        self.assertEqual(
+            parse_retention_policy({"duration": "INF", "replication": "2"}),
+            {"duration": "INF", "replication": 2},
+        )
+        self.assertEqual(
+            parse_retention_policy({"shard-duration": "1w", "duration": ""}, defaults=False),
+            {"shard_duration": "1w"},
+        )
+        for options in (
+            {"duration": "30 days"},
+            {"duration": "30m"},
+            {"shard-duration": "30m"},
+            {"duration": "1d", "shard-duration": "7d"},
+            {"replication": "0"},
+        ):
+            with self.assertRaises(InfluxDBOpsError, msg=options):
+                parse_retention_policy(options)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_create_user_and_database_statement_error(self, client_cls) -> None:
+        """Test a failed statement is raised rather than swallowed."""
+        client_cls.return_value.query.return_value = [
+            ResultSet({"statement_id": 0}, raise_errors=False),
+            ResultSet({"statement_id": 1, "error": "boom"}, raise_errors=False),
+        ]
+        with self.assertRaises(InfluxQLStatementError) as ctx:
+            self.ops.create_user_and_database("db")
+        self.assertEqual(ctx.exception.statement_id, 1)
+        self.assertEqual(ctx.exception.message, "Error creating default retention policy.")
+
+    @patch("influxdb.InfluxDBClient")
+    def test_sample_cardinality(self, client_cls) -> None:
+        """Test cardinality is sampled in one batch, resending the statements after a failure."""
+
+        def _result(statement_id: int, columns=None, values=(), error=None) -> ResultSet:
+            raw = {"statement_id": statement_id}
+            if error:
+                raw["error"] = error
+            if columns:
+                raw["series"] = [
+                    {"name": f"m{i}", "columns": columns, "values": [value]}
+                    for i, value in enumerate(values)
+                ]
+            return ResultSet(raw, raise_errors=False)
+
+        client_cls.return_value.query.side_effect = [
+            [
+                _result(0, ["cardinality estimation"], [[1200]]),
+                _result(1, ["count"], [[4], [40]]),
+                _result(2, error="database not found: b"),
+                _result(3, error="not executed"),
+                _result(4, error="not executed"),
+                _result(5, error="not executed"),
+            ],
+            [_result(0, ["cardinality estimation"], [[0]]), _result(1)],
+        ]
+
+        results = self.ops.sample_cardinality(["a", "b", "c"])
+
+        self.assertEqual(results["a"], {"series": 1200, "tag-values": 40})
+        self.assertIsInstance(results["b"], InfluxQLStatementError)
+        self.assertEqual(results["c"], {"series": 0, "tag-values": 0})
+        resent = client_cls.return_value.query.call_args.args[0]
+        self.assertEqual(resent.count("CARDINALITY"), 2)
+        self.assertIn('ON "c"', resent)
+
+    @patch("influxdb.InfluxDBClient")
+    def test_provision_applies_delta(self, client_cls) -> None:
+        """Test provisioning only batches what is missing and reports each item."""
+        client = client_cls.return_value
+        client.get_list_users.return_value = [{"user": "alice", "admin": False}]
+        client.get_list_database.return_value = [{"name": "metrics"}]
+        client.get_list_privileges.return_value = [{"database": "metrics", "privilege": "READ"}]
+        client.query.return_value = [
+            ResultSet({"statement_id": i}, raise_errors=False) for i in range(4)
+        ]
+        spec = parse_provision_spec(
+            """
+            users: [alice, bob]
+            databases: [metrics, {name: logs}]
+            grants:
+              - {username: alice, database: metrics, privilege: read}
+              - {username: bob, database: logs}
+            """
+        )
+
+        report, passwords = self.ops.provision(spec)
+
+        client.get_list_privileges.assert_called_once_with("alice")
+        self.assertEqual(len(client.query.call_args.args[0].split("; ")), 4)
+        self.assertEqual(
+            [item["result"] for item in report],
+            ["unchanged", "created", "unchanged", "created", "unchanged", "created"],
+        )
+        self.assertEqual(list(passwords), ["bob"])
+
+    def test_parse_provision_spec_invalid(self) -> None:
+        """Test malformed specs are rejected."""
+        for spec in ("[1, 2]", "grants: [{username: a}]", "users: [{}]", "tables: []"):
+            with self.assertRaises(InfluxDBOpsError):
+                parse_provision_spec(spec)
+
+    def test_render_influxdb_configuration(self) -> None:
+        """Test tuning settings are rendered into the [data] section."""
+        settings = {
+            "cache-max-memory-size": "2g",
+            "cache-snapshot-memory-size": "25m",
+            "max-concurrent-compactions": 4,
+            "wal-fsync-delay": "100ms",
+            "max-series-per-database": 0,
+            "max-values-per-tag": 100000,
+            "index-version": "tsi1",
+            "dir": "/srv/influxdb-data/data",
+            "wal-dir": "/srv/influxdb-wal/wal",
+        }
+        config = render_influxdb_configuration(settings)
+        self.assertIn('  dir = "/srv/influxdb-data/data"\n', config)
+        self.assertIn('  wal-dir = "/srv/influxdb-wal/wal"\n', config)
+        self.assertIn('  dir = "/var/lib/influxdb/meta"\n', config)
+        self.assertIn('  cache-max-memory-size = "2g"\n', config)
+        self.assertIn("  max-concurrent-compactions = 4\n", config)
+        self.assertIn('  wal-fsync-delay = "100ms"\n', config)
+        self.assertIn('  index-version = "tsi1"\n', config)
+
+        for setting, value in (
+            ("wal-fsync-delay", "soon"),
+            ("cache-max-memory-size", "1x"),
+            ("index-version", "tsi2"),
+        ):
+            with self.assertRaises(InfluxDBOpsError):
+                render_influxdb_configuration({**settings, setting: value})
+
+    def test_render_ingest_listeners(self) -> None:
+        """Test several listeners per protocol are rendered as enabled sections."""
+        listeners = """
+        udp:
+          - {bind-address: ":8089", database: telemetry, batch-size: 5000, batch-timeout: 50ms,
+             read-buffer: 8388608}
+          - {bind-address: "10.0.0.1:8090", precision: s}
+        graphite:
+          - {protocol: udp, templates: ["*.app env.service.measurement"]}
+        """
+        parsed = parse_ingest_listeners(listeners)
+        self.assertEqual(parsed["graphite"][0]["bind-address"], ":2003")
+        self.assertEqual(parsed["graphite"][0]["database"], "graphite")
+
+        settings = {
+            "cache-max-memory-size": "1g",
+            "cache-snapshot-memory-size": "25m",
+            "max-concurrent-compactions": 0,
+            "wal-fsync-delay": "0s",
+            "max-series-per-database": 1000000,
+            "max-values-per-tag": 100000,
+            "index-version": "inmem",
+            "dir": "/var/lib/influxdb/data",
+            "wal-dir": "/var/lib/influxdb/wal",
+            "ingest-listeners": listeners,
+        }
+        config = render_influxdb_configuration(settings)
+        self.assertEqual(config.count("[[udp]]\n  enabled = true\n"), 2)
+        self.assertIn('  bind-address = ":8089"\n  database = "telemetry"\n', config)
+        self.assertIn("  batch-size = 5000\n", config)
+        self.assertIn("  read-buffer = 8388608\n", config)
+        self.assertIn('  templates = ["*.app env.service.measurement"]\n', config)
+        self.assertNotIn("[[opentsdb]]\n", config)
+        disabled = render_influxdb_configuration({**settings, "ingest-listeners": ""})
+        self.assertNotIn("enabled = true\n  bind-address", disabled)
+
+        for invalid in (
+            "tcp: [{}]",
+            "udp: {bind-address: ':8089'}",
+            "udp: [{bind-address: ':80x'}]",
+            "udp: [{batch-size: -1}]",
+            "udp: [{batch-size: true}]",
+            "udp: [{batch-timeout: soon}]",
+            "udp: [{precision: d}]",
+            "udp: [{sampling: 10}]",
+            "udp: [{}]\ncollectd: [{bind-address: ':8089'}]",
+        ):
+            with self.subTest(invalid), self.assertRaises(InfluxDBOpsError):
+                parse_ingest_listeners(invalid)
+
+    @patch("influxdb_ops.wait_until_ready", Mock(return_value=True))
+    @patch("influxdb_ops.influxdb_memory_usage", Mock(side_effect=[1000, 400]))
+    @patch("influxdb_ops.subprocess.run")
+    def test_build_tsi_index(self, run) -> None:
+        """Test buildtsi runs once per shard between stopping and starting influxdb."""
+        run.return_value.returncode = 0
+        with tempfile.TemporaryDirectory() as data_dir:
+            for shard in ("db1/default/1", "db1/default/2", "db2/autogen/3", "db2/_series"):
+                (Path(data_dir) / shard).mkdir(parents=True)
+            result = build_tsi_index(workers=2, data_dir=data_dir)
+
+        commands = [call.args[0] for call in run.call_args_list]
+        self.assertEqual(commands[0], ["systemctl", "stop", "influxdb"])
+        self.assertEqual(commands[-1], ["systemctl", "start", "influxdb"])
+        self.assertEqual(sum("buildtsi" in command for command in commands), 3)
+        self.assertEqual(result["shards"], 3)
+        self.assertEqual(result["failed"], [])
+        self.assertEqual((result["memory-before"], result["memory-after"]), (1000, 400))
+
+    @patch("influxdb_ops.subprocess.run")
+    def test_write_configuration_restarts_only_when_needed(self, run) -> None:
+        """Test unchanged and deferrable config changes do not restart influxdb."""
+        settings = {
+            "cache-max-memory-size": "1g",
+            "cache-snapshot-memory-size": "25m",
+            "max-concurrent-compactions": 0,
+            "wal-fsync-delay": "0s",
+            "max-series-per-database": 1000000,
+            "max-values-per-tag": 100000,
+            "index-version": "inmem",
+            "dir": "/var/lib/influxdb/data",
+            "wal-dir": "/var/lib/influxdb/wal",
+        }
+        run.return_value.returncode = 0
+        with tempfile.TemporaryDirectory() as tmp:
+            with patch("influxdb_ops.INFLUXDB_CONFIG_PATH", Path(tmp) / "influxdb.conf"):
+                applied, restarted = write_influxdb_configuration_and_restart_service(settings)
+                self.assertEqual((run.call_count, restarted), (1, True))
+
+                applied, restarted = write_influxdb_configuration_and_restart_service(
+                    settings, applied
+                )
+                self.assertEqual((run.call_count, restarted), (1, False))
+
+                tuned = {**settings, "cache-max-memory-size": "2g"}
+                applied, restarted = write_influxdb_configuration_and_restart_service(
+                    tuned, applied
+                )
+                self.assertEqual((run.call_count, restarted), (1, False))
+                self.assertEqual(applied["cache-max-memory-size"], "1g")
+
+                limited = {**tuned, "max-series-per-database": 1000}
+                applied, restarted = write_influxdb_configuration_and_restart_service(
+                    limited, applied
+                )
+                self.assertEqual((run.call_count, restarted), (2, True))
+                self.assertEqual(applied, limited)
+
+                moved = {**limited, "wal-dir": "/srv/influxdb-wal/wal"}
+                applied, _ = write_influxdb_configuration_and_restart_service(moved, applied)
+                self.assertEqual(run.call_count, 3)
+
+                # Settings applied before they were tracked are in effect
+                # if the config is unchanged.
+                untracked = {k: v for k, v in applied.items() if k != "dir"}
+                applied, _ = write_influxdb_configuration_and_restart_service(moved, untracked)
+                self.assertEqual(applied, moved)
+
+    @patch("influxdb_ops.subprocess.run")
+    def test_write_configuration_restart_failure(self, run) -> None:
+        """Test a failed restart raises and is retried by the next write."""
+        settings = {
+            "cache-max-memory-size": "1g",
+            "cache-snapshot-memory-size": "25m",
+            "max-concurrent-compactions": 0,
+            "wal-fsync-delay": "0s",
+            "max-series-per-database": 1000000,
+            "max-values-per-tag": 100000,
+            "index-version": "inmem",
+            "dir": "/var/lib/influxdb/data",
+            "wal-dir": "/var/lib/influxdb/wal",
+        }
+        run.return_value.returncode = 1
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "influxdb.conf"
+            path.write_text("previous")
+            with patch("influxdb_ops.INFLUXDB_CONFIG_PATH", path):
+                with self.assertRaises(InfluxDBOpsError):
+                    write_influxdb_configuration_and_restart_service(settings)
+                self.assertEqual(path.read_text(), "previous")
+
+                run.return_value.returncode = 0
+                _, restarted = write_influxdb_configuration_and_restart_service(settings)
+                self.assertTrue(restarted)
+
+    @patch("influxdb_ops.subprocess.run")
+    def test_configure_exporter_service(self, run) -> None:
+        """Test the exporter is only restarted when its port changes or it is down.
+
+        It is removed on port 0.
+        """
+        run.return_value.returncode = 0
+        with tempfile.TemporaryDirectory() as tmp:
+            script, unit = Path(tmp) / "influxdb-exporter", Path(tmp) / "influxdb-exporter.service"
+            with (
+                patch("influxdb_ops.INFLUXDB_EXPORTER_SCRIPT", script),
+                patch("influxdb_ops.INFLUXDB_EXPORTER_UNIT_PATH", unit),
+            ):
+                configure_exporter_service(9122)
+                self.assertIn(f"ExecStart=/usr/bin/python3 {script} --port 9122", unit.read_text())
+                self.assertEqual(
+                    run.call_args.args[0], ["systemctl", "restart", "influxdb-exporter"]
+                )
+
+                run.reset_mock()
+                configure_exporter_service(9122)
+                run.assert_called_once_with(
+                    ["systemctl", "is-active", "--quiet", "influxdb-exporter"]
+                )
+
+                # An exporter that failed to start is restarted though nothing changed.
+                run.side_effect = lambda cmd: Mock(returncode=3 if "is-active" in cmd else 0)
+                configure_exporter_service(9122)
+                self.assertEqual(
+                    run.call_args.args[0], ["systemctl", "restart", "influxdb-exporter"]
+                )
+                run.side_effect = None
+
+                configure_exporter_service(9123)
+                self.assertEqual(
+                    run.call_args.args[0], ["systemctl", "restart", "influxdb-exporter"]
+                )
+
+                configure_exporter_service(0)
+                self.assertFalse(unit.exists())
+
+    def test_storage_usage(self) -> None:
+        """Test the WAL size is summed over its segments, and missing directories are None."""
+        with tempfile.TemporaryDirectory() as tmp:
+            segments = Path(tmp) / "wal" / "metrics" / "autogen" / "1"
+            segments.mkdir(parents=True)
+            (segments / "_00001.wal").write_bytes(b"x" * 1000)
+            (segments / "_00002.wal").write_bytes(b"x" * 24)
+
+            usage = storage_usage(tmp, str(Path(tmp) / "wal"))
+            self.assertEqual(usage["wal-bytes"], 1024)
+            self.assertGreaterEqual(usage["disk-used-percent"], 0)
+
+            usage = storage_usage(str(Path(tmp) / "data"), str(Path(tmp) / "missing"))
+            self.assertEqual(usage, {"disk-used-percent": None, "wal-bytes": None})
+
+    @patch("influxdb_ops.wait_until_ready")
+    @patch("influxdb_ops.subprocess.run", Mock(return_value=Mock(returncode=0)))
+    def test_tier_shards(self, wait_until_ready) -> None:
+        """Test shards not written to for the cold shard age are moved behind a symlink."""
+        with tempfile.TemporaryDirectory() as tmp:
+            data, wal, cold = (str(Path(tmp) / name) for name in ("data", "wal", "cold"))
+            Path(cold).mkdir()
+            for shard in ("1", "2"):
+                (Path(data) / "metrics" / "autogen" / shard).mkdir(parents=True)
+                (Path(data) / "metrics" / "autogen" / shard / "000001-01.tsm").write_bytes(
+                    b"x" * 10
+                )
+            old = time.time() - 40 * 86400
+            os.utime(Path(data) / "metrics" / "autogen" / "1" / "000001-01.tsm", (old, old))
+
+            shards = cold_shards("30d", cold, data, wal)
+            self.assertEqual(shards, [("metrics", "autogen", "1")])
+
+            result = move_shards_to_cold_storage(shards, cold, data, wal)
+            self.assertEqual(result["moved"], ["metrics/autogen/1"])
+            wait_until_ready.assert_called_once()
+
+            hot = Path(data) / "metrics" / "autogen" / "1"
+            self.assertTrue(hot.is_symlink())
+            self.assertEqual(hot.resolve(), (Path(cold) / "metrics" / "autogen" / "1").resolve())
+            self.assertEqual((hot / "000001-01.tsm").read_bytes(), b"x" * 10)
+            self.assertEqual(len(list_shards(data)), 2)
+            self.assertEqual(cold_shards("30d", cold, data, wal), [])
+
+            usage = tier_usage(cold, data)
+            self.assertEqual((usage["hot"]["shards"], usage["hot"]["bytes"]), (1, 10))
+            self.assertEqual((usage["cold"]["shards"], usage["cold"]["bytes"]), (1, 10))
+
+            with self.assertRaises(InfluxDBOpsError):
+                cold_shards("soon", cold, data, wal)
+            with self.assertRaises(InfluxDBOpsError):
+                cold_shards("30d", str(Path(tmp) / "missing"), data, wal)
+
+    @patch("influxdb_ops.subprocess.run")
+    def test_migrate_storage(self, run) -> None:
+        """Test a directory is copied while running, then synced again while stopped."""
+        run.return_value.returncode = 0
+        with tempfile.TemporaryDirectory() as tmp:
+            source, target = Path(tmp) / "data", Path(tmp) / "volume" / "data"
+            (source / "metrics" / "autogen" / "1").mkdir(parents=True)
+            (source / "metrics" / "autogen" / "1" / "000001-01.tsm").write_bytes(b"x" * 10)
+            (source / "metrics" / "autogen" / "2").symlink_to(Path(tmp) / "cold" / "2")
+            # A stale file from an interrupted earlier move is removed from the target.
+            (target / "metrics").mkdir(parents=True)
+            (target / "metrics" / "stale.tsm").write_bytes(b"stale")
+
+            result = migrate_storage(str(source), str(target))
+
+            self.assertEqual(result["bytes"], 10)
+            self.assertFalse(source.exists())
+            self.assertEqual(
+                (target / "metrics" / "autogen" / "1" / "000001-01.tsm").read_bytes(), b"x" * 10
+            )
+            self.assertEqual(
+                os.readlink(target / "metrics" / "autogen" / "2"), str(Path(tmp) / "cold" / "2")
+            )
+            self.assertFalse((target / "metrics" / "stale.tsm").exists())
+            commands = [call.args[0] for call in run.call_args_list]
+            self.assertEqual(commands[0], ["systemctl", "stop", "influxdb"])
+            self.assertEqual(commands[1], ["chown", "-R", "influxdb:influxdb", str(target)])
+
+            # An empty source only creates the target, without stopping influxdb.
+            run.reset_mock()
+            migrate_storage(str(Path(tmp) / "missing"), str(Path(tmp) / "wal"))
+            self.assertTrue((Path(tmp) / "wal").is_dir())
+            self.assertNotIn(
+                ["systemctl", "stop", "influxdb"], [c.args[0] for c in run.call_args_list]
+            )
+
+            # influxdb is started again on the kept source if the copy fails while stopped.
+            run.reset_mock()
+            with patch("influxdb_ops._sync_tree", side_effect=[None, OSError("disk failure")]):
+                with self.assertRaises(InfluxDBOpsError):
+                    migrate_storage(str(target), str(Path(tmp) / "other"))
+            self.assertEqual(run.call_args_list[-1].args[0], ["systemctl", "start", "influxdb"])
+            self.assertTrue(target.is_dir())
+
+    def test_backup_and_restore(self) -> None:
+        """Test parallel backups are archived with a manifest and restored in parallel."""
+
+        def _influxd(cmd, **_) -> Mock:
+            if cmd[1] == "backup":
+                if cmd[cmd.index("-database") + 1] == "broken":
+                    return Mock(returncode=1, stderr="database not found")
+                Path(cmd[-1]).mkdir()
+                (Path(cmd[-1]) / "20250101T000000Z.manifest").write_text("{}")
+                (Path(cmd[-1]) / "20250101T000000Z.s1.tar.gz").write_bytes(b"x" * 100)
+            else:
+                restored.append((cmd[cmd.index("-newdb") + 1], sorted(os.listdir(cmd[-1]))))
+            return Mock(returncode=0, stderr="")
+
+        for compression in ("gzip", "zstd"):
+            restored = []
+            with self.subTest(compression), tempfile.TemporaryDirectory() as tmp:
+                with patch("influxdb_ops.subprocess.run", side_effect=_influxd) as run:
+                    backup = create_backup(
+                        ["metrics", "logs", "broken"],
+                        tmp,
+                        since="2025-01-01T00:00:00Z",
+                        compression=compression,
+                    )
+                    self.assertIn("-since", run.call_args_list[0].args[0])
+                    self.assertEqual(backup["databases"], 2)
+                    self.assertEqual(backup["bytes"], 2 * 102)
+                    self.assertEqual(backup["failed"], {"broken": "database not found"})
+                    self.assertEqual(os.listdir(tmp), [Path(backup["archive"]).name])
+
+                    result = restore_backup(backup["archive"], ["logs"], suffix="_restored")
+                    self.assertEqual(result["databases"], 1)
+                    self.assertEqual(
+                        restored,
+                        [
+                            (
+                                "logs_restored",
+                                ["20250101T000000Z.manifest", "20250101T000000Z.s1.tar.gz"],
+                            )
+                        ],
+                    )
+
+                    with self.assertRaises(InfluxDBOpsError):
+                        restore_backup(backup["archive"], ["broken"])
+
+    def test_incremental_backup(self) -> None:
+        """Test incremental backups only copy changed shards and record them in the index."""
+
+        def _influxd(cmd, **_) -> Mock:
+            shard = cmd[cmd.index("-shard") + 1]
+            backed_up.append(shard)
+            Path(cmd[-1]).mkdir()
+            manifest = {
+                "meta": {"fileName": "20250101T000000Z.meta"},
+                "files": [
+                    {"shardID": int(shard), "fileName": f"20250101T000000Z.s{shard}.tar.gz"}
+                ],
+            }
+            (Path(cmd[-1]) / "20250101T000000Z.manifest").write_text(json.dumps(manifest))
+            (Path(cmd[-1]) / "20250101T000000Z.meta").write_bytes(b"meta")
+            # Each shard backup holds the number of the backup that took it.
+            data = str(len(backed_up)).encode() * 100
+            (Path(cmd[-1]) / f"20250101T000000Z.s{shard}.tar.gz").write_bytes(data)
+            return Mock(returncode=0, stderr="")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            data, wal, backups = (str(Path(tmp) / name) for name in ("data", "wal", "backups"))
+            for shard in ("1", "2"):
+                (Path(data) / "metrics" / "autogen" / shard).mkdir(parents=True)
+                (Path(data) / "metrics" / "autogen" / shard / "000001-01.tsm").write_bytes(b"tsm")
+            (Path(wal) / "metrics" / "autogen" / "2").mkdir(parents=True)
+            (Path(wal) / "metrics" / "autogen" / "2" / "_00001.wal").write_bytes(b"wal")
+
+            backed_up = []
+            with patch("influxdb_ops.subprocess.run", side_effect=_influxd):
+                first = create_backup(
+                    ["metrics"], backups, incremental=True, data_dir=data, wal_dir=wal
+                )
+                self.assertEqual((first["shards"], first["skipped"]), (2, 0))
+
+                # Touched but identical files are skipped; rewritten ones are backed up.
+                tsm = Path(data) / "metrics" / "autogen" / "1" / "000001-01.tsm"
+                os.utime(tsm, (0, 0))
+                (Path(wal) / "metrics" / "autogen" / "2" / "_00001.wal").write_bytes(b"wal2")
+                with patch("influxdb_ops.time.strftime", return_value="20250102T000000Z"):
+                    second = create_backup(
+                        ["metrics"], backups, incremental=True, data_dir=data, wal_dir=wal
+                    )
+            self.assertEqual(sorted(backed_up), ["1", "2", "2"])
+            self.assertEqual((second["shards"], second["skipped"]), (1, 1))
+
+            index = json.loads((Path(backups) / "index.json").read_text())
+            self.assertEqual(index["last-backup"], second["backup-id"])
+            self.assertEqual(index["shards"]["metrics/autogen/1"]["backup"], first["backup-id"])
+            self.assertEqual(
+                index["shards"]["metrics/autogen/1"]["files"]["000001-01.tsm"]["mtime"], 0
+            )
+            self.assertEqual(index["shards"]["metrics/autogen/2"]["backup"], second["backup-id"])
+            self.assertIn("wal/_00001.wal", index["shards"]["metrics/autogen/2"]["files"])
+
+            # Shard backups are restored together from the directory of their database.
+            def _restore(cmd, **_) -> Mock:
+                restored.extend(sorted(os.listdir(cmd[-1])))
+                manifests.append(
+                    json.loads((Path(cmd[-1]) / "20250101T000000Z-1.manifest").read_text())
+                )
+                return Mock(returncode=0, stderr="")
+
+            restored, manifests = [], []
+            with patch("influxdb_ops.subprocess.run", side_effect=_restore):
+                restore_backup(first["archive"], suffix="_restored")
+            self.assertEqual(len(restored), 6)
+            self.assertIn("20250101T000000Z-2.s2.tar.gz", restored)
+            self.assertEqual(manifests[0]["meta"]["fileName"], "20250101T000000Z-1.meta")
+            self.assertEqual(manifests[0]["files"][0]["fileName"], "20250101T000000Z-1.s1.tar.gz")
+
+            # The chain restores shard 1 from the first backup and shard 2 from the second.
+            def _restore_chain(cmd, **_) -> Mock:
+                for name in ("20250101T000000Z-1.s1.tar.gz", "20250101T000000Z-2.s2.tar.gz"):
+                    restored_chain[name] = (Path(cmd[-1]) / name).read_bytes()[:1]
+                return Mock(returncode=0, stderr="")
+
+            restored_chain = {}
+            with patch("influxdb_ops.subprocess.run", side_effect=_restore_chain) as run:
+                chain = restore_backup_chain(["metrics"], backups, suffix="_restored")
+            run.assert_called_once()
+            self.assertEqual((chain["databases"], chain["archives"]), (1, 2))
+            self.assertEqual(restored_chain["20250101T000000Z-2.s2.tar.gz"], b"3")
+            self.assertIn(restored_chain["20250101T000000Z-1.s1.tar.gz"], (b"1", b"2"))
+            with self.assertRaises(InfluxDBOpsError):
+                restore_backup_chain(["logs"], backups)
+
+            export = export_backup_index(str(Path(tmp) / "export.json"), backups)
+            self.assertEqual((export["shards"], export["backups"]), (2, 2))
+            self.assertEqual(json.loads(Path(export["path"]).read_text()), index)
+
+    def test_export_backup_index_missing(self) -> None:
+        """Test exporting fails before any incremental backup."""
+        with tempfile.TemporaryDirectory() as tmp, self.assertRaises(InfluxDBOpsError):
+            export_backup_index(backup_dir=tmp)
+
+    def test_create_backup_invalid(self) -> None:
+        """Test invalid backup options are rejected before anything runs."""
+        with self.assertRaises(InfluxDBOpsError):
+            create_backup(["metrics"], since="yesterday")
+        with self.assertRaises(InfluxDBOpsError):
+            create_backup(["metrics"], compression="lz4")
+        with self.assertRaises(InfluxDBOpsError):
+            create_backup(["metrics"], since="2025-01-01T00:00:00Z", incremental=True)
+
+    @patch("influxdb_ops.time.sleep")
+    @patch("influxdb_ops.shard_loading_progress", Mock(return_value=(1, 4)))
+    @patch("influxdb_ops.InfluxDBProbe.ready", Mock(side_effect=[False, False, False, True]))
+    def test_wait_until_ready_backs_off(self, sleep) -> None:
+        """Test readiness polling backs off exponentially and reports progress."""
+        progress = Mock()
+        self.assertTrue(wait_until_ready(timeout=60, progress=progress))
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1, 2])
+        progress.assert_called_with(1, 4)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Copyright 2025 (c) Vantage Compute Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for the InfluxDB health probe."""
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import TestCase
+
+from influxdb_probe import InfluxDBProbe, percentile, summarize_debug_vars
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.connections += 1
+
+    def do_HEAD(self) -> None:  # noqa: N802
+        self.send_response(204)
+        self.send_header("X-Influxdb-Version", "1.8.10")
+        self.end_headers()
+
+    def do_GET(self) -> None:  # noqa: N802
+        body = b'{"status": "pass"}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *_) -> None:
+        pass
+
+
+class TestInfluxDBProbe(TestCase):
+    """Unit test InfluxDBProbe."""
+
+    def setUp(self) -> None:
+        """Start a local HTTP server standing in for influxdb."""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def test_probe_reuses_connection(self) -> None:
+        """Test ping and health share one keep-alive connection."""
+        with InfluxDBProbe(port=self.server.server_address[1]) as probe:
+            self.assertEqual(probe.ping(), "1.8.10")
+            self.assertEqual(probe.health(), {"status": "pass"})
+            self.assertTrue(probe.ready())
+        self.assertEqual(self.server.connections, 1)
+
+    def test_probe_unreachable(self) -> None:
+        """Test an unreachable influxdb reports no version and is not ready."""
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        with InfluxDBProbe(port=port, timeout=0.5) as probe:
+            self.assertEqual(probe.ping(), "")
+            self.assertIsNone(probe.health())
+            self.assertFalse(probe.ready())
+
+    def test_debug_vars(self) -> None:
+        """Test the debug vars are fetched over the probe's connection."""
+        with InfluxDBProbe(port=self.server.server_address[1]) as probe:
+            self.assertEqual(probe.ping(), "1.8.10")
+            self.assertEqual(probe.debug_vars(), {"status": "pass"})
+        self.assertEqual(self.server.connections, 1)
+
+    def test_percentile(self) -> None:
+        """Test nearest-rank percentiles."""
+        latencies = [0.01 * i for i in range(1, 101)]
+        self.assertEqual(percentile(latencies, 50), 0.5)
+        self.assertEqual(percentile(latencies, 99), 0.99)
+        self.assertEqual(percentile([0.2], 99), 0.2)
+        self.assertEqual(percentile([], 50), 0.0)
+
+    def test_summarize_debug_vars(self) -> None:
+        """Test per-shard statistics are summed into the snapshot summary."""
+        summary = summarize_debug_vars(
+            {
+                "memstats": {"HeapAlloc": 1},
+                "runtime": {"name": "runtime", "values": {"HeapAlloc": 4096, "NumGoroutine": 12}},
+                "tsm1_cache:1": {"name": "tsm1_cache", "values": {"memBytes": 100}},
+                "tsm1_cache:2": {"name": "tsm1_cache", "values": {"memBytes": 200}},
+                "tsm1_engine:1": {
+                    "name": "tsm1_engine",
+                    "values": {"cacheCompactionsActive": 1, "tsmFullCompactionsActive": 1},
+                },
+            }
+        )
+        self.assertEqual(summary["heap-bytes"], 4096)
+        self.assertEqual(summary["cache-bytes"], 300)
+        self.assertEqual(summary["compactions-active"], 2)